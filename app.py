@@ -4,18 +4,39 @@ from shiny import App, reactive, render, ui
 import pandas as pd
 import shinywidgets as sw
 import os
+import time
 from io import StringIO
 import re
 import numpy as np
 from scipy import stats
-from statsmodels.stats.contingency_tables import Table2x2
 from docx import Document
 from docx.shared import Pt, Cm, Inches
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
-# from fisher import pvalue_nway
 import pickle
 import json
+import logging
+from exact_tests import default_mc_samples, default_exact_rank_sum_n
+from resampling import permutation_pvalues, default_permutations, bootstrap_intervals
+from memo import ResultMemo
+from config_store import VarConfigStore
+from pipeline import AnalysisPipeline
+from executor import run_sharded, run_tasks, default_executor
+from matching import logit_propensity, caliper_match, standardized_differences, default_caliper
+from imputation import (encode_imputation_data, chained_imputation, completed_frame, pool_results, default_imputations,
+                        default_imputation_iterations, default_imputation_seed)
+from planner import (TestPlanner, default_deadline, numeric_cost, fisher_batch_cost, permutation_cost, min_permutations,
+                     bootstrap_cost, min_bootstraps)
+from posthoc import pair_indices, games_howell, dunn_test, pairwise_contingency, adjust_pvalues, adjustment_methods
+from results import VariableResult, format_results, format_p_values
+from stats_engine import (factorize_groups, summarize_numeric_columns, summarize_ordinal_columns, sketch_numeric_columns, sketch_rank_sums, default_rank_bins, default_chunk_cells,
+                          welch_ttest, rank_sum_test,
+                          welch_anova, kruskal_test, mann_whitney_test, exact_rank_sum_test, chi2_tests, contingency_test, contingency_table, fisher_exact_2x2, ContingencyCache, odds_ratios, numeric_types,
+                          mean_difference_effects, cliffs_delta, proportion_effects, multinomial_smd,
+                          adjusted_odds_ratios, normality_tests, normality_screen, normality_memo, shapiro_max_n,
+                          default_normality_alpha)
+
+logger = logging.getLogger(__name__)
 
 # set default and alternative statistical tests
 default_tests = {
@@ -35,6 +56,18 @@ alternative_tests = {
     "Ordinal Discrete": "ttest",
 }
 
+# batched implementations of the numeric tests named above, all reading a numeric summary:
+# {test: (two-group function, k-group function, name of the k-group test)}
+summary_tests = {
+    "ttest": (welch_ttest, welch_anova, "welch-anova"),
+    "mannwhitney": (mann_whitney_test, kruskal_test, "kruskal"),
+    "wilcoxon": (rank_sum_test, kruskal_test, "kruskal"),
+}
+
+# "Parallel Execution" choices -> executor backends (see executor.run_sharded)
+executor_inputs = {"Serial (Default)": "serial", "Threads": "thread", "Processes": "process"}
+bootstrap_inputs = {"No (Default)": 0, "1,000 Resamples": 1_000, "10,000 Resamples": 10_000}
+
 missing_values = ["NA", "N/A", "NAN", "na", "n/a", "nan", "Na", "unk", "unknown", "Unk", "Unknown", "UNKNOWN"] # List of strings representing unknown or missing data
  
 # variable_types = [
@@ -50,9 +83,9 @@ variable_types = list(default_tests.keys())
 
 # get p-values from statistical test
 ################################################################################
-### ONLY SUPPORTS 2 GROUPS AT THE MOMENT, NEED TO UPDATE TO MULTIPLE GROUPS ####
+### ONLY SUPPORTS 2 GROUPS, SEE perform_multigroup_categorical_analysis     ####
 ################################################################################
-def run_statistical_test(df, group_var, var_type, var_name, decimal_places):
+def run_statistical_test(df, group_var, var_type, var_name, decimal_places, test_info=None, p_value_mode="Default", cache=None):
     print("PERFORM PVAL TEST", group_var, var_type, var_name, df[var_name].dropna().unique())
     groups = df[group_var].dropna().unique()
     
@@ -60,27 +93,39 @@ def run_statistical_test(df, group_var, var_type, var_name, decimal_places):
         print("Only supports two-group comparisons")
         return None  # Only supports two-group comparisons
 
-    group1 = df[df[group_var] == groups[0]][var_name].dropna()
-    group2 = df[df[group_var] == groups[1]][var_name].dropna()
-
     test_type = default_tests[var_type]
 
-    if test_type == "fisher":
-        contingency_table = pd.crosstab(df[var_name], df[group_var])
-        _, p_value = stats.fisher_exact(contingency_table)
-    elif test_type == 'fisher-freeman-halton': # UPDATE
-        contingency_table = pd.crosstab(df[var_name], df[group_var])
-        _, p_value, _, _ = stats.chi2_contingency(contingency_table, lambda_="log-likelihood")        
-        # p_value = pvalue_nway(contingency_table.values).two_tail
-    elif test_type == "chi2":
-        contingency_table = pd.crosstab(df[var_name], df[group_var])
-        _, p_value, _, _ = stats.chi2_contingency(contingency_table)
-    elif test_type == "ttest":
-        _, p_value = stats.ttest_ind(group1, group2, equal_var=False)
-    elif test_type == "mannwhitney":
-        _, p_value = stats.mannwhitneyu(group1, group2)
-    elif test_type == "wilcoxon":
-        _, p_value = stats.ranksums(group1, group2)
+    if p_value_mode == "Permutation":
+        p_value = permutation_pvalues(df, group_var, {var_name: var_type}, n_workers=1).get(var_name)
+        if test_info is not None:
+            test_info["test_method"] = "permutation"
+    elif test_type in ("fisher", "fisher-freeman-halton", "chi2"):
+        # Categorical tests share the cached contingency table with the counts and odds ratio
+        if cache is None:
+            cache = ContingencyCache(df)
+        _, contingency_table = cache.get(var_name, group_var)
+        p_value, method = contingency_test(contingency_table, test_type)
+        if test_info is not None:
+            test_info["test_method"] = method
+    elif test_type in ("ttest", "mannwhitney", "wilcoxon"):
+        group1 = df[df[group_var] == groups[0]][var_name].dropna()
+        group2 = df[df[group_var] == groups[1]][var_name].dropna()
+
+        if test_type == "ttest":
+            # same normality screen as the batched path: Mann-Whitney if either group is not normal
+            screen = [stats.shapiro(g).pvalue if 3 <= len(g) <= shapiro_max_n and np.ptp(g) > 0
+                      else stats.normaltest(g).pvalue if len(g) > shapiro_max_n else np.nan for g in (group1, group2)]
+            if not normality_screen(np.array(screen)[:, None])[0]:
+                test_type = "mannwhitney"
+            if test_info is not None:
+                test_info["test_method"] = test_type
+
+        if test_type == "ttest":
+            _, p_value = stats.ttest_ind(group1, group2, equal_var=False)
+        elif test_type == "mannwhitney":
+            _, p_value = stats.mannwhitneyu(group1, group2)
+        else:
+            _, p_value = stats.ranksums(group1, group2)
     else:
         print("Invalid test type:", test_type, " for variable:", var_name)
         p_value = None
@@ -92,7 +137,7 @@ def run_statistical_test(df, group_var, var_type, var_name, decimal_places):
 
     return p_value
 
-def compute_odds_ratio_between_groups(group1, group2, reference_value):
+def compute_odds_ratio_between_groups(group1, group2, reference_value, counts=None, ci_method="woolf"):
     """
     Calculates odds ratio and 95% CI between two groups for a binary categorical variable.
 
@@ -100,102 +145,246 @@ def compute_odds_ratio_between_groups(group1, group2, reference_value):
     - group1: pd.Series of exposure variable values for group 1 (e.g., var_name from df[group_var] == Group1)
     - group2: pd.Series of exposure variable values for group 2
     - reference_value: The reference value (default "No")
+    - counts: Optional prebuilt 2x2 table (ContingencyCache.binary_counts); group1/group2 are ignored when given
+    - ci_method: "woolf" (Haldane-corrected when a cell is zero), "haldane" or "exact"
 
     Returns:
     - String in format "OR [low–high]" or "undefined" if the table is invalid
     """
-    # Drop NA
-    group1 = group1.dropna().astype(str)
-    group2 = group2.dropna().astype(str)
-
-    # Convert to binary: 0 = reference, 1 = not reference
-    group1_binary = (group1 != reference_value).astype(int)
-    group2_binary = (group2 != reference_value).astype(int)
+    if counts is None:
+        # Drop NA
+        group1 = group1.dropna().astype(str)
+        group2 = group2.dropna().astype(str)
+
+        # Convert to binary: 0 = reference, 1 = not reference
+        group1_binary = (group1 != reference_value).astype(int)
+        group2_binary = (group2 != reference_value).astype(int)
+
+        # Build 2x2 contingency table:
+        #         | not reference (1) | reference (0)
+        # group1 |        a          |      b
+        # group2 |        c          |      d
+        a = (group1_binary == 1).sum()
+        b = (group1_binary == 0).sum()
+        c = (group2_binary == 1).sum()
+        d = (group2_binary == 0).sum()
+
+        counts = [[a, b], [c, d]]
 
-    # Build 2x2 contingency table:
-    #         | not reference (1) | reference (0)
-    # group1 |        a          |      b
-    # group2 |        c          |      d
-    a = (group1_binary == 1).sum()
-    b = (group1_binary == 0).sum()
-    c = (group2_binary == 1).sum()
-    d = (group2_binary == 0).sum()
-
-    table = [[a, b], [c, d]]
-    
-    print(group1_binary, group2_binary)
     print("Ref Value: ", reference_value )
-    print(table)
+    print(counts)
+
+    odds, ci_low, ci_high, _ = odds_ratios([counts], method=ci_method)
+    return format_odds_ratio(odds[0], ci_low[0], ci_high[0])
 
-    # Ensure valid 2x2 table
-    if any(v == 0 for row in table for v in row):
+# Function to format an odds ratio and its CI as "OR [low–high]"
+def format_odds_ratio(odds, ci_low, ci_high):
+    if np.isnan(odds) or np.isnan(ci_low) or np.isnan(ci_high):
         return "undefined"
+    return f"{odds:.2f} [{ci_low:.2f}–{ci_high:.2f}]"
 
-    try:
-        ct = Table2x2(table)
-        or_value = ct.oddsratio
-        ci_low, ci_high = ct.oddsratio_confint()
-        return f"{or_value:.2f} [{ci_low:.2f}–{ci_high:.2f}]"
-    except Exception as e:
-        return f"error: {str(e)}"
+# Function to compute odds ratios for all two-group categorical variables in one call
+def perform_batched_odds_ratios(cache, group_var, var_config, results, columns, ci_method="woolf"):
+    """
+    Stacks the 2x2 (not reference vs reference) tables of every categorical column and
+    computes all odds ratios and CIs with a single odds_ratios call.
+
+    Parameters:
+    - cache: ContingencyCache holding the tables of the current Calculate
+    - group_var: Name of the grouping column (must have exactly two groups)
+    - var_config: Dictionary of variable settings (reference values)
+    - results: Dictionary {column: VariableResult} (updated in place)
+    - columns: List of categorical columns
+    - ci_method: "woolf", "haldane" or "exact"
+
+    Returns:
+    - results with the odds ratio fields filled in for each column
+    """
+    if not columns:
+        return results
+
+    tables = np.array([cache.binary_counts(col, group_var, var_config[col]["ref_val"]) for col in columns])
+    odds, ci_low, ci_high, corrected = odds_ratios(tables, method=ci_method)
+    for j, col in enumerate(columns):
+        results[col].odds_ratio = float(odds[j])
+        results[col].or_low = float(ci_low[j])
+        results[col].or_high = float(ci_high[j])
+        results[col].odds_ratio_method = "haldane" if corrected[j] else ci_method
+    return results
+
+# Function to encode a column as logistic regression design columns
+def design_columns(series, var_type, reference_value=None):
+    """
+    Encodes one column for the adjusted odds ratio models.
+
+    - Ratio Continuous / Ordinal Discrete (and other numeric columns): the value itself (OR per unit)
+    - Categorical (Y/N) / (Dichotomous): 1 if not the reference value, as the crude odds ratio
+    - Categorical (Multinomial) (and other text columns): one indicator per non-reference level
+
+    Returns:
+    - Tuple (matrix (n x d), valid rows, non-reference levels or None)
+    """
+    valid = series.notna().to_numpy()
+    if var_type in numeric_types or (var_type == "Omit" and pd.api.types.is_numeric_dtype(series)):
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+        return values[:, None], valid & ~np.isnan(values), None
+    if var_type in ("Categorical (Y/N)", "Categorical (Dichotomous)"):
+        return (series.astype(str) != str(reference_value)).to_numpy(dtype=float)[:, None], valid, None
+
+    codes, levels = pd.factorize(series, sort=False)
+    levels = list(levels)
+    ref = next((i for i, level in enumerate(levels) if str(level) == str(reference_value)), 0)
+    others = [i for i in range(len(levels)) if i != ref]
+    return (codes[:, None] == np.array(others)[None, :]).astype(float), valid, [levels[i] for i in others]
+
+# Function to compute covariate-adjusted odds ratios for all variables with batched logistic models
+def perform_batched_adjusted_odds_ratios(df, group_var, var_config, results, columns, adjust_for, split=None):
+    """
+    Fits logit P(first group) = b0 + variable + covariates for every variable at once.
+    Variables with the same number of design columns and the same covariates share
+    one stacked Newton solve; a covariate is never adjusted for itself.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column (must have exactly two groups)
+    - var_config: Dictionary of variable settings (types and reference values)
+    - results: Dictionary {column: VariableResult} (updated in place)
+    - columns: Columns to model
+    - adjust_for: Covariate columns (may be empty for unadjusted logistic ORs)
+    - split: Optional output of factorize_groups to reuse
+
+    Returns:
+    - results with adjusted_or filled in: {"odds_ratio", "low", "high", "wald_p"} per design
+      column, "lr_p", "n", "levels" (non-reference levels of multinomial variables) and "covariates"
+    """
+    if split is None:
+        split = factorize_groups(df, group_var)
+    if len(split["labels"]) != 2 or not columns:
+        return results
+    y = (split["codes"] == 0).astype(float)
+    group_valid = split["codes"] >= 0
+
+    def config_type(col):
+        return var_config[col]["type"] if col in var_config else "Omit"
+
+    covariates = {}
+    for cov in adjust_for:
+        ref = var_config[cov]["ref_val"] if cov in var_config else None
+        covariates[cov] = design_columns(df[cov], config_type(cov), ref)[:2]
+
+    # batch key: (number of design columns, covariates used)
+    batches = {}
+    for col in columns:
+        matrix, valid, levels = design_columns(df[col], var_config[col]["type"], var_config[col]["ref_val"])
+        used = tuple(cov for cov in adjust_for if cov != col)
+        batches.setdefault((matrix.shape[1], used), []).append((col, matrix, valid, levels))
+
+    for (d, used), entries in batches.items():
+        if d == 0:
+            continue
+        cov_matrix = np.column_stack([covariates[c][0] for c in used]) if used else np.empty((len(df), 0))
+        cov_valid = np.logical_and.reduce([covariates[c][1] for c in used]) if used else np.ones(len(df), dtype=bool)
+        x = np.stack([matrix for _, matrix, _, _ in entries])
+        mask = np.stack([valid for _, _, valid, _ in entries]) & (cov_valid & group_valid)[None, :]
+        fit = adjusted_odds_ratios(x, cov_matrix, y, mask)
+        for j, (col, _, _, levels) in enumerate(entries):
+            results[col].adjusted_or = {
+                "odds_ratio": fit["odds_ratio"][j], "low": fit["low"][j], "high": fit["high"][j],
+                "wald_p": fit["wald_p"][j], "lr_p": float(fit["lr_p"][j]), "n": int(fit["n"][j]),
+                "levels": levels, "covariates": used,
+            }
+    return results
+
+# Function to build the propensity-score matched cohort of a two-group table
+def perform_propensity_matching(df, group_var, var_config, covariates, caliper=default_caliper):
+    """
+    Fits a logistic propensity model for the smaller group on the covariates (encoded as for
+    the adjusted odds ratios) and matches every row of that group 1:1 to the nearest row of
+    the other group within caliper SDs of the logit score (greedy, without replacement).
+    Rows with a missing covariate are not matched.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column (must have exactly two groups)
+    - var_config: Dictionary of variable settings (types and reference values)
+    - covariates: Columns of the propensity model
+    - caliper: Caliper width in SDs of the logit propensity score
+
+    Returns:
+    - Dictionary with rows (matched row positions, in data order), treated (label of the
+      matched group), n_pairs, n_treated, caliper, covariates and the covariate SMDs before
+      and after matching; None if the groups cannot be matched
+    """
+    split = factorize_groups(df, group_var)
+    if len(split["labels"]) != 2 or not covariates:
+        logger.warning("Propensity-score matching needs two groups and at least one covariate")
+        return None
+
+    def config_type(col):
+        return var_config[col]["type"] if col in var_config else "Omit"
+
+    designs = [design_columns(df[cov], config_type(cov), var_config[cov]["ref_val"] if cov in var_config else None)
+               for cov in covariates]
+    X = np.column_stack([matrix for matrix, _, _ in designs])
+    valid = np.logical_and.reduce([rows for _, rows, _ in designs]) & (split["codes"] >= 0)
+    treated_code = int(np.argmin(split["sizes"]))
+    treated = split["codes"] == treated_code
+
+    scores = logit_propensity(X, treated.astype(float), valid)
+    if scores is None:
+        logger.warning("The propensity model did not converge (a covariate may separate the groups); the table is not matched")
+        return None
+    cases, controls = caliper_match(scores, treated, caliper * np.nanstd(scores[valid]), valid)
+    rows = np.sort(np.concatenate([cases, controls]))
+
+    return {"rows": rows, "treated": split["labels"][treated_code], "n_pairs": len(cases),
+            "n_treated": int((treated & valid).sum()), "caliper": caliper, "covariates": tuple(covariates),
+            "smd_before": standardized_differences(np.where(valid[:, None], X, np.nan), treated),
+            "smd_after": standardized_differences(np.where(valid[:, None], X, np.nan), treated, rows)}
 
 # Function to perform aggregation analysis based on the variable type
-def perform_aggregate_analysis(df, group_var, var_type, var_name, decimal_places, output_format, col_var_config):
-    print("PERFORM AGG ANALYSIS", group_var, var_type, var_name, df[var_name].dropna().unique(), decimal_places, output_format, col_var_config)
+def perform_aggregate_analysis(df, group_var, var_type, var_name, decimal_places, output_format, col_var_config, cache=None, compute_odds_ratio=True):
+    print("PERFORM AGG ANALYSIS", group_var, var_type, var_name, decimal_places, output_format, col_var_config)
     groups = df[group_var].dropna().unique()
     if len(groups) != 2:
         print("Only supports two-group comparisons")
         return None  # Only supports two-group comparisons
     
-    # Check if the variable has a "Yes" option
-    yes_values = ['Yes', 'Y', 'y', 'yes', 1]
-    yn_var = None
-
-    var_options = df[var_name].dropna().unique()
-    for val in yes_values:
-        if val in var_options:
-            yn_var=val
-        
-    group1 = df[df[group_var] == groups[0]][var_name].dropna()
-    group2 = df[df[group_var] == groups[1]][var_name].dropna()
-
-    group1_total = len(group1)
-    group2_total = len(group2)
-    
     if var_type == "Omit":
         return None
     
-    elif var_type == "Categorical (Y/N)":
-        # count occurrences of yn_var in group 1 and group 2
-        group1_sum = (group1 == yn_var).sum()
-        group2_sum = (group2 == yn_var).sum()
-
-        # Store the aggregate values in var_config
-        if output_format == "n (%)":
-            col_var_config['group1'] = str(group2_sum)  + " (" + str(round(group2_sum / group2_total * 100, decimal_places)) + "%)"
-            col_var_config['group2'] = str(group1_sum) + " (" + str(round(group1_sum / group1_total * 100, decimal_places)) + "%)"
+    elif var_type in ("Categorical (Y/N)", "Categorical (Dichotomous)", "Categorical (Multinomial)"):
+        # Counts per level come from the same cached table as the p-value
+        if cache is None:
+            cache = ContingencyCache(df)
+        var_options, table = cache.get(var_name, group_var)
+        group_totals = table.sum(axis=0)
+
+        if var_type == "Categorical (Y/N)":
+            # Check if the variable has a "Yes" option
+            yes_values = ['Yes', 'Y', 'y', 'yes', 1]
+            yn_var = None
+            for val in yes_values:
+                if val in var_options:
+                    yn_var=val
+
+            # count occurrences of yn_var in group 1 and group 2
+            yes_counts = table[var_options.index(yn_var)] if yn_var is not None else np.zeros(2, dtype=int)
+            col_var_config['group1'] = format_count(int(yes_counts[0]), int(group_totals[0]), decimal_places, output_format)
+            col_var_config['group2'] = format_count(int(yes_counts[1]), int(group_totals[1]), decimal_places, output_format)
         else:
-            col_var_config['group1'] = str(round(group1_sum / group1_total * 100, decimal_places)) + "% (" + str(group1_sum) + ")"
-            col_var_config['group2'] = str(round(group2_sum / group2_total * 100, decimal_places)) + "% (" + str(group2_sum) + ")"
+            for i in range(len(var_options)):
+                col_var_config[f'group1_subgroup{i}'] = format_count(int(table[i, 0]), int(group_totals[0]), decimal_places, output_format)
+                col_var_config[f'group2_subgroup{i}'] = format_count(int(table[i, 1]), int(group_totals[1]), decimal_places, output_format)
 
-        col_var_config['odds_ratio'] = compute_odds_ratio_between_groups(group1, group2, reference_value=col_var_config['ref_val'])
-        
-    elif var_type == "Categorical (Dichotomous)" or var_type == "Categorical (Multinomial)":
-        print(var_options)
-        for i in range(len(var_options)):
-            group1_sum = (group1 == var_options[i]).sum()
-            group2_sum = (group2 == var_options[i]).sum()
-
-            if output_format == "n (%)":
-                col_var_config[f'group1_subgroup{i}'] = str(group1_sum) + " (" + str(round(group1_sum / group1_total * 100, decimal_places)) + "%)"
-                col_var_config[f'group2_subgroup{i}'] = str(group2_sum)  + " (" + str(round(group2_sum / group2_total * 100, decimal_places)) + "%)"
-            else:
-                col_var_config[f'group1_subgroup{i}'] = str(round(group1_sum / group1_total * 100, decimal_places)) + "% (" + str(group1_sum) + ")"
-                col_var_config[f'group2_subgroup{i}'] = str(round(group2_sum / group2_total * 100, decimal_places)) + "% (" + str(group2_sum) + ")"
-            
-            col_var_config['odds_ratio'] = compute_odds_ratio_between_groups(group1, group2, reference_value=col_var_config['ref_val'])
+        if compute_odds_ratio:
+            counts = cache.binary_counts(var_name, group_var, col_var_config['ref_val'])
+            col_var_config['odds_ratio'] = compute_odds_ratio_between_groups(None, None, reference_value=col_var_config['ref_val'], counts=counts)
 
     elif var_type == "Ratio Continuous":
+        group1 = df[df[group_var] == groups[0]][var_name].dropna()
+        group2 = df[df[group_var] == groups[1]][var_name].dropna()
+
         # Aggregate: Mean and Standard Deviation
         group1_mean = round(group1.mean(), decimal_places)
         group2_mean = round(group2.mean(), decimal_places)
@@ -207,6 +396,9 @@ def perform_aggregate_analysis(df, group_var, var_type, var_name, decimal_places
         col_var_config['group2'] = str(group2_mean) + " \u00B1 " + str(group2_std)
 
     elif var_type == "Ordinal Discrete":
+        group1 = df[df[group_var] == groups[0]][var_name].dropna()
+        group2 = df[df[group_var] == groups[1]][var_name].dropna()
+
         # Aggregate: Median and Interquartile Range (IQR)
         group1_median = group1.median()
         group2_median = group2.median()
@@ -218,49 +410,798 @@ def perform_aggregate_analysis(df, group_var, var_type, var_name, decimal_places
     
     return col_var_config
 
-# Function to create Word table from var_config
-def create_word_table(df,var_config, group_var, subheadings, subheading_names, table_name, odds_ratio, output_format):
+# Function to format a count as "n (%)" or "% (n)"
+def format_count(count, total, decimal_places, output_format):
+    percent = round(count / total * 100, decimal_places) if total > 0 else 0.0
+    if output_format == "n (%)":
+        return str(count) + " (" + str(percent) + "%)"
+    return str(percent) + "% (" + str(count) + ")"
+
+# Function to split a post-hoc p-value matrix into one record per variable
+def posthoc_results(p_values, labels, method, adjustment):
+    """
+    Adjusts post-hoc p-values within each variable's family of pairwise comparisons.
+
+    Parameters:
+    - p_values: (pairs x variables) array of unadjusted p-values
+    - labels: Group labels
+    - method: Post-hoc test used ("games-howell", "dunn", "fisher" or "chi2")
+    - adjustment: "holm" or "bh"
+
+    Returns:
+    - List with one dictionary per variable: pairs, p_values, adjusted, method, adjustment
+    """
+    i, j = pair_indices(len(labels))
+    pairs = [(labels[a], labels[b]) for a, b in zip(i, j)]
+    adjusted = adjust_pvalues(p_values, adjustment)
+    return [{"pairs": pairs, "p_values": p_values[:, v], "adjusted": adjusted[:, v],
+             "method": method, "adjustment": adjustment} for v in range(p_values.shape[1])]
+
+# Function to split batched effect sizes into one record per variable
+def effect_size_records(effects):
+    """
+    Parameters:
+    - effects: Dictionary {measure: (estimates, CI lows, CI highs)} of per-variable arrays
+
+    Returns:
+    - List with one dictionary {measure: (estimate, CI low, CI high)} per variable
+    """
+    n_vars = len(next(iter(effects.values()))[0])
+    return [{name: tuple(float(v[j]) for v in values) for name, values in effects.items()} for j in range(n_vars)]
+
+# Function to run a named test (see summary_tests) on every column of a numeric summary
+def run_summary_test(test_name, summary, k):
+    """
+    Returns:
+    - Tuple (np.ndarray of p-values, name of the test run: the two-group test or its k-group counterpart)
+    """
+    two_group, k_group, k_name = summary_tests[test_name]
+    _, p_values = two_group(summary) if k == 2 else k_group(summary)
+    return p_values, test_name if k == 2 else k_name
+
+# Function to perform p-value and aggregate analysis for all numeric variables in one pass
+def perform_batched_numeric_analysis(df, group_var, var_config, columns, split=None, posthoc=None, sensitivity=False,
+                                     normality=None, approximate=False, planner=None):
+    """
+    Batched replacement for calling run_statistical_test and perform_aggregate_analysis
+    on every "Ratio Continuous" / "Ordinal Discrete" column. The grouping column is
+    factorized once and all columns are summarized from one column matrix.
+
+    Ordinal columns go through the count-domain engine (summarize_ordinal_columns):
+    each one is reduced to a per-group histogram and summarized without sorting.
+    With two small groups the rank-sum p-value is exact (cached null distributions).
+
+    Continuous columns are screened for normality in every group (Shapiro-Wilk, or
+    D'Agostino-Pearson for large groups). Columns that pass in every group use Welch's
+    t-test (two groups) / Welch's ANOVA, the others the Mann-Whitney U test / Kruskal-Wallis.
+    Ordinal columns use the Wilcoxon rank sum / Kruskal-Wallis. More than two groups are
+    optionally followed by Games-Howell (normal) / Dunn comparisons of every pair of groups.
+    The tests are those named in default_tests and alternative_tests for the variable type
+    (run through summary_tests). In sensitivity mode the test that was not chosen runs on the
+    same summary, so it reuses the moments or the rank sums already computed.
+
+    In approximate mode continuous columns are read in chunks (sketch_numeric_columns)
+    instead of as one row matrix, so memory does not grow with the number of rows: means,
+    SDs and the Welch tests use the exact merged moments, the normality screen is the
+    D'Agostino-Pearson test from those moments, and the rank tests rank the values binned
+    at quantiles of KLL sketches (sketch_rank_sums, a second chunked pass run only when a
+    rank test is needed). Ordinal columns keep their exact statistics, but their per-group
+    histograms are counted chunk by chunk (chunked_ordinal_histograms) instead of from the
+    full column matrix.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_config: Dictionary of variable settings
+    - columns: List of numeric columns to analyze
+    - split: Optional output of factorize_groups to reuse
+    - posthoc: Optional p-value adjustment ("holm" or "bh") for post-hoc comparisons
+    - sensitivity: Also run the alternative test of every variable
+    - normality: Optional dictionary {column: normality record} of continuous columns screened before
+    - approximate: Read the columns chunk by chunk: continuous ones summarized with moments and
+      quantile sketches, ordinal ones counted into the same histograms
+    - planner: Optional TestPlanner; exact rank-sum tests that do not fit its time budget stay asymptotic
+
+    Returns:
+    - Dictionary {column: VariableResult}
+    """
+    if split is None:
+        split = factorize_groups(df, group_var)
+    k = len(split["labels"])
+    results = {}
+    if k < 2:
+        logger.warning("Grouping variable needs at least two groups")
+        return results
+
+    continuous = [col for col in columns if var_config[col]["type"] == "Ratio Continuous"]
+    ordinal = [col for col in columns if var_config[col]["type"] == "Ordinal Discrete"]
+
+    if continuous:
+        if approximate:
+            summary = sketch_numeric_columns(df, group_var, continuous, split=split)
+        else:
+            summary = summarize_numeric_columns(df, group_var, continuous, split=split)
+
+        # normality screen of the columns not screened by an earlier Calculate
+        normality = dict(normality or {})
+        unscreened = [j for j, col in enumerate(continuous) if col not in normality]
+        if unscreened:
+            screen_p, screen_methods = normality_tests(summary, unscreened)
+            for i, j in enumerate(unscreened):
+                normality[continuous[j]] = {"p_values": screen_p[:, i], "methods": list(screen_methods[:, i])}
+        normal = normality_screen(np.column_stack([normality[col]["p_values"] for col in continuous]))
+
+        # default (parametric) test for normal columns, the alternative (rank) test for the others;
+        # in sensitivity mode each column also gets the one it was not dispatched to
+        moment_p, moment_test = run_summary_test(default_tests["Ratio Continuous"], summary, k)
+        if approximate and (sensitivity or not normal.all() or (posthoc and k > 2)):
+            sketch_rank_sums(df, summary)
+        if sensitivity or not normal.all():
+            rank_p, rank_test = run_summary_test(alternative_tests["Ratio Continuous"], summary, k)
+        else:
+            rank_p, rank_test = np.full(len(continuous), np.nan), None  # every column is normal
+        p_values = np.where(normal, moment_p, rank_p)
+        alt_p_values = np.where(normal, rank_p, moment_p)
+
+        pairwise = None
+        if posthoc and k > 2:
+            pairwise = posthoc_results(games_howell(summary), split["labels"], "games-howell", posthoc)
+            if not normal.all():
+                rank_pairwise = posthoc_results(dunn_test(summary), split["labels"], "dunn", posthoc)
+                pairwise = [pairwise[j] if normal[j] else rank_pairwise[j] for j in range(len(continuous))]
+        effects = effect_size_records(mean_difference_effects(summary)) if k == 2 else None
+        for j, col in enumerate(continuous):
+            total = VariableResult("continuous", mean=summary["total_mean"][[j]], sd=summary["total_sd"][[j]],
+                                   totals=summary["total_n"][[j]])
+            results[col] = VariableResult("continuous", mean=summary["mean"][:, j], sd=summary["sd"][:, j],
+                                          totals=summary["n"][:, j], p_value=float(p_values[j]),
+                                          test_method=moment_test if normal[j] else rank_test, total=total,
+                                          posthoc=pairwise[j] if pairwise else None,
+                                          effect_sizes=effects[j] if effects else None,
+                                          normality=normality[col])
+            if approximate:
+                results[col].median, results[col].q1, results[col].q3 = summary["median"][:, j], summary["q1"][:, j], summary["q3"][:, j]
+                results[col].quantile_error = summary["rank_error"]
+            if sensitivity:
+                results[col].alt_p_value = float(alt_p_values[j])
+                results[col].alt_test_method = rank_test if normal[j] else moment_test
+
+    if ordinal:
+        summary = summarize_ordinal_columns(df, group_var, ordinal, split=split,
+                                            max_cells=default_chunk_cells if approximate else None)
+        _, p_values = rank_sum_test(summary) if k == 2 else kruskal_test(summary)
+        exact = np.zeros(len(ordinal), dtype=bool)
+        if k == 2:
+            # small groups: exact rank-sum distribution instead of the normal approximation
+            exact_p, exact = exact_rank_sum_test(summary, planner=planner)
+            p_values = np.where(exact, exact_p, p_values)
+        pairwise = posthoc_results(dunn_test(summary), split["labels"], "dunn", posthoc) if posthoc and k > 2 else None
+        if k == 2:
+            # ordinal SMD treats the scores as continuous; Cliff's delta reuses the rank sums of the test
+            effects = effect_size_records({"smd": mean_difference_effects(summary)["smd"], "cliffs_delta": cliffs_delta(summary)})
+        else:
+            effects = None
+        if sensitivity:
+            alt_p_values, alt_test = run_summary_test(alternative_tests["Ordinal Discrete"], summary, k)
+        for j, col in enumerate(ordinal):
+            total = VariableResult("ordinal", median=summary["total_median"][[j]], q1=summary["total_q1"][[j]],
+                                   q3=summary["total_q3"][[j]], totals=summary["total_n"][[j]])
+            results[col] = VariableResult("ordinal", median=summary["median"][:, j], q1=summary["q1"][:, j],
+                                          q3=summary["q3"][:, j], totals=summary["n"][:, j], p_value=float(p_values[j]),
+                                          test_method=("wilcoxon-exact" if exact[j] else "wilcoxon") if k == 2 else "kruskal",
+                                          total=total,
+                                          posthoc=pairwise[j] if pairwise else None,
+                                          effect_sizes=effects[j] if effects else None)
+            if sensitivity:
+                results[col].alt_p_value = float(alt_p_values[j])
+                results[col].alt_test_method = alt_test
+
+    return results
+
+# Function to perform p-value and count analysis for all categorical variables
+def perform_batched_categorical_analysis(df, group_var, var_config, columns, cache=None, posthoc=None, planner=None,
+                                         sensitivity=False):
+    """
+    Categorical path for any number of groups. Every variable is tabulated against
+    the same factorized group index (one bincount per variable), so the number of
+    arms does not add passes over the data. With more than two groups, pairwise
+    Fisher / chi-square comparisons are run on the same tables.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_config: Dictionary of variable settings
+    - columns: List of categorical columns to analyze
+    - cache: Optional ContingencyCache to reuse
+    - posthoc: Optional p-value adjustment ("holm" or "bh") for post-hoc comparisons
+    - planner: Optional TestPlanner choosing exact / Monte Carlo / chi-square for RxC tables
+    - sensitivity: Also run the alternative test (alternative_tests) of every variable on the same tables
+
+    Returns:
+    - Dictionary {column: VariableResult}
+    """
+    if cache is None:
+        cache = ContingencyCache(df)
+    if planner is None:
+        planner = TestPlanner()
+    labels = cache.split(group_var)["labels"]
+    k = len(labels)
+    yes_values = ['Yes', 'Y', 'y', 'yes', 1]
+    results = {}
+
+    # Fisher tests of all 2x2 tables (Y/N and Dichotomous variables) in one batched, memoized call
+    tabulated = {col: cache.get(col, group_var) for col in columns}
+    fisher_2x2 = {}
+    for col, (_, table) in tabulated.items():
+        trimmed = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+        if default_tests[var_config[col]["type"]] == "fisher" and trimmed.shape == (2, 2):
+            fisher_2x2[col] = trimmed
+    if fisher_2x2:
+        start = time.perf_counter()
+        batch_p = fisher_exact_2x2(np.array(list(fisher_2x2.values())))
+        planner.add_batch(fisher_2x2, "exact", fisher_batch_cost(len(fisher_2x2)), time.perf_counter() - start)
+        fisher_2x2 = {col: float(p) for col, p in zip(fisher_2x2, batch_p)}
+
+    # The remaining Fisher-Freeman-Halton tables get a strategy that fits the time budget
+    planned = {}
+    for col, (_, table) in tabulated.items():
+        trimmed = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+        if col not in fisher_2x2 and default_tests[var_config[col]["type"]] in ("fisher", "fisher-freeman-halton") \
+                and min(trimmed.shape) >= 2:
+            planned[col] = trimmed
+    planner.plan_tables(planned)
+
+    for col in columns:
+        var_type = var_config[col]["type"]
+        levels, table = tabulated[col]
+        if col in fisher_2x2:
+            p_value, method = fisher_2x2[col], "fisher"
+        elif col in planned:
+            p_value, method = planner.run_table(col, planned[col])
+        else:
+            p_value, method = contingency_test(table, default_tests[var_type])
+
+        kind = "binary" if var_type == "Categorical (Y/N)" else "levels"
+        if var_type == "Categorical (Y/N)":
+            yn_var = None
+            for val in yes_values:
+                if val in levels:
+                    yn_var = val
+            counts = table[[levels.index(yn_var)]] if yn_var is not None else np.zeros((1, k), dtype=int)
+            row_levels = [yn_var]
+        else:
+            counts = table
+            row_levels = levels
+        # Total column: row sums of the same contingency table
+        total = VariableResult(kind, levels=row_levels, counts=counts.sum(axis=1, keepdims=True),
+                               totals=np.array([table.sum()]))
+        results[col] = VariableResult(kind, levels=row_levels, counts=counts, totals=table.sum(axis=0),
+                                      p_value=p_value, test_method=method, total=total)
+
+    # Sensitivity mode: chi-square tests of the same tables, all in one padded stack
+    if sensitivity and columns:
+        # alternative test of each variable type on the same tables; chi-square tests run as one batch
+        by_test = {}
+        for col in columns:
+            by_test.setdefault(alternative_tests[var_config[col]["type"]], []).append(col)
+        for test_name, alt_cols in by_test.items():
+            if test_name == "chi2":
+                alt_results = [(p_value, "chi2") for p_value in chi2_tests([tabulated[col][1] for col in alt_cols])]
+            else:
+                alt_results = [contingency_test(tabulated[col][1], test_name) for col in alt_cols]
+            for col, (p_value, method) in zip(alt_cols, alt_results):
+                results[col].alt_p_value = None if p_value is None or np.isnan(p_value) else float(p_value)
+                results[col].alt_test_method = method or test_name
+
+    # Effect sizes of two-group comparisons from the same counts
+    if k == 2:
+        binary_cols = [col for col in columns if results[col].kind == "binary"]
+        if binary_cols:
+            effects = proportion_effects([results[col].counts[0] for col in binary_cols],
+                                         [results[col].totals for col in binary_cols])
+            for col, record in zip(binary_cols, effect_size_records(effects)):
+                results[col].effect_sizes = record
+        level_cols = [col for col in columns if results[col].kind == "levels"]
+        if level_cols:
+            effects = multinomial_smd([results[col].counts for col in level_cols])
+            for col, record in zip(level_cols, effect_size_records({"smd": effects})):
+                results[col].effect_sizes = record
+        dichotomous = [col for col in level_cols if var_config[col]["type"] == "Categorical (Dichotomous)"]
+        if dichotomous:
+            # risk difference of the non-reference level, from the same 2x2 tables as the odds ratio
+            tables = np.array([cache.binary_counts(col, group_var, var_config[col]["ref_val"]) for col in dichotomous])
+            effects = proportion_effects(tables[:, :, 0], tables.sum(axis=2))
+            for col, record in zip(dichotomous, effect_size_records({"risk_difference": effects["risk_difference"]})):
+                results[col].effect_sizes.update(record)
+
+    # Pairwise comparisons of every variable from the same tables, one batch per test
+    if posthoc and k > 2:
+        for test_type in ("fisher", "chi2"):
+            test_cols = [col for col in columns
+                         if ("chi2" if default_tests[var_config[col]["type"]] == "chi2" else "fisher") == test_type]
+            if test_cols:
+                p_values = pairwise_contingency([cache.get(col, group_var)[1] for col in test_cols], test_type,
+                                                planner=planner)
+                for col, pairwise in zip(test_cols, posthoc_results(p_values, labels, test_type, posthoc)):
+                    results[col].posthoc = pairwise
+
+    return results
+
+# Function to run the full per-variable analysis (p-values, aggregates, odds ratios)
+def analyze_variables(df, group_var, var_config, columns, settings, memo=None):
+    """
+    Runs every selected variable through the batched analysis paths. Results are kept
+    unformatted; format_results turns them into table cells.
+
+    Parameters:
+    - df: pd.DataFrame with the (raw or cleaned) data
+    - group_var: Name of the grouping column
+    - var_config: Dictionary of variable settings
+    - columns: Selected columns
+    - settings: Dictionary with missing_mode, odds_ratio_ci, pvalue_method and (optionally) posthoc,
+      deadline (time budget in seconds; tests are planned to finish within it) and adjust_for
+      (covariates of the adjusted odds ratios; None to skip them), sensitivity (also run the
+      alternative tests), bootstrap (number of bootstrap resamples for the confidence intervals; 0 to skip them)
+      and approximate (numeric variables read chunk by chunk: continuous ones summarized with moments and quantile sketches, ordinal ones counted into histograms), imputations (number of multiply
+      imputed datasets; 0 to analyze the data as it is) and impute_from (columns of the imputation models)
+    - memo: Optional ResultMemo; variables with unchanged inputs are restored from it
+
+    Returns:
+    - Dictionary {column: VariableResult}
+    """
+    if memo is None:
+        memo = ResultMemo()
+    if settings.get("imputations"):
+        return analyze_imputed_variables(df, group_var, var_config, columns, settings, memo=memo)
+
+    cache = ContingencyCache(df)  # One contingency table per variable, shared by p-values, counts and odds ratios
+    split = cache.split(group_var)  # Factorize the grouping column once for all variables
+    missing_mode = settings["missing_mode"]
+    odds_ratio_ci = settings["odds_ratio_ci"]
+    pvalue_method = settings["pvalue_method"]
+    posthoc = adjustment_methods.get(settings.get("posthoc", "None"))
+    deadline = settings.get("deadline", default_deadline)
+    sensitivity = bool(settings.get("sensitivity"))
+    n_bootstrap = int(settings.get("bootstrap") or 0)
+    approximate = bool(settings.get("approximate"))
+    adjust_for = settings.get("adjust_for")
+    adjust_for = None if adjust_for is None else tuple(col for col in adjust_for if col in df.columns and col != group_var)
+    # adjusted odds ratios depend on the covariate values as well
+    adjust_key = None if adjust_for is None else tuple(
+        (col, memo.fingerprint(df, col), var_config[col]["type"], var_config[col]["ref_val"]) for col in adjust_for)
+    planner = TestPlanner(deadline)
+    results = {}
+
+    # Reuse stored results for variables whose statistical inputs did not change
+    analysis_cols = [col for col in dict.fromkeys(columns) if col != group_var and col in df.columns
+                     and var_config[col]["type"] != "Omit"]
+    memo_keys = {}
+    pending_cols = []
+    for col in analysis_cols:
+        var_type = var_config[col]["type"]
+        budget = deadline if budget_dependent(cache, col, group_var, var_type, pvalue_method, n_bootstrap) else None
+        memo_keys[col] = memo.key(df, col, group_var, var_type, default_tests[var_type], missing_mode,
+                                  var_config[col]["ref_val"], odds_ratio_ci, pvalue_method, posthoc, budget, adjust_key, sensitivity,
+                                  n_bootstrap, approximate and var_type == "Ratio Continuous")
+        cached = memo.get(memo_keys[col])
+        if cached is not None:
+            results[col] = cached
+        else:
+            pending_cols.append(col)
+
+    # Normality screens only depend on the column and grouping values (and on the chunked mode, which has
+    # no Shapiro-Wilk test), so they outlive changes to the other settings
+    normality_keys = {col: (memo.fingerprint(df, col), memo.fingerprint(df, group_var), approximate) for col in pending_cols
+                      if var_config[col]["type"] == "Ratio Continuous"}
+    normality = {col: normality_memo.get(key) for col, key in normality_keys.items()}
+    normality = {col: record for col, record in normality.items() if record is not None}
+
+    numeric_cols = [col for col in pending_cols if var_config[col]["type"] in numeric_types]
+    categorical_cols = [col for col in pending_cols if col not in numeric_cols]
+
+    # Permutation mode runs last; keep enough time for the smallest useful number of permutations
+    permutation_stats = 0
+    if pvalue_method == "Permutation" and pending_cols:
+        permutation_stats = sum(1 if col in numeric_cols else df[col].nunique() for col in pending_cols)
+        planner.reserve(permutation_cost(len(df), permutation_stats, min_permutations))
+    bootstrap_stats = 0
+    if n_bootstrap and pending_cols:
+        bootstrap_stats = sum(1 if col in numeric_cols else df[col].nunique() for col in pending_cols)
+        planner.reserve(bootstrap_cost(len(df), bootstrap_stats, min_bootstraps))
+
+    # Numeric and categorical engines, sharded over columns by the selected executor
+    executor = settings.get("executor", default_executor)
+    workers = settings.get("workers") or os.cpu_count() or 1
+    local = executor != "process"  # threads (and the serial path) share the split and tables of this call
+    context = {
+        "group_var": group_var,
+        "var_config": {col: dict(var_config[col].items()) for col in pending_cols},
+        "posthoc": posthoc,
+        "sensitivity": sensitivity,
+        "normality": normality,
+        "approximate": approximate,
+        "budget": planner.remaining() - planner.reserved,
+        "workers": 1 if executor == "serial" else workers,
+        "n_columns": len(pending_cols),
+        "split": split if local else None,
+        "cache": cache if local else None,
+    }
+    results.update(run_sharded(analyze_shard, df, pending_cols, args=(context,), kind=executor, n_workers=workers,
+                               shared_columns=[group_var]))
+    planner.plans.update({col: results[col].plan for col in pending_cols if results[col].plan is not None})
+    for col, key in normality_keys.items():
+        if results[col].normality is not None:
+            normality_memo.put(key, results[col].normality)
+
+    # Odds ratios of all two-group categorical variables in one vectorized call
+    if len(split["labels"]) == 2:
+        perform_batched_odds_ratios(cache, group_var, var_config, results, categorical_cols, odds_ratio_ci)
+
+    # Covariate-adjusted odds ratios of every variable from stacked logistic models
+    if adjust_for is not None and len(split["labels"]) == 2 and pending_cols:
+        perform_batched_adjusted_odds_ratios(df, group_var, var_config, results, pending_cols, adjust_for, split=split)
+
+    # Opt-in permutation p-values for every variable from one set of shuffled labels
+    if pvalue_method == "Permutation" and pending_cols:
+        planner.reserved -= permutation_cost(len(df), permutation_stats, min_permutations)
+        n_permutations = planner.permutations(len(df), permutation_stats, default_permutations)
+        if n_permutations:
+            var_types = {col: var_config[col]["type"] for col in pending_cols}
+            start = time.perf_counter()
+            p_values = permutation_pvalues(df, group_var, var_types, n_permutations=n_permutations,
+                                           n_workers=workers if executor == "process" else 1)
+            planner.add_batch(list(p_values), "permutation", permutation_cost(len(df), permutation_stats, n_permutations),
+                              time.perf_counter() - start, samples=n_permutations)
+            for col, p_value in p_values.items():
+                results[col].p_value = p_value
+                results[col].test_method = "permutation"
+        else:
+            logger.warning("Not enough time left for %d permutations; keeping the default tests", min_permutations)
+
+    # Opt-in bootstrap confidence intervals for every variable from one set of resampled index matrices
+    if n_bootstrap and pending_cols:
+        planner.reserved = 0.0
+        n_resamples = planner.bootstraps(len(df), bootstrap_stats, n_bootstrap)
+        if n_resamples:
+            var_types = {col: var_config[col]["type"] for col in pending_cols}
+            intervals = bootstrap_intervals(df, group_var, var_types, n_resamples=n_resamples,
+                                            n_workers=workers if executor == "process" else 1)
+            for col, interval in intervals.items():
+                interval["n_resamples"] = n_resamples
+                results[col].bootstrap = interval
+        else:
+            logger.warning("Not enough time left for %d bootstrap resamples; skipping the confidence intervals", min_bootstraps)
+
+    # Strategy and estimated vs actual time of every computed variable
+    planner.report(pending_cols)
+    for col in pending_cols:
+        results[col].plan = planner.plans.get(col)
+        memo.put(memo_keys[col], results[col])
+
+    return results
+
+# Function to run the numeric and categorical engines on one shard of columns (see executor.run_sharded)
+def analyze_shard(df, columns, context):
+    """
+    Runs the batched numeric and categorical analyses on a subset of the columns. In a
+    worker process df is rebuilt from shared memory and the group split is recomputed.
+
+    Parameters:
+    - df: pd.DataFrame with (at least) the grouping column and the shard's columns
+    - columns: Columns of this shard
+    - context: Dictionary with group_var, var_config, posthoc, sensitivity, normality (screens of earlier
+      Calculates), approximate, budget (seconds left for
+      the whole table), workers, n_columns (all shards) and optionally split and cache
+
+    Returns:
+    - Dictionary {column: VariableResult} with the TestPlan of each variable
+    """
+    group_var = context["group_var"]
+    var_config = context["var_config"]
+    cache = context["cache"] if context["cache"] is not None else ContingencyCache(df)
+    split = context["split"] if context["split"] is not None else cache.split(group_var)
+    # shards on the same worker run one after another, so each gets its share of the budget
+    share = min(1.0, context["workers"] * len(columns) / max(context["n_columns"], 1))
+    planner = TestPlanner(context["budget"] * share)
+    results = {}
+
+    # Numeric variables are analyzed together in one batched pass
+    numeric_cols = [col for col in columns if var_config[col]["type"] in numeric_types]
+    if numeric_cols:
+        start = time.perf_counter()
+        results.update(perform_batched_numeric_analysis(df, group_var, var_config, numeric_cols, split=split,
+                                                        posthoc=context["posthoc"], sensitivity=context["sensitivity"],
+                                                        normality=context["normality"], approximate=context["approximate"],
+                                                        planner=planner))
+        # exact rank-sum tests were recorded by the planner; the rest ran in the batched pass
+        batched = [col for col in numeric_cols if col not in planner.plans]
+        if batched:
+            planner.add_batch(batched, "asymptotic", numeric_cost(len(df), len(batched)), time.perf_counter() - start)
+
+    # Categorical variables share one contingency table each
+    categorical_cols = [col for col in columns if col not in numeric_cols]
+    if categorical_cols:
+        results.update(perform_batched_categorical_analysis(df, group_var, var_config, categorical_cols, cache=cache,
+                                                            posthoc=context["posthoc"], planner=planner,
+                                                            sensitivity=context["sensitivity"]))
+
+    for col in results:
+        results[col].plan = planner.plans.get(col)
+
+    return results
+
+# Function to impute one dataset and analyze it (see executor.run_tasks)
+def analyze_imputation(df, m, context):
+    """
+    Runs one chain of chained-equation imputation and the regular analysis on the completed
+    dataset. In a worker process df is a view of the shared-memory block; only this
+    imputation's copy of the selected columns is built.
+
+    Parameters:
+    - df: pd.DataFrame with the missing values as NaN
+    - m: Index of the imputation (picks its random seed)
+    - context: Dictionary with group_var, var_config, var_types (imputation model columns),
+      columns (to analyze), settings (for analyze_variables) and n_iterations
+
+    Returns:
+    - Dictionary {column: VariableResult} of this imputation
+    """
+    group_var = context["group_var"]
+    encoded = encode_imputation_data(df, group_var, context["var_types"])
+    values = chained_imputation(encoded, seed=(default_imputation_seed, m), n_iterations=context["n_iterations"])
+    used = list(dict.fromkeys([group_var] + context["columns"] + list(context["var_types"])
+                              + list(context["settings"].get("adjust_for") or ())))
+    completed = completed_frame(df, encoded, values, [col for col in used if col in df.columns])
+    return analyze_variables(completed, group_var, context["var_config"], context["columns"], context["settings"])
+
+# Function to check the pooled counts of an imputed categorical variable against the observed ones
+def check_pooled_counts(df, col, split, result):
+    """
+    Imputation only fills in missing values, so each pooled (level, group) count must lie between
+    the observed count and the observed count plus the missing values of that group. A count
+    outside these bounds means the imputations were pooled inconsistently; it is reported.
+
+    Parameters:
+    - df: pd.DataFrame with the missing values as NaN
+    - col: Name of the categorical column
+    - split: Output of factorize_groups for the grouping column
+    - result: Pooled VariableResult of kind "levels"
+
+    Returns:
+    - True if every pooled count is within its bounds
+    """
+    levels, table = contingency_table(df, col, split)
+    k = len(split["labels"])
+    group_codes = split["codes"]
+    missing = np.bincount(group_codes[df[col].isna().to_numpy() & (group_codes >= 0)], minlength=k)
+    rows = {str(level): i for i, level in enumerate(levels)}
+    observed = np.array([table[rows[str(level)]] if str(level) in rows else np.zeros(k) for level in result.levels])
+    within = (result.counts >= observed) & (result.counts <= observed + missing[None, :])
+    if not within.all():
+        logger.warning("Pooled counts of %s are outside the observed bounds for levels %s",
+                       col, [result.levels[i] for i in np.flatnonzero(~within.all(axis=1))])
+    return bool(within.all())
+
+# Function to tell whether the time budget can change the result of a variable
+def budget_dependent(cache, col, group_var, var_type, pvalue_method, n_bootstrap):
+    """
+    The planner only downgrades Fisher-Freeman-Halton tests of tables larger than 2x2 (exact,
+    then Monte Carlo, then chi-square), and the budget sets the number of permutations and
+    bootstrap resamples. Every other result is the same under any budget, so its memo key
+    leaves the deadline out and changing the Time Budget does not recompute it.
+
+    Parameters:
+    - cache: ContingencyCache of the data (the table is reused by the categorical analysis)
+    - col: Variable column
+    - group_var: Grouping column
+    - var_type: Variable type
+    - pvalue_method: "Default" or "Permutation"
+    - n_bootstrap: Number of bootstrap resamples (0 for none)
+
+    Returns:
+    - True if the deadline must be part of the variable's memo key
+    """
+    if pvalue_method == "Permutation" or n_bootstrap:
+        return True
+    if var_type in numeric_types or default_tests[var_type] not in ("fisher", "fisher-freeman-halton"):
+        return False
+    table = cache.get(col, group_var)[1]
+    trimmed = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    return min(trimmed.shape) >= 2 and trimmed.shape != (2, 2)
+
+# Function to analyze the variables over multiply imputed datasets and pool the results
+def analyze_imputed_variables(df, group_var, var_config, columns, settings, memo=None):
+    """
+    Multiple imputation mode of analyze_variables. M datasets are completed by chained
+    equations over the impute_from columns (predictive mean matching for numeric variables,
+    logistic models for categorical ones, the grouping column as a predictor of all of them),
+    each one is analyzed as usual and the results are pooled with Rubin's rules (p-values
+    with the D2 rule). The imputations run in parallel with the selected executor; worker
+    processes share one copy of the data.
+
+    Parameters: as analyze_variables; settings["imputations"] is M
+
+    Returns:
+    - Dictionary {column: VariableResult} with the imputation details of each variable
+    """
+    if memo is None:
+        memo = ResultMemo()
+    n_imputations = int(settings["imputations"])
+    executor = settings.get("executor", default_executor)
+    workers = settings.get("workers") or os.cpu_count() or 1
+    sources = settings.get("impute_from") or columns
+    predictors = [col for col in dict.fromkeys(sources) if col in df.columns and col != group_var
+                  and var_config[col]["type"] != "Omit"]
+    analysis_cols = [col for col in dict.fromkeys(columns) if col != group_var and col in df.columns
+                     and var_config[col]["type"] != "Omit"]
+
+    # every imputation model uses all predictors, so they are part of every variable's key
+    imputation_key = (n_imputations, tuple((col, memo.fingerprint(df, col), var_config[col]["type"]) for col in predictors))
+    adjust_for = settings.get("adjust_for")
+    adjust_key = None if adjust_for is None else tuple(
+        (col, memo.fingerprint(df, col), var_config[col]["type"], var_config[col]["ref_val"]) for col in adjust_for if col in df.columns)
+    cache = ContingencyCache(df)
+    results = {}
+    memo_keys = {}
+    pending_cols = []
+    for col in analysis_cols:
+        var_type = var_config[col]["type"]
+        # bootstrap intervals are not pooled, so only the planned tables and permutations use the budget
+        budget = settings.get("deadline") if budget_dependent(cache, col, group_var, var_type, settings["pvalue_method"], 0) else None
+        memo_keys[col] = memo.key(df, col, group_var, var_type, default_tests[var_type], settings["missing_mode"],
+                                  var_config[col]["ref_val"], settings["odds_ratio_ci"], settings["pvalue_method"],
+                                  settings.get("posthoc"), budget, adjust_key, bool(settings.get("sensitivity")),
+                                  bool(settings.get("approximate")) and var_type == "Ratio Continuous", imputation_key)
+        cached = memo.get(memo_keys[col])
+        if cached is not None:
+            results[col] = cached
+        else:
+            pending_cols.append(col)
+    if not pending_cols:
+        return results
+
+    # each imputation is analyzed serially inside its worker, with its share of the time budget;
+    # bootstrap intervals are not pooled, so they are skipped
+    rounds = -(-n_imputations // (1 if executor == "serial" else workers))
+    inner = dict(settings, imputations=0, impute_from=None, executor="serial", bootstrap=0,
+                 deadline=settings.get("deadline", default_deadline) / rounds)
+    # categorical levels in their observed order: the pooled tables list them in this order
+    observed_levels = {col: list(pd.factorize(df[col], sort=False)[1]) for col in pending_cols
+                       if var_config[col]["type"] not in numeric_types}
+    inner_config = {col: dict(var_config[col].items()) for col in set(predictors + pending_cols + list(adjust_for or ()))
+                    if col in var_config}
+    for col, config in inner_config.items():
+        # a multinomial variable without a valid reference is modeled against its first level,
+        # which must be the same level in every completed dataset
+        levels = [str(level) for level in pd.factorize(df[col], sort=False)[1]] if config["type"] not in numeric_types else []
+        if config["type"] not in ("Categorical (Y/N)", "Categorical (Dichotomous)") and levels and str(config["ref_val"]) not in levels:
+            config["ref_val"] = levels[0]
+    context = {
+        "group_var": group_var,
+        "var_config": inner_config,
+        "var_types": {col: var_config[col]["type"] for col in predictors},
+        "columns": pending_cols,
+        "settings": inner,
+        "n_iterations": default_imputation_iterations,
+    }
+    imputed = run_tasks(analyze_imputation, df, range(n_imputations), args=(context,), kind=executor, n_workers=workers,
+                        columns=[col for col in dict.fromkeys([group_var] + predictors + pending_cols + list(adjust_for or ()))
+                                 if col in df.columns])
+
+    missing = {col: int(df[col].isna().sum()) for col in pending_cols}
+    split = factorize_groups(df, group_var)
+    for col, result in pool_results(imputed, pending_cols, observed_levels).items():
+        result.imputation = {"n_imputations": n_imputations, "n_iterations": default_imputation_iterations,
+                             "n_missing": missing[col]}
+        if result.kind == "levels":
+            check_pooled_counts(df, col, split, result)
+        results[col] = result
+        memo.put(memo_keys[col], result)
+    return results
+
+# Function to create Word table from var_config and the numeric results
+def create_word_table(df,var_config, results, group_var, subheadings, subheading_names, table_name, odds_ratio, output_format, decimals_tab, decimals_pval, show_total='No (Default)', effect_size='None (Default)', cells=None, split=None, adjusted_or='No (Default)',
+                      sensitivity='No (Default)', matching=None):
     if odds_ratio == 'Yes':
         odds_ratio = True
     else:
         odds_ratio = False
+    show_total = show_total == 'Yes'
+
+    # Cells are formatted here from the unformatted results, so format changes never recompute statistics
+    if cells is None:
+        cells = format_results(results, decimals_tab, decimals_pval, output_format)
+
+    # One column per group (after the optional Total column), followed by P-Value (and Odds Ratio)
+    if split is None:
+        split = factorize_groups(df, group_var)
+    group_labels = split["labels"]
+    k = len(group_labels)
+    first_group = 2 if show_total else 1
+    p_col = k + first_group
+
+    # Optional alternative-test p-value right after the default one (sensitivity mode)
+    show_alt = sensitivity == 'Yes' and any(result.alt_test_method is not None for result in results.values())
+    alt_col = p_col + 1
+    or_col = alt_col + 1 if show_alt else p_col + 1
+
+    # Optional adjusted odds ratio and its likelihood ratio p-value (two groups only), after P-Value / Odds Ratio
+    show_aor = adjusted_or == 'Yes' and k == 2
+    aor_col = or_col + 1 if odds_ratio else or_col
+    ap_col = aor_col + 1
+
+    # Optional effect size column (two groups only), after the odds ratio columns
+    es_key = {"SMD": "smd", "Type-specific": "effect_size"}.get(effect_size)
+    show_es = es_key is not None and k == 2
+    es_col = ap_col + 1 if show_aor else aor_col
+
+    # Optional bootstrap difference column (two groups only, when the intervals were computed), last
+    show_boot = k == 2 and any(result.bootstrap is not None for result in results.values())
+    boot_col = es_col + 1 if show_es else es_col
+    n_cols = boot_col + 1 if show_boot else boot_col
 
     # Create a new Word Document
     doc = Document()
 
-    # Create the table with columns for Variable, Group 1, Group 2, P-Value
-    if odds_ratio:
-        table = doc.add_table(rows=1, cols=5)
-    else:
-        table = doc.add_table(rows=1, cols=4)
+    # Create the table with columns for Variable, [Total], Group 1..Group K, P-Value, [Alt. P-Value], [Odds Ratio], [Adjusted OR, Adj. P-Value], [Effect Size], [Difference]
+    table = doc.add_table(rows=1, cols=n_cols)
     table.columns[0].width=Inches(3)
-    table.columns[1].width=Inches(1.5)
-    table.columns[2].width=Inches(1.5)
-    table.columns[3].width=Inches(.5)
+    for c in range(1, p_col):
+        table.columns[c].width=Inches(3 / (p_col - 1))
+    table.columns[p_col].width=Inches(.5)
+    if show_alt:
+        table.columns[alt_col].width=Inches(.5)
     if odds_ratio:
-        table.columns[4].width=Inches(1.5)
+        table.columns[or_col].width=Inches(1.5)
+    if show_aor:
+        table.columns[aor_col].width=Inches(1.5)
+        table.columns[ap_col].width=Inches(.5)
+    if show_es:
+        table.columns[es_col].width=Inches(1.5)
+    if show_boot:
+        table.columns[boot_col].width=Inches(1.5)
 
     hdr_cells = table.rows[0].cells
     hdr_cells[0].text = 'Variable'
-    hdr_cells[1].text = f'{df[group_var].unique()[0]}'
-    hdr_cells[2].text = f'{df[group_var].unique()[1]}'
-    hdr_cells[3].text = 'P-Value'
+    if show_total:
+        hdr_cells[1].text = 'Total'
+    for g in range(k):
+        hdr_cells[g + first_group].text = f'{group_labels[g]}'
+    hdr_cells[p_col].text = 'P-Value'
+    if show_alt:
+        hdr_cells[alt_col].text = 'Alt. P-Value'
     if odds_ratio:
-        hdr_cells[4].text='Odds Ratio'
+        hdr_cells[or_col].text='Odds Ratio'
+    if show_aor:
+        hdr_cells[aor_col].text = 'Adjusted OR'
+        hdr_cells[ap_col].text = 'Adj. P-Value'
+    if show_es:
+        hdr_cells[es_col].text = 'SMD' if es_key == "smd" else 'Effect Size'
+    if show_boot:
+        hdr_cells[boot_col].text = 'Difference (95% CI)'
 
     
     for row in hdr_cells:
         row.paragraphs[0].runs[0].font.bold = True  # Bold formatting for the subheading row
         
-    group1_size = len(df[df[group_var] == df[group_var].unique()[0]])
-    group2_size = len(df[df[group_var] == df[group_var].unique()[1]])
     grp_cells = table.add_row().cells
     grp_cells[0].text = ''
-    grp_cells[1].text = '(n= ' + str(group1_size) + ")"
-    grp_cells[2].text = '(n= ' + str(group2_size) + ")"
-    grp_cells[3].text = ''
+    if show_total:
+        grp_cells[1].text = '(n= ' + str(int(np.sum(split["sizes"]))) + ")"
+    for g in range(k):
+        grp_cells[g + first_group].text = '(n= ' + str(split["sizes"][g]) + ")"
+    grp_cells[p_col].text = ''
+    if show_alt:
+        grp_cells[alt_col].text = ''
     if odds_ratio:
-        grp_cells[4].text = ''
+        grp_cells[or_col].text = ''
+    if show_aor:
+        grp_cells[aor_col].text = ''
+        grp_cells[ap_col].text = ''
+    if show_es:
+        grp_cells[es_col].text = ''
+    if show_boot:
+        grp_cells[boot_col].text = ''
 
 
     # Loop through subheadings
@@ -270,11 +1211,8 @@ def create_word_table(df,var_config, group_var, subheadings, subheading_names, t
         # Add a row for the subheading (this is the row header)
         row_cells = table.add_row().cells
         row_cells[0].text = f"{subheading_name}"  # Subheading name in the first column
-        row_cells[1].text = ''  # Leave empty for Group 1
-        row_cells[2].text = ''  # Leave empty for Group 2
-        row_cells[3].text = ''  # Leave empty for P-Value
-        if odds_ratio:
-            row_cells[4].text = ''  # Leave empty for Odds Ratio
+        for cell in row_cells[1:]:
+            cell.text = ''  # Leave empty for groups, P-Value and Odds Ratio
 
         row_cells[0].paragraphs[0].runs[0].font.bold = True  # Bold formatting for the subheading row
         
@@ -287,83 +1225,132 @@ def create_word_table(df,var_config, group_var, subheadings, subheading_names, t
         for var in sorted_subheading_vars:
             var_name = var_config[var]["name"]
             var_type = var_config[var]["type"]
-            if var_type == "Omit":
+            if var_type == "Omit" or var not in results:
                 continue
-            elif var_type == "Categorical (Y/N)":
+            var_cells = cells[var]
+
+            if var_type == "Categorical (Y/N)":
                 row_cells = table.add_row().cells
                 row_cells[0].text = f"   {var_name}"  
-                row_cells[1].text = str(var_config[var]["group1"])
-                row_cells[2].text = str(var_config[var]["group2"])
-                row_cells[3].text = str(var_config[var]["p_value"])
+                if show_total:
+                    row_cells[1].text = str(var_cells["total"])
+                for g in range(k):
+                    row_cells[g + first_group].text = str(var_cells[f"group{g + 1}"])
+                row_cells[p_col].text = str(var_cells["p_value"])
+                if show_alt:
+                    row_cells[alt_col].text = str(var_cells["alt_p_value"])
                 if odds_ratio:
-                    row_cells[4].text = str(var_config[var]["odds_ratio"])
+                    row_cells[or_col].text = str(var_cells["odds_ratio"])
+                if show_aor:
+                    row_cells[aor_col].text = str(var_cells["adjusted_or"])
+                    row_cells[ap_col].text = str(var_cells["adjusted_p"])
+                if show_es:
+                    row_cells[es_col].text = str(var_cells[es_key])
+                if show_boot:
+                    row_cells[boot_col].text = str(var_cells["bootstrap_difference"])
 
             elif var_type == "Categorical (Dichotomous)":
                 row_cells = table.add_row().cells
                 row_cells[0].text = f"   {var_name}"  
-                row_cells[1].text = ""
-                row_cells[2].text = ""
-                row_cells[3].text = ""
+                for cell in row_cells[1:p_col + 1]:
+                    cell.text = ""
                 
                 # row_cells[0].paragraphs[0].runs[0].font.underline = True
 
-                var_options = df[var].dropna().unique().tolist()
+                # reference level first; i keeps pointing at the level's counts
+                var_options = results[var].levels
                 ref_val = var_config[var]["ref_val"]
-                if ref_val in var_options:
-                    var_options.remove(ref_val)
-                    var_options.insert(0, ref_val)
+                level_order = sorted(range(len(var_options)), key=lambda i: str(var_options[i]) != str(ref_val))
                 
-                for i in range(len(var_options)):
+                for i in level_order:
+                    is_ref = str(var_options[i]) == str(ref_val)
                     row_cells = table.add_row().cells
                     row_cells[0].text = f"      {var_options[i]}"  
-                    row_cells[1].text = str(var_config[var][f"group1_subgroup{i}"])
-                    row_cells[2].text = str(var_config[var][f"group2_subgroup{i}"])
-                    if var_options[i] == var_config[var]["ref_val"]:
-                        row_cells[3].text = str(var_config[var]["p_value"])
+                    if show_total:
+                        row_cells[1].text = str(var_cells[f"total_subgroup{i}"])
+                    for g in range(k):
+                        row_cells[g + first_group].text = str(var_cells[f"group{g + 1}_subgroup{i}"])
+                    if is_ref:
+                        row_cells[p_col].text = str(var_cells["p_value"])
+                        if show_alt:
+                            row_cells[alt_col].text = str(var_cells["alt_p_value"])
                     else:
-                        row_cells[3].text = "-"
-                    if var_options[i] == var_config[var]["ref_val"] and odds_ratio:
-                        row_cells[4].text = str(var_config[var]["odds_ratio"])
+                        row_cells[p_col].text = "-"
+                        if show_alt:
+                            row_cells[alt_col].text = "-"
+                    if is_ref and odds_ratio:
+                        row_cells[or_col].text = str(var_cells["odds_ratio"])
+                    if is_ref and show_aor:
+                        row_cells[aor_col].text = str(var_cells["adjusted_or"])
+                        row_cells[ap_col].text = str(var_cells["adjusted_p"])
+                    if is_ref and show_es:
+                        row_cells[es_col].text = str(var_cells[es_key])
+                    if show_boot:
+                        row_cells[boot_col].text = str(var_cells.get(f"bootstrap_difference_subgroup{i}", "-"))
 
                     row_cells[0].paragraphs[0].runs[0].font.italic = True
 
             elif var_type == "Categorical (Multinomial)":
                 row_cells = table.add_row().cells
                 row_cells[0].text = f"   {var_name}"  
-                row_cells[1].text = ""
-                row_cells[2].text = ""
-                row_cells[3].text = ""
+                for cell in row_cells[1:p_col + 1]:
+                    cell.text = ""
 
                 # row_cells[0].paragraphs[0].runs[0].font.underline = True
 
-                var_options = df[var].dropna().unique()        
+                var_options = results[var].levels
                 for i in range(len(var_options)):
                     row_cells = table.add_row().cells
                     row_cells[0].text = f"      {var_options[i]}"  
-                    row_cells[1].text = str(var_config[var][f"group1_subgroup{i}"])
-                    row_cells[2].text = str(var_config[var][f"group2_subgroup{i}"])
+                    if show_total:
+                        row_cells[1].text = str(var_cells[f"total_subgroup{i}"])
+                    for g in range(k):
+                        row_cells[g + first_group].text = str(var_cells[f"group{g + 1}_subgroup{i}"])
                     if i == 0:
-                        row_cells[3].text = str(var_config[var]["p_value"])
+                        row_cells[p_col].text = str(var_cells["p_value"])
+                        if show_alt:
+                            row_cells[alt_col].text = str(var_cells["alt_p_value"])
                     else:
-                        row_cells[3].text = "-"
+                        row_cells[p_col].text = "-"
+                        if show_alt:
+                            row_cells[alt_col].text = "-"
+                    if show_aor:
+                        row_cells[aor_col].text = str(var_cells.get(f"adjusted_or_subgroup{i}", "-"))
+                    if i == 0 and show_aor:
+                        row_cells[ap_col].text = str(var_cells["adjusted_p"])
+                    if i == 0 and show_es:
+                        row_cells[es_col].text = str(var_cells[es_key])
+                    if show_boot:
+                        row_cells[boot_col].text = str(var_cells.get(f"bootstrap_difference_subgroup{i}", "-"))
 
                     row_cells[0].paragraphs[0].runs[0].font.italic = True
 
             elif var_type == "Ratio Continuous" or var_type == "Ordinal Discrete":
                 row_cells = table.add_row().cells
                 row_cells[0].text = f"   {var_name}"  
-                row_cells[1].text = str(var_config[var]["group1"])
-                row_cells[2].text = str(var_config[var]["group2"])
-                row_cells[3].text = str(var_config[var]["p_value"])
+                if show_total:
+                    row_cells[1].text = str(var_cells["total"])
+                for g in range(k):
+                    row_cells[g + first_group].text = str(var_cells[f"group{g + 1}"])
+                row_cells[p_col].text = str(var_cells["p_value"])
+                if show_alt:
+                    row_cells[alt_col].text = str(var_cells["alt_p_value"])
+                if show_aor:
+                    row_cells[aor_col].text = str(var_cells["adjusted_or"])
+                    row_cells[ap_col].text = str(var_cells["adjusted_p"])
+                if show_es:
+                    row_cells[es_col].text = str(var_cells[es_key])
+                if show_boot:
+                    row_cells[boot_col].text = str(var_cells["bootstrap_difference"])
 
     doc.add_page_break()  # Add a page break after the table
 
     # Add summary of statistical tests
-    present_types = set(config["type"] for config in var_config.values())
+    present_types = set(var_config[col]["type"] for col in results)
     sentences = []
 
     if any(t in present_types for t in ["Categorical (Y/N)", "Categorical (Dichotomous)"]):
-        test_name = "Fisher's exact test" #update when alternative stat test is added
+        test_name = "Fisher's exact test" if k == 2 else "the Fisher-Freeman-Halton test" #update when alternative stat test is added
         sentences.append(
             f"All dichotomous/binary variables were analyzed with {test_name} and are displayed as {output_format}."
         )
@@ -374,19 +1361,183 @@ def create_word_table(df,var_config, group_var, subheadings, subheading_names, t
             f"All multinomial variables were analyzed with {test_name} and are displayed as {output_format}."
         )
 
-    if "Ordinal Discrete" in present_types:
+    # Odds ratio confidence intervals
+    or_methods = set(result.odds_ratio_method for result in results.values() if result.odds_ratio_method is not None)
+    if odds_ratio and k == 2 and or_methods:
+        ci_name = "exact conditional" if "exact" in or_methods else "Woolf (logit)"
+        sentence = f"Odds ratios are reported with 95% {ci_name} confidence intervals."
+        if "haldane" in or_methods:
+            sentence += " Tables containing a zero cell were Haldane-Anscombe corrected (0.5 added to each cell)."
+        sentences.append(sentence)
+
+    # Sensitivity mode: alternative tests reported next to the default p-values
+    if show_alt:
+        alt_names = {"chi2": "the chi-square test", "mannwhitney": "the Mann-Whitney U test", "kruskal": "the Kruskal-Wallis test",
+                     "ttest": "Welch's t-test", "welch-anova": "Welch's ANOVA"}
+        kind_names = {"binary": "categorical", "levels": "categorical", "continuous": "continuous", "ordinal": "ordinal"}
+        used = []
+        for method, name in alt_names.items():
+            kinds = list(dict.fromkeys(kind_names[result.kind] for result in results.values() if result.alt_test_method == method))
+            if kinds:
+                used.append(f"{name} ({' and '.join(kinds)} variables)")
+        sentences.append(
+            f"As a sensitivity analysis, p-values of alternative tests are shown in the Alt. P-Value column: {', '.join(used)}."
+        )
+
+    # Adjusted odds ratios
+    adjusted = [result.adjusted_or for result in results.values() if result.adjusted_or is not None]
+    if show_aor and adjusted:
+        # covariates never adjust for themselves, so take the order from the fullest set
+        covariates = list(dict.fromkeys(cov for entry in sorted(adjusted, key=lambda e: -len(e["covariates"]))
+                                        for cov in entry["covariates"]))
+        adjusted_for = f"adjusted for {', '.join(var_config[cov]['name'] for cov in covariates)}" if covariates else "without further adjustment"
+        sentences.append(
+            f"Adjusted odds ratios (odds of {group_labels[0]} vs {group_labels[1]}) were estimated by logistic regression {adjusted_for}, with 95% Wald confidence intervals and likelihood ratio p-values; continuous and ordinal variables are reported per one-unit increase and multinomial levels against the reference level."
+        )
+
+    # Effect sizes
+    if show_es and es_key == "smd":
+        sentences.append(
+            f"Standardized mean differences (SMD, {group_labels[0]} vs {group_labels[1]}) are reported with 95% confidence intervals; categorical variables with more than two levels use the multivariate SMD of Yang and Dalton."
+        )
+    elif show_es:
+        sentences.append(
+            f"Effect sizes ({group_labels[0]} vs {group_labels[1]}, 95% confidence intervals) are Hedges' g for continuous variables, Cliff's delta for ordinal variables, risk differences for binary and dichotomous variables and the multivariate SMD of Yang and Dalton for multinomial variables."
+        )
+
+    # Bootstrap confidence intervals (second line of the group cells, Difference column)
+    resampled = [result.bootstrap["n_resamples"] for result in results.values() if result.bootstrap is not None]
+    if resampled:
+        sentence = (f"95% confidence intervals of the group means (continuous), medians (ordinal) and percentages (categorical), "
+                    f"shown in parentheses below each value, are percentile bootstrap intervals from {min(resampled):,} resamples drawn within each group.")
+        if show_boot:
+            sentence += f" The Difference column gives {group_labels[0]} minus {group_labels[1]} with its bootstrap 95% confidence interval."
+        sentences.append(sentence)
+
+    # Propensity-score matched cohort (the group sizes in the header are those of the matched rows)
+    if matching is not None:
+        covariate_names = ', '.join(var_config[cov]['name'] if cov in var_config else cov for cov in matching["covariates"])
+        sentences.append(
+            f"The table describes a propensity-score matched cohort: the probability of belonging to {matching['treated']} was estimated by logistic regression on {covariate_names}; "
+            f"{matching['n_pairs']:,} of {matching['n_treated']:,} {matching['treated']} patients were matched 1:1 without replacement to their nearest neighbour "
+            f"on the logit of the propensity score within a caliper of {matching['caliper']:g} standard deviations (greedy matching). "
+            f"The largest absolute standardized difference of the covariates was {np.nanmax(matching['smd_before']):.2f} before and {np.nanmax(matching['smd_after']):.2f} after matching."
+        )
+
+    # Multiple imputation of missing values
+    imputed = [result.imputation for result in results.values() if result.imputation is not None]
+    if imputed:
+        incomplete = [var_config[col]["name"] for col, result in results.items()
+                      if result.imputation is not None and result.imputation["n_missing"]]
+        sentences.append(
+            f"Missing values{' of ' + ', '.join(incomplete) if incomplete else ''} were multiply imputed by chained equations "
+            f"({imputed[0]['n_imputations']} imputed datasets, {imputed[0]['n_iterations']} iterations; predictive mean matching for "
+            f"continuous and ordinal variables and logistic regression for categorical variables, with the grouping variable as a predictor). "
+            f"Every dataset was analyzed as described; counts, means and medians are averaged over the imputations, odds ratios and effect sizes "
+            f"were pooled with Rubin's rules and p-values with the D2 rule of Li, Meng, Raghunathan and Rubin."
+        )
+
+    # Permutation mode replaces the p-values of every variable
+    permuted = [result.plan.samples for result in results.values() if result.test_method == "permutation" and result.plan is not None]
+    if any(result.test_method == "permutation" for result in results.values()):
+        n_permutations = min(permuted) if permuted else default_permutations
+        sentences.append(
+            f"P-values were obtained by permutation testing with {n_permutations:,} random permutations of the group labels."
+        )
+
+    # Report the variables whose exact test fell back to a Monte Carlo estimate
+    monte_carlo_vars = [var_config[col]["name"] for col, result in results.items() if result.test_method == "monte-carlo"]
+    if monte_carlo_vars:
+        sentences.append(
+            f"For {', '.join(monte_carlo_vars)}, exact enumeration exceeded the computational budget and the Fisher-Freeman-Halton p-value was estimated by Monte Carlo simulation ({default_mc_samples:,} simulated tables)."
+        )
+
+    # Variables the time budget only allowed an asymptotic test for
+    chi2_vars = [var_config[col]["name"] for col, result in results.items()
+                 if result.test_method == "chi2" and default_tests[var_config[col]["type"]] != "chi2"]
+    if chi2_vars:
+        sentences.append(
+            f"For {', '.join(chi2_vars)}, the exact test did not fit in the computational time budget and the chi-square test was used instead."
+        )
+
+    if "Ordinal Discrete" in present_types and k > 2:
+        sentences.append(
+            f"Ordinal discrete variables were compared across the {k} groups using a Kruskal-Wallis test and are displayed as median [interquartile range]."
+        )
+    elif "Ordinal Discrete" in present_types:
         sentences.append(
             "Ordinal discrete variables were analyzed using a Wilcoxon rank sum test and are displayed as median [interquartile range]."
         )
+        exact_vars = [var_config[col]["name"] for col, result in results.items() if result.test_method == "wilcoxon-exact"]
+        if exact_vars:
+            sentences.append(
+                f"For {', '.join(exact_vars)}, both groups had fewer than {default_exact_rank_sum_n} observations and the exact permutation distribution of the rank sum (conditional on ties) was used instead of the normal approximation."
+            )
 
     if "Ratio Continuous" in present_types:
+        # normality screen and the test each continuous variable was dispatched to
+        screened = [result.normality for result in results.values() if result.normality is not None]
+        shapiro = any("shapiro" in record["methods"] for record in screened)
+        large = any("dagostino" in record["methods"] for record in screened)
+        if shapiro or not large:
+            screen_name = "the Shapiro-Wilk test" + (f" (D'Agostino-Pearson test for groups of more than {shapiro_max_n:,} observations)" if large else "")
+        else:
+            screen_name = "the D'Agostino-Pearson test"
+        parametric, rank_based = ("Welch's t-test", "Mann-Whitney U test") if k == 2 else ("Welch's ANOVA", "Kruskal-Wallis test")
+        rank_method = "mannwhitney" if k == 2 else "kruskal"
+        rank_vars = [var_config[col]["name"] for col, result in results.items()
+                     if result.kind == "continuous" and result.normality is not None and result.test_method == rank_method]
+        sentence = (f"For continuous variables, normality was tested within each group using {screen_name}. "
+                    f"Variables that passed the normality test in every group (p ≥ {default_normality_alpha}) were compared using {parametric}")
+        if rank_vars:
+            sentence += f"; variables that failed it ({', '.join(rank_vars)}) were compared using the {rank_based}"
+        sentences.append(sentence + ". All continuous variables are displayed as mean ± standard deviation.")
+
+        # chunked summaries of large continuous variables
+        quantile_errors = [result.quantile_error for result in results.values()
+                           if result.kind == "continuous" and result.quantile_error is not None]
+        if quantile_errors:
+            sentence = ("Continuous variables were summarized in chunks to bound memory use; means, standard deviations "
+                        "and the normality screen used exactly merged moments")
+            ranked = any(result.kind == "continuous" and (rank_method in (result.test_method, result.alt_test_method)
+                                                          or (result.posthoc or {}).get("method") == "dunn")
+                         for result in results.values())
+            if ranked:
+                sentence += (f", and the rank-based tests ranked the values grouped into {default_rank_bins:,} bins at quantiles "
+                             f"estimated with KLL sketches (rank error within {max(quantile_errors):.1%})")
+            sentences.append(sentence + ".")
+
+    # Pairwise post-hoc comparisons (3+ groups)
+    posthoc_vars = [col for col in results if results[col].posthoc is not None]
+    if posthoc_vars:
+        posthoc_names = {"games-howell": "Games-Howell tests (normally distributed continuous)", "dunn": "Dunn's tests (ordinal and non-normal continuous)",
+                         "fisher": "pairwise Fisher's exact tests (categorical)", "chi2": "pairwise chi-square tests (categorical)"}
+        used = [posthoc_names[m] for m in posthoc_names if any(results[col].posthoc["method"] == m for col in posthoc_vars)]
+        adjustment = "Holm" if results[posthoc_vars[0]].posthoc["adjustment"] == "holm" else "Benjamini-Hochberg"
         sentences.append(
-            "For continuous variables, normality tests were applied using the Shapiro-Wilk test. If a variable failed the normality test (Shapiro-Wilk p < 0.05), then a non-parametric test (Mann-Whitney U test) was used for analysis. If a variable passed the normality test (Shapiro-Wilk p > 0.05), then a student's t-test was performed. All continuous variables are analyzed via student's t-test and are displayed as mean ± standard deviation."
+            f"Pairwise post-hoc comparisons between groups used {', '.join(used)}, with {adjustment}-adjusted p-values within each variable."
         )
 
     var_config_summary = " ".join(sentences)
     doc.add_paragraph(var_config_summary)  
 
+    if posthoc_vars:
+        doc.add_paragraph("Pairwise Comparisons").runs[0].font.bold = True
+        posthoc_table = doc.add_table(rows=1, cols=3)
+        hdr_cells = posthoc_table.rows[0].cells
+        hdr_cells[0].text = 'Variable'
+        hdr_cells[1].text = 'Comparison'
+        hdr_cells[2].text = 'Adjusted P-Value'
+        for cell in hdr_cells:
+            cell.paragraphs[0].runs[0].font.bold = True
+        for col in posthoc_vars:
+            pairwise = results[col].posthoc
+            for (label_a, label_b), p_value in zip(pairwise["pairs"], format_p_values(pairwise["adjusted"], decimals_pval)):
+                row_cells = posthoc_table.add_row().cells
+                row_cells[0].text = str(var_config[col]["name"])
+                row_cells[1].text = f"{label_a} vs {label_b}"
+                row_cells[2].text = p_value
+
     # Save the document to a file
     table_name = re.sub(r'\W+', '', table_name.strip())
     if table_name == "":
@@ -467,12 +1618,28 @@ app_ui = ui.page_fluid(
         # Formatting Options
         ui.card(ui.input_numeric("decimals_table", "Table - # Decimals", 2, min=0, max=5)),
         ui.card(ui.input_numeric("decimals_pvalue", "P-Val - # Decimals", 3, min=0, max=5)),
-        ui.card(ui.input_radio_buttons("output_format", "Output Format", ["n (%)", "% (n)"])),
-        ui.card(ui.input_radio_buttons("show_odds_ratio", "Show Odds Ratio", ["No (Default)", "Yes"])),
-        ui.card(ui.input_radio_buttons("remove_blanks", "Remove Unknown Values", ["No (Default)", "Yes"])),
+        ui.card(ui.input_radio_buttons("output_format", "Output Format", ["n (%)", "% (n)"]),
+                ui.input_radio_buttons("show_total", "Show Total Column", ["No (Default)", "Yes"]),
+                ui.input_radio_buttons("effect_size", "Effect Size Column (2 Groups)", ["None (Default)", "SMD", "Type-specific"]),
+                ui.input_radio_buttons("bootstrap", "Bootstrap 95% CIs", list(bootstrap_inputs))),
+        ui.card(ui.input_radio_buttons("show_odds_ratio", "Show Odds Ratio", ["No (Default)", "Yes"]),
+                ui.input_radio_buttons("odds_ratio_ci", "Odds Ratio CI", ["Woolf", "Exact"]),
+                ui.input_radio_buttons("show_adjusted_or", "Show Adjusted Odds Ratio", ["No (Default)", "Yes"]),
+                ui.input_selectize("adjust_vars", "Adjust Odds Ratios For", [], multiple=True)),
+        ui.card(ui.input_radio_buttons("remove_blanks", "Remove Unknown Values", ["No (Default)", "Yes", "Multiple Imputation"]),
+                ui.input_numeric("n_imputations", "Imputed Datasets", default_imputations, min=2, max=100),
+                ui.input_radio_buttons("match_table", "Propensity-Score Matched Table (2 Groups)", ["No (Default)", "Yes"]),
+                ui.input_selectize("match_vars", "Match On", [], multiple=True),
+                ui.input_numeric("caliper", "Caliper (SD of Logit Score)", default_caliper, min=0.01, step=0.05)),
+        ui.card(ui.input_radio_buttons("pvalue_method", "P-Value Method", ["Default", "Permutation"]),
+                ui.input_radio_buttons("posthoc", "Post-hoc Comparisons (3+ Groups)", ["None", "Holm", "Benjamini-Hochberg"]),
+                ui.input_radio_buttons("sensitivity", "Sensitivity (Alternative Tests)", ["No (Default)", "Yes"]),
+                ui.input_radio_buttons("approximate", "Numeric Variables", ["In Memory (Default)", "Chunked (Large Data)"]),
+                ui.input_numeric("time_budget", "Time Budget (seconds)", default_deadline, min=1),
+                ui.input_radio_buttons("executor", "Parallel Execution", ["Serial (Default)", "Threads", "Processes"])),
         # ui.card(ui.input_radio_buttons("remove_blanks", ui.tags.span("Remove Unknown Values ",ui.tooltip(ui.icon("info-circle"),"Customize how each variable appears in the final table.")), ["No (Default)", "Yes"]),
         
-        col_widths= (2,2,2,2,4)
+        col_widths= (2,2,2,2,2,2)
         ),
 
     ui.h5("Step 4: Customize Table & Rows", class_="step-header"),
@@ -480,7 +1647,7 @@ app_ui = ui.page_fluid(
     ui.layout_columns(    
         ui.card(ui.tags.strong("Categorical (Y/N): "), "Fisher's Exact Test", ui.tags.em("ex: Smoking, Diabetes")),
         ui.card(ui.tags.strong("Categorical (Dichotomous): "), "Fisher's Exact Test", ui.tags.em("ex: Sex")),
-        ui.card(ui.tags.strong("Categorical (Multinomial): "), "\u03C72 test", ui.tags.em("ex: Race")),
+        ui.card(ui.tags.strong("Categorical (Multinomial): "), "Fisher-Freeman-Halton Test", ui.tags.em("ex: Race")),
         ui.card(ui.tags.strong("Ratio Continuous: "), "T-Test", ui.tags.em("ex: Age, GFR")),
         ui.card(ui.tags.strong("Ordinal Discrete: "), "Wilcoxon", ui.tags.em("ex: GCS, Tumor Grade")),
         ),
@@ -536,6 +1703,9 @@ def server(input, output, session):
         "subheading_3": reactive.Value([]),
         "subheading_4": reactive.Value([])
     }
+    result_memo = ResultMemo()  # Per-session memo of per-variable results (LRU bounded)
+    analysis_results = reactive.Value({})  # Unformatted results of the last Calculate
+    pipeline = AnalysisPipeline(analyze_variables, memo=result_memo, match=perform_propensity_matching)  # Recomputes only dirty variables
     subheading_names = { # Reactive values to track column assignments per subheading
         "subheading_1": reactive.Value("subheading_1"),
         "subheading_2": reactive.Value("subheading_2"),
@@ -592,26 +1762,26 @@ def server(input, output, session):
             data.set(df)  # Store data in reactive value
             clean_df = df.replace(missing_values, np.nan)
             cleaned_data.set(clean_df)  # Store cleaned data in reactive value
+            pipeline.set_data(df, clean_df)
             
             column_dict = {col: col for col in df.columns}
         
             default_type = "Omit"
             default_position = 15
             
-            # Store variable settings in a dictionary
+            # Store variable settings in a columnar config store
             if not var_config.get():
-                var_config.set({col: {
-                    "type": default_type, 
-                    "name": col, 
-                    "subheading": "subheading_1",
-                    "position": default_position,
-                    "ref_val": None,
-                } for col in df.columns})
+                store = VarConfigStore(df.columns, variable_types, default_type=default_type,
+                                       default_subheading="subheading_1", default_position=default_position)
+                store.subscribe(pipeline.on_config_change)  # Type/reference value edits dirty only that variable
+                var_config.set(store)
 
             ui.update_selectize(  
                 "column_selectize",  
                 choices={"":column_dict}
             )  
+            ui.update_selectize("adjust_vars", choices={"": column_dict})
+            ui.update_selectize("match_vars", choices={"": column_dict})
 
     def column_selectize():
         available_columns = input.column_selectize()
@@ -663,7 +1833,7 @@ def server(input, output, session):
 
     # Update columns under subheadings
     def generate_subheading_ui(subheading_key):
-        if input.remove_blanks() == "Yes":
+        if input.remove_blanks() != "No (Default)":
             df = cleaned_data.get()
         else:
             df = data.get()
@@ -787,27 +1957,31 @@ def server(input, output, session):
         if selected_columns.get() is None or len(selected_columns.get()) == 0:
             return
         
-        updated_config = var_config.get()
+        store = var_config.get()
 
         print("Currently Selected Columns",selected_columns.get())
         
         # for col in df.columns:
         for col in selected_columns.get():
             new_subheading = input[f"subheading_{col}"]()
-            old_subheading = var_config.get()[col]["subheading"]
+            old_subheading = store[col]["subheading"]
             
             new_subheading_mapped = next((k for k, v in subheading_names.items() if v() == new_subheading), None)
             old_subheading_mapped = next((k for k, v in subheading_names.items() if v() == old_subheading), "Subheading 1")
 
             print(new_subheading_mapped, old_subheading_mapped)
             
-            print("❗️ Updating configuration from...", updated_config[col])
-            updated_config[col]["type"] = input[f"var_type_{col}"]()
-            updated_config[col]["name"] = input[f"name_{col}"]() 
-            updated_config[col]["position"] = int(input[f"position_{col}"]())
-            updated_config[col]["subheading"] = input[f"subheading_{col}"]() 
-            updated_config[col]["ref_val"] = input[f"ref_val_{col}"]()
-            print("-                           to...", updated_config[col])
+            # Only the fields whose input differs from the stored value are written
+            changed = store.update(
+                col,
+                type=input[f"var_type_{col}"](),
+                name=input[f"name_{col}"](),
+                position=int(input[f"position_{col}"]()),
+                subheading=input[f"subheading_{col}"](),
+                ref_val=input[f"ref_val_{col}"](),
+            )
+            if changed:
+                print("❗️ Updated configuration of", col, "→", changed)
             
             # If the subheading has changed, move the column to the new subheading
             if new_subheading_mapped != old_subheading_mapped:
@@ -828,7 +2002,7 @@ def server(input, output, session):
                 generate_subheading_ui(old_subheading_mapped)
 
         print()
-        var_config.set(updated_config)  # Update stored config
+        store.clear_changes()  # the pipeline got these changes through its subscription; start the next update clean
 
     @reactive.effect
     def update_subheading_names():
@@ -852,7 +2026,7 @@ def server(input, output, session):
     @reactive.event(input.calculate)
     def calculate_statistical_analysis():
         print("🔄 Calculate button pressed. Updating variable configurations...")
-        if input.remove_blanks() == "Yes":
+        if input.remove_blanks() != "No (Default)":
             df = cleaned_data.get()
         else:
             df = data.get()
@@ -862,37 +2036,29 @@ def server(input, output, session):
         
         try:
             curr_group_var = group_var.get()  # Get the selected grouping column
-            decimals_pval = input.decimals_pvalue()
-            decimals_tab = input.decimals_table()
-            output_format = input.output_format()
     
             updated_config = var_config.get()
            
             # Perform statistical analysis using the grouping variable
             if len(selected_columns.get()) > 0:
-                for col in df.columns:
-                    if col != curr_group_var and col in selected_columns.get():
-                        print(f"\n📂 Processing Variable: {col}", updated_config[col])
-                        
-                        var_type = updated_config[col]["type"]
-                        
-                        if var_type != "Omit":
-                            p_value = run_statistical_test(df, curr_group_var, var_type, col, decimals_pval)
-                            
-                            # Store the p-value in the var_config dictionary
-                            updated_config[col]["p_value"] = p_value
-                            print(f"Column: {col}, Grouping Variable: {curr_group_var}, p-value: {p_value}")
-
-                            # Perform aggregate analysis and update var_config with the results
-                            aggregate_result = perform_aggregate_analysis(df, curr_group_var, var_type, col, decimals_tab, output_format, updated_config[col])
-                            if aggregate_result:
-                                updated_config[col].update(aggregate_result)
-                            
-                            print("After: ", updated_config[col])
-
-                var_config.set(updated_config)
-
-                print(var_config)
+                # Decimals and output format are applied at download time, so they are not inputs here
+                settings = {
+                    "missing_mode": input.remove_blanks(),
+                    "odds_ratio_ci": input.odds_ratio_ci().lower(),
+                    "pvalue_method": input.pvalue_method(),
+                    "posthoc": input.posthoc(),
+                    "deadline": float(input.time_budget() or default_deadline),
+                    "executor": executor_inputs[input.executor()],
+                    "adjust_for": tuple(input.adjust_vars() or ()) if input.show_adjusted_or() == "Yes" else None,
+                    "sensitivity": input.sensitivity() == "Yes",
+                    "bootstrap": bootstrap_inputs[input.bootstrap()],
+                    "approximate": input.approximate() == "Chunked (Large Data)",
+                    "imputations": int(input.n_imputations() or default_imputations) if input.remove_blanks() == "Multiple Imputation" else 0,
+                    "match_on": tuple(input.match_vars() or ()) if input.match_table() == "Yes" else None,
+                    "caliper": float(input.caliper() or default_caliper),
+                }
+                results = pipeline.run(updated_config, curr_group_var, selected_columns.get(), settings)
+                analysis_results.set(results)
 
                 ui.notification_show("✅ Calculation complete! File ready to download", duration=5, type="message")
         except:
@@ -903,7 +2069,7 @@ def server(input, output, session):
     @session.download()
     def download_table():
         # Retrieve the data and var_config
-        if input.remove_blanks() == "Yes":
+        if input.remove_blanks() != "No (Default)":
             df = cleaned_data.get()
         else:
             df = data.get()
@@ -912,8 +2078,10 @@ def server(input, output, session):
         if df is None or not isinstance(df, pd.DataFrame) or df.empty:  
             return None  # Return None if no data is available
         
-        # Generate the Word table document
-        doc_filename = create_word_table(df, updated_config, group_var.get(), subheadings, subheading_names, input.table_name(), input.show_odds_ratio(), input.output_format())  
+        # Generate the Word table document from the cached cells; only changed variables are reformatted
+        results = analysis_results.get()
+        cells = pipeline.cells(results, input.decimals_table(), input.decimals_pvalue(), input.output_format())
+        doc_filename = create_word_table(df, updated_config, results, group_var.get(), subheadings, subheading_names, input.table_name(), input.show_odds_ratio(), input.output_format(), input.decimals_table(), input.decimals_pvalue(), input.show_total(), input.effect_size(), cells=cells, split=pipeline.split(), adjusted_or=input.show_adjusted_or(), sensitivity=input.sensitivity(), matching=pipeline.matching)  
         
         return doc_filename  # Return the Word document file for download
 
@@ -0,0 +1,201 @@
+
+# imports
+import numpy as np
+
+# fields kept for every column
+config_fields = ("type", "name", "subheading", "position", "ref_val")
+
+
+class VarRecord:
+    """
+    Lightweight view of one column's settings inside a VarConfigStore.
+
+    Behaves like the old per-column dict (record["type"], record["position"] = 3, ...)
+    but holds only a reference to the store and the column's row index.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, field):
+        return self._store.get_field_at(self._index, field)
+
+    def __setitem__(self, field, value):
+        self._store.set_field(self._store.columns[self._index], field, value)
+
+    def get(self, field, default=None):
+        if field not in config_fields:
+            return default
+        return self[field]
+
+    def keys(self):
+        return config_fields
+
+    def items(self):
+        return [(field, self[field]) for field in config_fields]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"VarRecord({self.to_dict()})"
+
+
+class VarConfigStore:
+    """
+    Columnar store of the per-variable settings (type, display name, subheading,
+    position, reference value) for every column of the upload.
+
+    Types and subheadings are stored as small integer codes, positions as int64,
+    names and reference values as object arrays. Updates touch one slot and are
+    recorded in a change set {column: {fields}} that reactive code can drain or
+    subscribe to instead of invalidating the whole configuration.
+    """
+
+    def __init__(self, columns, variable_types, default_type="Omit", default_subheading="subheading_1", default_position=15):
+        self.columns = list(columns)
+        self.index = {col: i for i, col in enumerate(self.columns)}
+        n = len(self.columns)
+
+        self.type_labels = list(variable_types)
+        self.subheading_labels = [default_subheading]
+
+        self.type_codes = np.full(n, self.type_labels.index(default_type), dtype=np.int8)
+        self.subheading_codes = np.zeros(n, dtype=np.int16)
+        self.positions = np.full(n, default_position, dtype=np.int64)
+        self.names = np.array(self.columns, dtype=object)
+        self.ref_vals = np.full(n, None, dtype=object)
+
+        self.version = 0
+        self.changes = {}
+        self.listeners = []
+
+    # dict-style access, so existing var_config[col]["field"] code keeps working
+    def __getitem__(self, col):
+        return VarRecord(self, self.index[col])
+
+    def __contains__(self, col):
+        return col in self.index
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def keys(self):
+        return list(self.columns)
+
+    def values(self):
+        return [VarRecord(self, i) for i in range(len(self.columns))]
+
+    def items(self):
+        return [(col, VarRecord(self, i)) for i, col in enumerate(self.columns)]
+
+    def get_field_at(self, i, field):
+        if field == "type":
+            return self.type_labels[self.type_codes[i]]
+        elif field == "name":
+            return self.names[i]
+        elif field == "subheading":
+            return self.subheading_labels[self.subheading_codes[i]]
+        elif field == "position":
+            return int(self.positions[i])
+        elif field == "ref_val":
+            return self.ref_vals[i]
+        raise KeyError(field)
+
+    def set_field(self, col, field, value):
+        """
+        Sets one field of one column in O(1).
+
+        Returns:
+        - True if the value changed (the change is added to the change set)
+
+        Raises:
+        - ValueError if a position is not a whole number
+        """
+        i = self.index[col]
+        if field == "position":
+            # positions come from user input (or a loaded configuration): whole numbers only
+            try:
+                position = int(value)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Position of {col} must be a whole number, got {value!r}")
+            if position != value and str(position) != str(value).strip():
+                raise ValueError(f"Position of {col} must be a whole number, got {value!r}")
+            value = position
+        if self.get_field_at(i, field) == value:
+            return False
+
+        if field == "type":
+            self.type_codes[i] = self.type_labels.index(value)
+        elif field == "name":
+            self.names[i] = value
+        elif field == "subheading":
+            if value not in self.subheading_labels:
+                self.subheading_labels.append(value)
+            self.subheading_codes[i] = self.subheading_labels.index(value)
+        elif field == "position":
+            self.positions[i] = int(value)
+        elif field == "ref_val":
+            self.ref_vals[i] = value
+        else:
+            raise KeyError(field)
+
+        self.version += 1
+        self.changes.setdefault(col, set()).add(field)
+        for listener in self.listeners:
+            listener(col, field, value)
+        return True
+
+    def update(self, col, **fields):
+        """
+        Sets several fields of one column.
+
+        Returns:
+        - Set of the fields that actually changed
+        """
+        return {field for field, value in fields.items() if self.set_field(col, field, value)}
+
+    def drain_changes(self):
+        """
+        Returns the change set accumulated since the last call and clears it.
+        """
+        changes, self.changes = self.changes, {}
+        return changes
+
+    def clear_changes(self):
+        """
+        Forgets the change set accumulated so far (for callers that only listen through subscribe).
+        """
+        self.changes = {}
+
+    def subscribe(self, listener):
+        """
+        Registers listener(col, field, value), called after every change.
+        """
+        self.listeners.append(listener)
+
+    def columns_where(self, field, value):
+        """
+        Columns whose field equals value, using a vectorized comparison on the code arrays.
+        """
+        if field == "type":
+            mask = self.type_codes == self.type_labels.index(value)
+        elif field == "subheading":
+            if value not in self.subheading_labels:
+                return []
+            mask = self.subheading_codes == self.subheading_labels.index(value)
+        else:
+            mask = np.array([self.get_field_at(i, field) == value for i in range(len(self.columns))], dtype=bool)
+        return [self.columns[i] for i in np.flatnonzero(mask)]
+
+    def __getstate__(self):
+        # listeners are session callbacks and are not saved with the configuration
+        state = dict(self.__dict__)
+        state["listeners"] = []
+        return state
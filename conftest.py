@@ -0,0 +1,3 @@
+
+# hard_code_test.py is a manual script (it reads a local data file at import), not a test module
+collect_ignore = ["hard_code_test.py"]
@@ -0,0 +1,335 @@
+
+# imports
+import time
+from math import comb, lgamma
+import numpy as np
+from scipy import stats
+from scipy.special import gammaln
+
+# default settings for the Fisher-Freeman-Halton test
+default_node_budget = 200_000  # max network edges explored before switching to Monte Carlo
+default_mc_samples = 10_000  # Monte Carlo tables drawn for the fallback estimate
+default_mc_batch = 2_000  # tables drawn per batch
+default_seed = 20240101
+
+# exact rank-sum test when both groups have fewer values than this (as R's wilcox.test)
+default_exact_rank_sum_n = 50
+
+# relative tolerance used when comparing table probabilities (same as R's fisher.test)
+_log_tol = 1e-7
+
+
+class BudgetExceeded(Exception):
+    """Raised when the exact enumeration would exceed the configured node or time budget."""
+
+
+################################################################################
+######################### Fisher-Freeman-Halton (Exact) ########################
+################################################################################
+def _compositions(total, caps):
+    """
+    Yields every way to split `total` into len(caps) non-negative parts with part i <= caps[i].
+    """
+    if len(caps) == 1:
+        if total <= caps[0]:
+            yield (total,)
+        return
+    remaining_cap = sum(caps[1:])
+    for first in range(max(0, total - remaining_cap), min(total, caps[0]) + 1):
+        for rest in _compositions(total - first, caps[1:]):
+            yield (first,) + rest
+
+def _prepare(table):
+    """
+    Drops empty rows/columns and orients the table so the shorter margin is the
+    node key and the longer margin gives the stages of the network.
+    """
+    table = np.asarray(table, dtype=np.int64)
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    if table.shape[0] > table.shape[1]:
+        table = table.T
+    return table
+
+def ffh_cost_estimate(table):
+    """
+    Rough upper bound on the number of network edges the exact test would explore.
+
+    Each stage has at most prod(r_i + 1) distinct nodes and each node expands into
+    at most C(c_j + R - 1, R - 1) children.
+
+    Parameters:
+    - table: Contingency table (array-like of counts)
+
+    Returns:
+    - Estimated number of edges (float, may be inf for huge tables)
+    """
+    table = _prepare(table)
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return 0.0
+    rows = table.sum(axis=1)
+    cols = np.sort(table.sum(axis=0))[::-1]
+    r = len(rows)
+
+    max_nodes = float(np.prod(rows.astype(float) + 1))
+    paths = 1.0
+    cost = 0.0
+    for c in cols[:-1]:
+        children = np.exp(lgamma(c + r) - lgamma(c + 1) - lgamma(r))
+        cost += min(paths, max_nodes) * children
+        paths *= children
+    return cost
+
+def exact_feasible(table, node_budget=default_node_budget):
+    """
+    Whether the exact test is attempted at all: its estimated cost must be within
+    10x the node budget (the estimate is a loose upper bound).
+    """
+    return ffh_cost_estimate(table) <= node_budget * 10
+
+def ffh_exact(table, node_budget=default_node_budget, time_limit=None):
+    """
+    Exact Fisher-Freeman-Halton p-value for an RxC table using the network algorithm.
+
+    Columns are processed one stage at a time. A node is the (sorted) vector of row
+    totals still to be filled, so tables sharing a partial sum collapse into the
+    same node. The longest and shortest remaining paths of every node are memoized
+    and used to either count all completions of a partial table at once or prune
+    it, and partial tables with identical probability are merged at each node.
+
+    Parameters:
+    - table: Contingency table (array-like of counts)
+    - node_budget: Max number of network edges to explore
+    - time_limit: Optional max number of seconds before giving up
+
+    Returns:
+    - p-value (float)
+
+    Raises:
+    - BudgetExceeded if more than node_budget edges or time_limit seconds are needed
+    """
+    table = _prepare(table)
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return 1.0
+
+    rows = table.sum(axis=1)
+    cols = table.sum(axis=0)
+    n = int(table.sum())
+    # larger columns first keeps the number of distinct nodes small
+    col_order = np.argsort(-cols, kind="stable")
+    cols = [int(c) for c in cols[col_order]]
+    table = table[:, col_order]
+    stages = len(cols)
+
+    log_fact = [lgamma(i + 1) for i in range(n + 1)]
+    obs_log_p = (sum(log_fact[r] for r in rows) + sum(log_fact[c] for c in cols)
+                 - log_fact[n] - sum(log_fact[x] for x in table.ravel()))
+    threshold = obs_log_p + _log_tol
+
+    edges = [0]
+    children_memo = {}
+    stop_at = None if time_limit is None else time.perf_counter() + time_limit
+
+    def check_time():
+        if stop_at is not None and time.perf_counter() > stop_at:
+            raise BudgetExceeded(f"more than {time_limit:.2f} s")
+
+    def children(stage, remaining):
+        # all (log conditional probability, child node) pairs of a node
+        key = (stage, remaining)
+        if key in children_memo:
+            return children_memo[key]
+        check_time()
+        c = cols[stage]
+        n_rem = sum(remaining)
+        log_denominator = log_fact[n_rem] - log_fact[c] - log_fact[n_rem - c]
+        result = {}
+        for x in _compositions(c, remaining):
+            edges[0] += 1
+            if edges[0] > node_budget:
+                raise BudgetExceeded(f"more than {node_budget} network edges")
+            log_p = -log_denominator
+            for r_i, x_i in zip(remaining, x):
+                log_p += log_fact[r_i] - log_fact[x_i] - log_fact[r_i - x_i]
+            child = tuple(sorted(r_i - x_i for r_i, x_i in zip(remaining, x)))
+            # compositions leading to the same child with the same probability are merged
+            merge_key = (child, round(log_p, 10))
+            if merge_key in result:
+                result[merge_key][2] += 1
+            else:
+                result[merge_key] = [log_p, child, 1]
+        children_memo[key] = list(result.values())
+        return children_memo[key]
+
+    path_memo = {}
+
+    def path_bounds(stage, remaining):
+        # (longest, shortest) log probability of completing the table from this node
+        if stage == stages - 1:
+            return 0.0, 0.0
+        key = (stage, remaining)
+        if key not in path_memo:
+            longest, shortest = -np.inf, np.inf
+            for log_p, child, _ in children(stage, remaining):
+                child_long, child_short = path_bounds(stage + 1, child)
+                longest = max(longest, log_p + child_long)
+                shortest = min(shortest, log_p + child_short)
+            path_memo[key] = (longest, shortest)
+        return path_memo[key]
+
+    p_value = 0.0
+    # stage -> {node: {past log probability (rounded): [past log probability, multiplicity]}}
+    frontier = {tuple(sorted(int(r) for r in rows)): {0.0: [0.0, 1.0]}}
+    for stage in range(stages):
+        next_frontier = {}
+        for node, pasts in frontier.items():
+            check_time()
+            longest, shortest = path_bounds(stage, node)
+            for past, weight in pasts.values():
+                if past + longest <= threshold:
+                    # every completion is at most as likely as the observed table
+                    p_value += weight * np.exp(past)
+                    continue
+                if past + shortest > threshold:
+                    continue  # no completion can be as extreme as the observed table
+                for log_p, child, multiplicity in children(stage, node):
+                    new_past = past + log_p
+                    child_pasts = next_frontier.setdefault(child, {})
+                    merge_key = round(new_past, 10)
+                    if merge_key in child_pasts:
+                        child_pasts[merge_key][1] += weight * multiplicity
+                    else:
+                        child_pasts[merge_key] = [new_past, weight * multiplicity]
+        frontier = next_frontier
+
+    return float(min(p_value, 1.0))
+
+
+################################################################################
+###################### Fisher-Freeman-Halton (Monte Carlo) #####################
+################################################################################
+def ffh_monte_carlo(table, n_samples=default_mc_samples, seed=default_seed, batch_size=default_mc_batch):
+    """
+    Monte Carlo estimate of the Fisher-Freeman-Halton p-value.
+
+    Tables with the observed margins are drawn in batches from scipy's random_table
+    distribution and their probabilities are compared with the observed table in one
+    vectorized step per batch.
+
+    Parameters:
+    - table: Contingency table (array-like of counts)
+    - n_samples: Number of simulated tables
+    - seed: Seed for np.random.default_rng
+    - batch_size: Number of tables drawn per batch
+
+    Returns:
+    - p-value (float), computed as (1 + hits) / (1 + n_samples)
+    """
+    table = _prepare(table)
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return 1.0
+
+    rows = table.sum(axis=1)
+    cols = table.sum(axis=0)
+    rng = np.random.default_rng(seed)
+    dist = stats.random_table(rows, cols, seed=rng)
+
+    # only the cell terms vary between tables with fixed margins
+    obs_stat = -gammaln(table + 1).sum()
+    hits = 0
+    drawn = 0
+    while drawn < n_samples:
+        size = min(batch_size, n_samples - drawn)
+        samples = dist.rvs(size=size)
+        sample_stat = -gammaln(samples + 1).sum(axis=(1, 2))
+        hits += int((sample_stat <= obs_stat + _log_tol).sum())
+        drawn += size
+    return (1 + hits) / (1 + n_samples)
+
+
+def fisher_freeman_halton(table, node_budget=default_node_budget, n_samples=default_mc_samples, seed=default_seed,
+                          time_limit=None):
+    """
+    Fisher-Freeman-Halton test with automatic Monte Carlo fallback.
+
+    The exact network algorithm is used when its estimated cost fits in node_budget;
+    otherwise (or if the enumeration runs over budget) a seeded Monte Carlo estimate is returned.
+
+    Parameters:
+    - table: Contingency table (array-like of counts)
+    - node_budget: Max number of network edges for the exact test
+    - n_samples: Number of Monte Carlo tables for the fallback
+    - seed: Seed for the Monte Carlo fallback
+    - time_limit: Optional max number of seconds for the exact enumeration
+
+    Returns:
+    - Tuple (p_value, method) where method is "exact" or "monte-carlo"
+    """
+    if exact_feasible(table, node_budget):
+        try:
+            return ffh_exact(table, node_budget=node_budget, time_limit=time_limit), "exact"
+        except BudgetExceeded:
+            pass
+    return ffh_monte_carlo(table, n_samples=n_samples, seed=seed), "monte-carlo"
+
+
+################################################################################
+############################### Rank-Sum (Exact) ###############################
+################################################################################
+def rank_sum_null_distribution(n1, n2, ties):
+    """
+    Exact permutation distribution of the first group's rank sum, conditional on the ties.
+
+    Midranks are doubled so every rank is an integer. Tied values are interchangeable,
+    so the distribution is built one tie group at a time: taking c of the t values of a
+    group adds c times its doubled midrank and can be done in C(t, c) ways.
+
+    Parameters:
+    - n1: Number of values in the first group
+    - n2: Number of values in the second group
+    - ties: Sizes of the groups of tied values, in increasing order of value (sum n1 + n2)
+
+    Returns:
+    - np.ndarray where entry s is the number of ways the first group's doubled rank sum equals s
+    """
+    n = n1 + n2
+    if sum(ties) != n:
+        raise ValueError("Tie sizes must add up to n1 + n2")
+    top = n * (n + 1)  # doubled rank sum of all values
+    ways = np.zeros((n1 + 1, top + 1))
+    ways[0, 0] = 1.0
+    below = 0
+    for t in ties:
+        doubled_rank = 2 * below + t + 1
+        counts = np.zeros_like(ways)
+        for c in range(min(t, n1) + 1):
+            shift = c * doubled_rank
+            counts[c:, shift:] += comb(t, c) * ways[:n1 + 1 - c, :top + 1 - shift]
+        ways = counts
+        below += t
+    return ways[n1]
+
+def exact_rank_sum_pvalue(rank_sum, n1, n2, ties, cache=None):
+    """
+    Two-sided exact Wilcoxon rank-sum p-value (twice the smaller tail, at most 1).
+
+    Parameters:
+    - rank_sum: Observed (mid)rank sum of the first group
+    - n1, n2: Group sizes
+    - ties: Sizes of the groups of tied values, in increasing order of value
+    - cache: Optional store with get/put (e.g. memo.NullDistributionCache) keyed on (n1, n2, ties)
+
+    Returns:
+    - p-value
+    """
+    key = (int(n1), int(n2), tuple(int(t) for t in ties))
+    counts = cache.get(key) if cache is not None else None
+    if counts is None:
+        counts = rank_sum_null_distribution(*key)
+        if cache is not None:
+            cache.put(key, counts)
+
+    observed = int(round(2 * rank_sum))
+    total = counts.sum()
+    lower = counts[:observed + 1].sum() / total
+    upper = counts[observed:].sum() / total
+    return min(1.0, 2 * min(lower, upper))
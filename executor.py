@@ -0,0 +1,184 @@
+
+# imports
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# column execution backends
+executor_kinds = ("serial", "thread", "process")
+default_executor = "serial"
+default_shards_per_worker = 4  # more shards than workers evens out slow columns
+min_columns_per_shard = 25  # below this, batching inside one shard beats spreading columns out
+
+
+################################################################################
+############################ Shared-Memory DataFrame ###########################
+################################################################################
+class SharedFrame:
+    """
+    Columns of a DataFrame copied once into a single multiprocessing.shared_memory block.
+
+    Numeric and boolean columns are stored as their raw arrays and are read by the
+    workers without a copy. Other columns are stored as int32 codes plus a (small)
+    array of levels in order of appearance, so pd.factorize in a worker returns the
+    same levels in the same order as on the original column.
+
+    Only spec (block name + layout) is pickled to the workers, never the data.
+    """
+
+    def __init__(self, df, columns):
+        layout = []
+        arrays = []
+        offset = 0
+        for col in dict.fromkeys(columns):
+            series = df[col]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+                values, levels = series.to_numpy(), None
+            else:
+                codes, uniques = pd.factorize(series, sort=False)
+                values, levels = codes.astype(np.int32), np.asarray(uniques, dtype=object)
+            offset = -(-offset // 8) * 8  # keep every array 8-byte aligned
+            layout.append((col, values.dtype.str, offset, len(values), levels))
+            arrays.append(values)
+            offset += values.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (_, dtype, start, length, _), values in zip(layout, arrays):
+            np.ndarray(length, dtype=dtype, buffer=self.shm.buf, offset=start)[:] = values
+        self.spec = {"name": self.shm.name, "n_rows": len(df), "layout": layout}
+
+    @staticmethod
+    def attach(spec):
+        """
+        Opens the block in a worker and rebuilds the DataFrame on top of it.
+
+        Returns:
+        - Tuple (shm, df); keep shm referenced for as long as df is used
+        """
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        data = {}
+        for col, dtype, start, length, levels in spec["layout"]:
+            values = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=start)
+            if levels is None:
+                data[col] = values
+            else:
+                data[col] = np.where(values >= 0, levels.take(np.maximum(values, 0)) if len(levels) else None, np.nan)
+        return shm, pd.DataFrame(data, copy=False)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+################################################################################
+############################### Column Executor ################################
+################################################################################
+_worker_data = {}
+
+def _init_worker(spec):
+    # each worker attaches to the shared block once instead of receiving a copy per task
+    _worker_data["shm"], _worker_data["df"] = SharedFrame.attach(spec)
+
+def _run_shard(task):
+    fn, columns, args = task
+    return fn(_worker_data["df"], columns, *args)
+
+def _run_task(task):
+    fn, item, args = task
+    return fn(_worker_data["df"], item, *args)
+
+def shard_columns(columns, n_shards):
+    """
+    Splits columns into at most n_shards contiguous chunks of similar size.
+    """
+    n_shards = max(1, min(n_shards, len(columns) // min_columns_per_shard))
+    return [list(chunk) for chunk in np.array_split(np.array(columns, dtype=object), n_shards) if len(chunk)]
+
+def run_sharded(fn, df, columns, args=(), kind=default_executor, n_workers=None, shared_columns=()):
+    """
+    Runs fn(df, shard, *args) over shards of columns with the chosen backend.
+
+    - "serial": one call with every column (the batched engines vectorize across columns)
+    - "thread": a thread pool; NumPy sorts/reductions and SciPy kernels release the GIL
+    - "process": a process pool; workers read the columns (and shared_columns, e.g. the
+      grouping column) from one shared-memory block instead of unpickling a copy per task
+
+    fn must be a module-level function returning a dictionary; the shard results are merged.
+
+    Parameters:
+    - fn: Function (df, columns, *args) -> dict
+    - df: pd.DataFrame with the uploaded data
+    - columns: Columns to shard
+    - args: Extra arguments passed to every call (pickled once per task for "process")
+    - kind: "serial", "thread" or "process"
+    - n_workers: Number of workers (None = os.cpu_count())
+    - shared_columns: Columns every shard needs besides its own
+
+    Returns:
+    - Merged dictionary of all shard results
+    """
+    if kind not in executor_kinds:
+        raise ValueError(f"Unknown executor: {kind}")
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    shards = shard_columns(list(columns), n_workers * default_shards_per_worker)
+    if kind == "serial" or n_workers <= 1 or len(shards) <= 1:
+        return fn(df, list(columns), *args) if columns else {}
+
+    merged = {}
+    if kind == "thread":
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for result in executor.map(lambda shard: fn(df, shard, *args), shards):
+                merged.update(result)
+        return merged
+
+    shared = SharedFrame(df, list(shared_columns) + list(columns))
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(shards)), initializer=_init_worker,
+                                 initargs=(shared.spec,)) as executor:
+            for result in executor.map(_run_shard, [(fn, shard, args) for shard in shards]):
+                merged.update(result)
+    finally:
+        shared.close()
+    return merged
+
+def run_tasks(fn, df, items, args=(), kind=default_executor, n_workers=None, columns=None):
+    """
+    Runs fn(df, item, *args) once per item (e.g. one imputation each) with the chosen backend.
+
+    Unlike run_sharded every call sees the same columns: with "process", the columns are
+    copied once into one shared-memory block that all workers read, so the data is never
+    pickled per task and workers build only the (small) state their own item needs.
+
+    Parameters:
+    - fn: Module-level function (df, item, *args) -> result
+    - df: pd.DataFrame with the uploaded data
+    - items: Items to run fn on
+    - args: Extra arguments passed to every call
+    - kind: "serial", "thread" or "process"
+    - n_workers: Number of workers (None = os.cpu_count())
+    - columns: Columns fn reads (None = all)
+
+    Returns:
+    - List of results in the order of items
+    """
+    if kind not in executor_kinds:
+        raise ValueError(f"Unknown executor: {kind}")
+    items = list(items)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if kind == "serial" or n_workers <= 1 or len(items) <= 1:
+        return [fn(df, item, *args) for item in items]
+    if kind == "thread":
+        with ThreadPoolExecutor(max_workers=min(n_workers, len(items))) as executor:
+            return list(executor.map(lambda item: fn(df, item, *args), items))
+
+    shared = SharedFrame(df, list(df.columns) if columns is None else list(columns))
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(items)), initializer=_init_worker,
+                                 initargs=(shared.spec,)) as executor:
+            return list(executor.map(_run_task, [(fn, item, args) for item in items]))
+    finally:
+        shared.close()
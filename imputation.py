@@ -0,0 +1,398 @@
+
+# imports
+from collections import Counter
+import numpy as np
+import pandas as pd
+from scipy import stats
+from stats_engine import numeric_types
+from posthoc import adjust_pvalues
+
+# default settings for multiple imputation by chained equations
+default_imputations = 5
+default_imputation_iterations = 5  # as R's mice
+default_pmm_donors = 5  # candidates predictive mean matching draws from (as R's mice)
+default_imputation_seed = 20240101
+_ridge = 1e-5  # ridge penalty of the imputation models, relative to the diagonal (as R's mice)
+_z95 = stats.norm.ppf(0.975)  # the intervals pooled by Rubin's rules are 95% intervals
+
+
+################################################################################
+############################# Imputation Encodings #############################
+################################################################################
+def encode_imputation_data(df, group_var, var_types):
+    """
+    Encodes the variables of the imputation models once per dataset.
+
+    Parameters:
+    - df: pd.DataFrame with the missing values as NaN
+    - group_var: Name of the grouping column (a predictor of every model, never imputed)
+    - var_types: Dictionary {column: variable type}
+
+    Returns:
+    - Dictionary with:
+        - columns, kinds ("numeric" / "categorical") and levels (categorical levels or None)
+        - values: (rows x columns) float matrix; categorical columns hold level codes; NaN = missing
+        - group: one-hot (rows x groups - 1) matrix of the grouping column (zeros for a missing group)
+    """
+    columns = [col for col in var_types if col != group_var]
+    kinds, levels = [], []
+    values = np.empty((len(df), len(columns)))
+    for j, col in enumerate(columns):
+        if var_types[col] in numeric_types:
+            values[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+            kinds.append("numeric")
+            levels.append(None)
+        else:
+            codes, uniques = pd.factorize(df[col], sort=False)
+            values[:, j] = np.where(codes >= 0, codes, np.nan)
+            kinds.append("categorical")
+            levels.append(np.asarray(uniques, dtype=object))
+
+    group_codes, group_labels = pd.factorize(df[group_var], sort=False)
+    group = (group_codes[:, None] == np.arange(1, len(group_labels))[None, :]).astype(float)
+    return {"columns": columns, "kinds": kinds, "levels": levels, "values": values, "group": group}
+
+def _design_block(values, kind, n_levels):
+    # predictor columns of one variable: its standardized value, or one indicator per non-first level
+    if kind == "numeric":
+        sd = np.nanstd(values)
+        return ((values - np.nanmean(values)) / (sd if sd > 0 else 1.0))[:, None]
+    return (values[:, None] == np.arange(1, n_levels)[None, :]).astype(float)
+
+
+################################################################################
+########################### Chained Equations (MICE) ###########################
+################################################################################
+def _impute_pmm(X, y, observed, rng, donors=default_pmm_donors):
+    """
+    Bayesian linear regression draw followed by predictive mean matching: each missing
+    row takes the observed value of a random one of the `donors` observed rows whose
+    predictions are closest to its own. Donors are found by binary search in the sorted
+    observed predictions, so a column costs O(n log n) instead of O(n_missing x n_observed).
+    Imputed values are always values seen in the data (integer scores stay integers).
+    """
+    Xo, yo = X[observed], y[observed]
+    XtX = Xo.T @ Xo
+    V = np.linalg.inv(XtX + np.diag(_ridge * np.maximum(np.diag(XtX), 1.0)))
+    beta = V @ (Xo.T @ yo)
+    residual = yo - Xo @ beta
+    sigma = np.sqrt(residual @ residual / rng.chisquare(max(len(yo) - X.shape[1], 1)))
+    beta_draw = beta + sigma * np.linalg.cholesky(V) @ rng.standard_normal(X.shape[1])
+
+    fitted = Xo @ beta
+    order = np.argsort(fitted)
+    fitted = fitted[order]
+    predicted = X[~observed] @ beta_draw
+    donors = min(donors, len(fitted))
+    window = np.clip(np.searchsorted(fitted, predicted)[:, None] + np.arange(-donors, donors)[None, :], 0, len(fitted) - 1)
+    nearest = np.argsort(np.abs(fitted[window] - predicted[:, None]), axis=1, kind="stable")[:, :donors]
+    chosen = nearest[np.arange(len(predicted)), rng.integers(donors, size=len(predicted))]
+    return yo[order[window[np.arange(len(predicted)), chosen]]]
+
+def _shared_logistic(X, Y, max_iter=50, tol=1e-8):
+    """
+    Newton-Raphson fits of several logistic models on the same design matrix (the
+    one-vs-rest models of a categorical variable). Unlike stats_engine.logistic_newton,
+    the design is not stacked per model: each step is one (n x p) @ (p x models) product
+    and one X' W X product per model, all on the shared matrix.
+
+    Returns:
+    - Tuple (beta (models x p), cov (models x p x p), failed (models,)); failed models did
+      not converge, are rank deficient or are separated (|beta| >= 30)
+    """
+    n_models, p = Y.shape[1], X.shape[1]
+    beta = np.zeros((n_models, p))
+    H = np.empty((n_models, p, p))
+    converged = np.zeros(n_models, dtype=bool)
+    for _ in range(max_iter):
+        mu = np.clip(1 / (1 + np.exp(-(X @ beta.T))), 1e-12, 1 - 1e-12)
+        weights = mu * (1 - mu)
+        for l in range(n_models):
+            H[l] = (X * weights[:, l:l + 1]).T @ X
+        gradient = (X.T @ (Y - mu)).T
+        try:
+            step = np.linalg.solve(H, gradient[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = (np.linalg.pinv(H) @ gradient[:, :, None])[:, :, 0]
+        step = np.where(converged[:, None], 0.0, step)
+        beta += step
+        converged |= np.abs(step).max(axis=1) < tol
+        if converged.all():
+            break
+    failed = ~converged | (np.linalg.matrix_rank(H) < p) | (np.abs(beta) >= 30).any(axis=1)
+    return beta, np.linalg.pinv(H), failed
+
+def _impute_logistic(X, codes, observed, n_levels, rng):
+    """
+    Draws missing levels from logistic models with coefficients drawn from their
+    approximate posterior: one model for two levels, one-vs-rest models (fitted together
+    on the shared design) for more. A model that fails to converge (e.g. a level that is
+    perfectly predicted) falls back to the observed share of its level.
+    """
+    if n_levels < 2:
+        return np.zeros((~observed).sum())
+    levels = np.arange(1, n_levels) if n_levels == 2 else np.arange(n_levels)
+    y = (codes[observed][:, None] == levels[None, :]).astype(float)
+    beta, cov, failed = _shared_logistic(X[observed], y)
+
+    share = np.clip(y.mean(axis=0), 1e-6, 1 - 1e-6)
+    beta = np.where(failed[:, None], 0.0, beta)
+    cov = np.where(failed[:, None, None], np.eye(X.shape[1]), cov)
+    chol = np.linalg.cholesky(cov + 1e-10 * np.eye(X.shape[1])[None])
+    draw = beta + (chol @ rng.standard_normal((len(levels), X.shape[1], 1)))[:, :, 0]
+    probs = 1 / (1 + np.exp(-(X[~observed] @ draw.T)))
+    probs = np.where(failed[None, :], share[None, :], probs)
+    if n_levels == 2:
+        probs = np.column_stack([1 - probs[:, 0], probs[:, 0]])
+    probs /= probs.sum(axis=1, keepdims=True)
+    return (probs.cumsum(axis=1) < rng.random(len(probs))[:, None]).sum(axis=1).clip(0, n_levels - 1).astype(float)
+
+def chained_imputation(encoded, seed=default_imputation_seed, n_iterations=default_imputation_iterations,
+                       donors=default_pmm_donors):
+    """
+    One chain of multiple imputation by chained equations. Missing values start as random
+    draws of the observed values; every iteration then re-imputes each incomplete column
+    from the grouping column and the current values of all other columns.
+
+    Parameters:
+    - encoded: Output of encode_imputation_data
+    - seed: Seed of this chain (each imputation uses its own)
+    - n_iterations: Passes over the incomplete columns
+    - donors: Candidates of predictive mean matching
+
+    Returns:
+    - (rows x columns) matrix with the missing values filled in (columns without any
+      observed value stay missing)
+    """
+    rng = np.random.default_rng(seed)
+    values = encoded["values"].copy()
+    missing = np.isnan(values)
+    n_levels = [len(levels) if levels is not None else 0 for levels in encoded["levels"]]
+    targets = [j for j in range(values.shape[1]) if missing[:, j].any() and not missing[:, j].all()]
+    for j in targets:
+        observed = values[~missing[:, j], j]
+        values[missing[:, j], j] = rng.choice(observed, missing[:, j].sum())
+
+    base = np.column_stack([np.ones(len(values)), encoded["group"]])
+    blocks = [_design_block(np.nan_to_num(values[:, j]), kind, n_levels[j]) for j, kind in enumerate(encoded["kinds"])]
+    for _ in range(n_iterations if targets else 0):
+        for j in targets:
+            X = np.column_stack([base] + [block for i, block in enumerate(blocks) if i != j])
+            if encoded["kinds"][j] == "numeric":
+                values[missing[:, j], j] = _impute_pmm(X, values[:, j], ~missing[:, j], rng, donors)
+            else:
+                values[missing[:, j], j] = _impute_logistic(X, values[:, j], ~missing[:, j], n_levels[j], rng)
+            blocks[j] = _design_block(values[:, j], encoded["kinds"][j], n_levels[j])
+    return values
+
+def completed_frame(df, encoded, values, columns):
+    """
+    One completed dataset: the given columns with their imputed values, other columns as they are.
+    """
+    data = {}
+    for col in columns:
+        if col not in encoded["columns"]:
+            data[col] = df[col]
+            continue
+        j = encoded["columns"].index(col)
+        if encoded["levels"][j] is None:
+            data[col] = pd.Series(values[:, j], index=df.index)
+        else:
+            codes = values[:, j]
+            labels = encoded["levels"][j].take(np.nan_to_num(codes).astype(np.int64)) if len(encoded["levels"][j]) else codes
+            data[col] = pd.Series(np.where(np.isnan(codes), None, labels), index=df.index, dtype=object)
+    return pd.DataFrame(data, index=df.index)
+
+
+################################################################################
+############################ Rubin's Rules Pooling #############################
+################################################################################
+def rubin_pool(estimates, variances):
+    """
+    Pools M estimates with Rubin's rules.
+
+    Parameters:
+    - estimates, variances: (M x ...) arrays of point estimates and their squared standard errors
+
+    Returns:
+    - Tuple (estimate, total variance, degrees of freedom), each with the trailing shape
+    """
+    estimates = np.asarray(estimates, dtype=float)
+    m = estimates.shape[0]
+    estimate = estimates.mean(axis=0)
+    within = np.mean(variances, axis=0)
+    between = estimates.var(axis=0, ddof=1) if m > 1 else np.zeros_like(estimate)
+    total = within + (1 + 1 / m) * between
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # classic Rubin (1987) degrees of freedom; infinite when the imputations agree
+        dof = (m - 1) * (1 + within / ((1 + 1 / m) * between)) ** 2
+    return estimate, total, np.where(between > 0, dof, np.inf)
+
+def pool_intervals(estimates, lows, highs, log=False):
+    """
+    Rubin's rules for estimates reported with 95% confidence intervals (the standard error
+    is recovered from the interval width; log=True pools ratios on the log scale).
+
+    Returns:
+    - Tuple (estimate, CI low, CI high) arrays
+    """
+    estimates, lows, highs = (np.asarray(v, dtype=float) for v in (estimates, lows, highs))
+    if log:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            estimates, lows, highs = np.log(estimates), np.log(lows), np.log(highs)
+    estimate, total, dof = rubin_pool(estimates, ((highs - lows) / (2 * _z95)) ** 2)
+    half = stats.t.ppf(0.975, dof) * np.sqrt(total)
+    low, high = estimate - half, estimate + half
+    return (np.exp(estimate), np.exp(low), np.exp(high)) if log else (estimate, low, high)
+
+def pool_pvalues(p_values, dof=1):
+    """
+    Pools the p-values of one test over M imputations with the D2 rule of Li, Meng,
+    Raghunathan & Rubin (1991): every p-value is turned back into its chi-square
+    statistic, and the statistics are combined into an F test.
+
+    Parameters:
+    - p_values: (M x ...) array; NaN p-values are left out
+    - dof: Degrees of freedom of the chi-square statistics
+
+    Returns:
+    - np.ndarray of pooled p-values with the trailing shape
+    """
+    p = np.asarray(p_values, dtype=float)
+    valid = ~np.isnan(p)
+    m = valid.sum(axis=0)
+    chi2 = stats.chi2.isf(np.clip(np.where(valid, p, 1.0), 1e-300, 1.0), dof)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_chi2 = np.where(valid, chi2, 0.0).sum(axis=0) / m
+        root = np.sqrt(chi2)
+        root_mean = np.where(valid, root, 0.0).sum(axis=0) / m
+        r = (1 + 1 / m) * np.where(valid, (root - root_mean) ** 2, 0.0).sum(axis=0) / (m - 1)
+        d2 = np.maximum((mean_chi2 / dof - (m + 1) / (m - 1) * r) / (1 + r), 0.0)
+        v = dof ** (-3 / m) * (m - 1) * (1 + 1 / r) ** 2
+        pooled = np.where(r > 0, stats.f.sf(d2, dof, v), stats.chi2.sf(mean_chi2, dof))
+    pooled = np.where(m == 1, np.nanmax(np.where(valid, p, -np.inf), axis=0), pooled)
+    return np.where(m == 0, np.nan, pooled)
+
+def _pool_field(values):
+    # mean of a descriptive field over the imputations (None if it is missing)
+    if any(value is None for value in values):
+        return None
+    return np.mean(np.asarray(values, dtype=float), axis=0)
+
+def pool_results(imputed_results, columns, levels=None):
+    """
+    Pools the results of every variable over the completed datasets.
+
+    - counts, group sizes, means, medians and quartiles: averaged (counts rounded); SDs
+      pooled as the root mean variance
+    - p-values (also alternative and post-hoc p-values): D2 rule with the degrees of freedom
+      of the test (groups - 1, or (levels - 1) x (groups - 1) for contingency tables; 1 for
+      pairwise comparisons); when the imputations chose different tests, the p-values of the
+      most frequent test are pooled
+    - odds ratios, adjusted odds ratios and effect sizes: Rubin's rules on their 95%
+      intervals (ratios on the log scale)
+
+    Each completed dataset lists the levels of a categorical variable in its own order of
+    first appearance, so per-level counts and adjusted odds ratios are matched by level
+    label (not by position) before they are pooled.
+
+    Parameters:
+    - imputed_results: List with one dictionary {column: VariableResult} per imputation
+    - columns: Columns to pool
+    - levels: Optional dictionary {column: observed levels} giving the order of the pooled
+      levels (levels seen only in the imputations follow)
+
+    Returns:
+    - Dictionary {column: VariableResult}
+    """
+    pooled = {}
+    for col in columns:
+        results = [entry[col] for entry in imputed_results if col in entry]
+        if results:
+            pooled[col] = _pool_variable(results, (levels or {}).get(col))
+    return pooled
+
+def _align_levels(levels, order):
+    # index of every level in the pooled order (levels compared as text, as in the tables)
+    keys = {str(level): i for i, level in enumerate(order)}
+    return np.array([keys[str(level)] for level in levels], dtype=np.int64)
+
+def _level_order(level_lists, observed=None):
+    # observed levels first, then any level only an imputation produced, in order of appearance
+    order = {}
+    for level in list(observed if observed is not None else []) + [lv for levels in level_lists for lv in levels]:
+        order.setdefault(str(level), level)
+    return list(order.values())
+
+def _test_dof(result):
+    # degrees of freedom of the chi-square statistic behind a variable's p-value
+    k = np.size(result.totals)
+    if result.kind == "levels":
+        return max((np.shape(result.counts)[0] - 1) * (k - 1), 1)
+    return max(k - 1, 1)
+
+def _pool_variable(results, observed_levels=None):
+    method = Counter(result.test_method for result in results).most_common(1)[0][0]
+    chosen = [result for result in results if result.test_method == method]
+    result = chosen[0].copy()
+    counts = [r.counts for r in results]
+    if result.kind == "levels":
+        # reindex every imputation's (levels x groups) counts to one level order
+        result.levels = _level_order([r.levels for r in results], observed_levels)
+        counts = []
+        for r in results:
+            counts.append(np.zeros((len(result.levels), np.shape(r.counts)[1])))
+            counts[-1][_align_levels(r.levels, result.levels)] = r.counts
+    for name, values in (("counts", counts), ("totals", [r.totals for r in results])):
+        value = _pool_field(values)
+        setattr(result, name, None if value is None else np.rint(value))
+    for name in ("mean", "median", "q1", "q3"):
+        setattr(result, name, _pool_field([getattr(r, name) for r in results]))
+    if result.sd is not None:
+        result.sd = np.sqrt(_pool_field([np.square(r.sd) for r in results]))
+    if result.total is not None:
+        result.total = _pool_variable([r.total for r in results], observed_levels)
+
+    if result.p_value is not None:
+        result.p_value = float(pool_pvalues([r.p_value for r in chosen], dof=_test_dof(result)))
+    if result.alt_p_value is not None:
+        result.alt_p_value = float(pool_pvalues([np.nan if r.alt_p_value is None else r.alt_p_value for r in chosen],
+                                                dof=_test_dof(result)))
+    if result.posthoc is not None and all(r.posthoc is not None for r in chosen):
+        p_values = pool_pvalues([r.posthoc["p_values"] for r in chosen])
+        result.posthoc = dict(result.posthoc, p_values=p_values,
+                              adjusted=adjust_pvalues(p_values, result.posthoc["adjustment"]))
+
+    if result.odds_ratio is not None:
+        odds, low, high = pool_intervals([r.odds_ratio for r in results], [r.or_low for r in results],
+                                         [r.or_high for r in results], log=True)
+        result.odds_ratio, result.or_low, result.or_high = float(odds), float(low), float(high)
+    if result.effect_sizes is not None and all(r.effect_sizes is not None for r in results):
+        result.effect_sizes = {name: tuple(float(v) for v in pool_intervals(*zip(*[r.effect_sizes[name] for r in results])))
+                               for name in result.effect_sizes}
+    entries = [r.adjusted_or for r in results]
+    if result.adjusted_or is not None and all(e is not None for e in entries) and entries[0]["levels"] is not None:
+        # one design column per non-reference level: reorder them to the pooled level order
+        order = [level for level in result.levels if str(level) in {str(lv) for lv in entries[0]["levels"]}]
+        entries = [dict(e, **{name: np.asarray(e[name])[np.argsort(_align_levels(e["levels"], order))]
+                              for name in ("odds_ratio", "low", "high")}, levels=order)
+                   if sorted(map(str, e["levels"])) == sorted(map(str, order)) else None for e in entries]
+    if result.adjusted_or is not None and all(e is not None for e in entries):
+        odds, low, high = pool_intervals([e["odds_ratio"] for e in entries], [e["low"] for e in entries],
+                                         [e["high"] for e in entries], log=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            _, total, dof = rubin_pool(np.log([e["odds_ratio"] for e in entries]),
+                                       ((np.log([e["high"] for e in entries]) - np.log([e["low"] for e in entries])) / (2 * _z95)) ** 2)
+            wald_p = 2 * stats.t.sf(np.abs(np.log(odds) / np.sqrt(total)), dof)
+        result.adjusted_or = dict(entries[0], odds_ratio=odds, low=low, high=high, wald_p=wald_p,
+                                  lr_p=float(pool_pvalues([e["lr_p"] for e in entries], dof=len(odds))),
+                                  n=int(round(np.mean([e["n"] for e in entries]))))
+    elif result.adjusted_or is not None:
+        # the imputations modeled different level sets (or some had no model): nothing to pool
+        result.adjusted_or = None
+
+    # per-imputation fields that have no pooled counterpart (the normality screen is that of
+    # an imputation that chose the pooled test)
+    result.plan = None
+    result.bootstrap = None
+    return result
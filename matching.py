@@ -0,0 +1,103 @@
+
+# imports
+import numpy as np
+from stats_engine import logistic_newton
+
+# default settings for propensity-score matching
+default_caliper = 0.2  # caliper width in SDs of the logit propensity score (Austin, 2011)
+
+
+################################################################################
+############################ Propensity-Score Model ############################
+################################################################################
+def logit_propensity(X, y, mask):
+    """
+    Fits logit P(y = 1) = b0 + X b and returns the linear predictor (logit propensity score).
+
+    Parameters:
+    - X: (n x p) covariate design matrix
+    - y: (n,) 0/1 group indicator
+    - mask: (n,) bool rows with complete covariates
+
+    Returns:
+    - np.ndarray (n,) of logit scores, NaN outside mask; None if the model does not converge
+      (e.g. a covariate separates the groups)
+    """
+    X = np.where(mask[:, None], X, 0.0)
+    # standardized columns keep the Newton steps well conditioned; the scores do not change
+    center = X[mask].mean(axis=0) if mask.any() else np.zeros(X.shape[1])
+    scale = X[mask].std(axis=0) if mask.any() else np.ones(X.shape[1])
+    design = np.column_stack([np.ones(len(X)), (X - center) / np.where(scale > 0, scale, 1.0)])
+    fit = logistic_newton(design[None], y, mask[None])
+    if not fit["converged"][0]:
+        return None
+    return np.where(mask, design @ fit["beta"][0], np.nan)
+
+
+################################################################################
+########################### Greedy Caliper Matching ############################
+################################################################################
+def _find(parent, i):
+    # union-find root with path halving: the nearest control still available in one direction
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def caliper_match(scores, treated, caliper, mask=None):
+    """
+    Greedy 1:1 nearest-neighbour matching without replacement within a caliper.
+
+    Controls are sorted by score once; each treated row (highest score first, as those are
+    the hardest to match) binary-searches its position and takes the closer of the nearest
+    available control on either side. Used controls are skipped with two union-find
+    "next available" arrays, so the whole match is O(n log n) rather than an O(n^2) scan.
+
+    Parameters:
+    - scores: (n,) matching scores (the logit propensity score)
+    - treated: (n,) bool rows to find a control for
+    - caliper: Largest allowed score distance
+    - mask: Optional (n,) bool rows that may be matched
+
+    Returns:
+    - Tuple (treated rows, control rows) of the matched pairs
+    """
+    valid = ~np.isnan(scores) if mask is None else mask & ~np.isnan(scores)
+    controls = np.flatnonzero(valid & ~treated)
+    controls = controls[np.argsort(scores[controls], kind="stable")]
+    control_scores = scores[controls]
+    cases = np.flatnonzero(valid & treated)
+    cases = cases[np.argsort(-scores[cases], kind="stable")]
+    positions = np.searchsorted(control_scores, scores[cases]).tolist()
+
+    n = len(controls)
+    right = list(range(n + 1))  # right[i]: next available control >= i (n = none)
+    left = list(range(n + 1))   # left[i]: 1 + previous available control < i (0 = none)
+    values = control_scores.tolist()
+    matched_cases, matched_controls = [], []
+    for case, score, pos in zip(cases.tolist(), scores[cases].tolist(), positions):
+        r = _find(right, pos)
+        l = _find(left, pos) - 1
+        best, distance = -1, caliper
+        if r < n and values[r] - score <= distance:
+            best, distance = r, values[r] - score
+        if l >= 0 and score - values[l] <= distance and (best < 0 or score - values[l] < distance):
+            best = l
+        if best >= 0:
+            matched_cases.append(case)
+            matched_controls.append(controls[best])
+            right[best] = best + 1
+            left[best + 1] = best
+    return np.array(matched_cases, dtype=np.int64), np.array(matched_controls, dtype=np.int64)
+
+def standardized_differences(X, treated, rows=None):
+    """
+    Absolute standardized mean differences of the covariate columns (pooled SD of the
+    full cohort, so values before and after matching are comparable).
+    """
+    X = np.asarray(X, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pooled_sd = np.sqrt((np.nanvar(X[treated], axis=0) + np.nanvar(X[~treated], axis=0)) / 2)
+        if rows is not None:
+            X, treated = X[rows], treated[rows]
+        return np.abs(np.nanmean(X[treated], axis=0) - np.nanmean(X[~treated], axis=0)) / pooled_sd
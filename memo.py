@@ -0,0 +1,190 @@
+
+# imports
+import hashlib
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+default_memo_size = 5_000  # max number of per-variable results kept per session
+default_table_memo_size = 100_000  # max number of per-table test results kept
+default_null_cache_size = 1_000  # max number of null distributions kept in memory
+default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "shiny_manuscript")
+cache_dir_variable = "SHINY_MANUSCRIPT_CACHE_DIR"  # relocates the on-disk caches; empty or "none" disables them
+
+
+def cache_directory(name, base=None):
+    """
+    Directory of one on-disk cache.
+
+    Parameters:
+    - name: Subdirectory of the cache (e.g. "rank_sum")
+    - base: Cache root; defaults to $SHINY_MANUSCRIPT_CACHE_DIR, then default_cache_dir
+
+    Returns:
+    - Path of the directory, or None when the root is empty or "none" (memory-only caches)
+    """
+    if base is None:
+        base = os.environ.get(cache_dir_variable, default_cache_dir)
+    if not base or base.strip().lower() == "none":
+        return None
+    return os.path.join(os.path.expanduser(base), name)
+
+
+def column_fingerprint(series):
+    """
+    Content hash of a column (values only, index ignored).
+    """
+    hashed = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+
+class ResultMemo:
+    """
+    Session-level LRU memo of per-variable results.
+
+    Keys combine the content hash of the variable and grouping columns with every
+    setting that changes the statistics (variable type, test, missing-value mode,
+    reference value, ...), so renaming a variable or moving it to another subheading
+    re-uses the stored result while any change to its inputs recomputes it.
+    Values are VariableResult objects (anything with a .copy() method).
+    """
+
+    def __init__(self, maxsize=default_memo_size):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, df, col):
+        # column hashes are cached per DataFrame object so repeat Calculates skip the hashing;
+        # frames that were freed are pruned only when a new frame is first seen
+        entry = self.fingerprints.get(id(df))
+        if entry is None or entry[0]() is not df:
+            self.fingerprints = {key: item for key, item in self.fingerprints.items() if item[0]() is not None}
+            entry = self.fingerprints[id(df)] = (weakref.ref(df), {})
+        hashes = entry[1]
+        if col not in hashes:
+            hashes[col] = column_fingerprint(df[col])
+        return hashes[col]
+
+    def key(self, df, var_name, group_var, var_type, test_name, missing_mode, *settings):
+        """
+        Builds the memo key of one variable.
+
+        Parameters:
+        - df: pd.DataFrame the statistics are computed on
+        - var_name: Variable column
+        - group_var: Grouping column
+        - var_type: Variable type
+        - test_name: Statistical test used for the variable
+        - missing_mode: "Remove Unknown Values" setting
+        - settings: Any other inputs the result depends on (decimals, reference value, ...)
+        """
+        return (self.fingerprint(df, var_name), group_var, self.fingerprint(df, group_var),
+                var_type, test_name, missing_mode) + tuple(settings)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key].copy()
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value.copy()
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)  # evict the least recently used result
+
+    def clear(self):
+        self.entries.clear()
+        self.fingerprints.clear()
+
+
+class TableMemo:
+    """
+    LRU memo of per-table test results (plain floats) keyed on canonical table tuples.
+
+    Small cohorts produce the same contingency tables over and over, so exact
+    p-values are looked up instead of recomputed.
+    """
+
+    def __init__(self, maxsize=default_table_memo_size):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class NullDistributionCache:
+    """
+    Null distributions (np.ndarrays) kept in an in-memory LRU and in a directory of .npy files.
+
+    Small studies keep producing the same arm sizes and tie patterns, so a distribution
+    computed once is reused by later variables and by later sessions. The file name is a
+    hash of the key. The disk is optional: with directory None, or if the directory cannot
+    be read or written, the cache simply behaves as an in-memory memo.
+    """
+
+    def __init__(self, directory=None, maxsize=default_null_cache_size):
+        self.directory = directory
+        self.memory = TableMemo(maxsize)
+        self.disk_hits = 0
+
+    def path(self, key):
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + ".npy")
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.directory is not None:
+            try:
+                value = np.load(self.path(key), allow_pickle=False)
+            except (OSError, ValueError):
+                return None
+            self.disk_hits += 1
+            self.memory.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.directory is None:
+            return
+        path = self.path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write to a temporary file first so a concurrent reader never sees a partial table
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as handle:
+                np.save(handle, value, allow_pickle=False)
+            os.replace(temporary, path)
+        except OSError as error:
+            logger.warning("Could not write the null distribution cache: %s", error)
+
+    def clear(self):
+        self.memory.clear()
@@ -0,0 +1,242 @@
+
+# imports
+from collections import defaultdict, deque
+from results import format_results
+from stats_engine import factorize_groups
+from matching import default_caliper
+
+# variable settings that change the statistics; other fields only change the rendered table
+stat_fields = ("type", "ref_val")
+
+
+################################################################################
+############################### Dependency Graph ###############################
+################################################################################
+class DependencyGraph:
+    """
+    Directed acyclic graph of memoized nodes with dirty tracking.
+
+    Nodes are hashable keys (tuples such as ("result", "age")). Input nodes hold a
+    value set from outside; derived nodes hold the value stored after they were last
+    computed. Changing an input marks every node downstream of it dirty, nothing else.
+    """
+
+    def __init__(self):
+        self.deps = {}
+        self.dependents = defaultdict(set)
+        self.values = {}
+        self.dirty = set()
+
+    def add_node(self, node, deps=()):
+        """
+        Adds (or rewires) a derived node; it starts out dirty.
+        """
+        for dep in self.deps.get(node, ()):
+            self.dependents[dep].discard(node)
+        self.deps[node] = tuple(deps)
+        for dep in self.deps[node]:
+            self.dependents[dep].add(node)
+        self.invalidate(node)
+
+    def has_node(self, node):
+        return node in self.deps
+
+    def invalidate(self, node, include_self=True):
+        """
+        Marks node (optionally) and everything downstream of it dirty.
+        """
+        queue = deque([node])
+        if include_self:
+            self.dirty.add(node)
+        while queue:
+            for child in self.dependents.get(queue.popleft(), ()):
+                if child not in self.dirty:
+                    self.dirty.add(child)
+                    queue.append(child)
+
+    def set_input(self, node, value):
+        """
+        Sets an input node; its dependents become dirty only if the value changed.
+
+        Returns:
+        - True if the value changed
+        """
+        if node in self.values and self.values[node] == value:
+            return False
+        self.values[node] = value
+        self.invalidate(node, include_self=False)
+        return True
+
+    def is_dirty(self, node):
+        return node in self.dirty
+
+    def store(self, node, value):
+        self.values[node] = value
+        self.dirty.discard(node)
+
+    def value(self, node, default=None):
+        return self.values.get(node, default)
+
+
+################################################################################
+############################### Analysis Pipeline ##############################
+################################################################################
+class AnalysisPipeline:
+    """
+    The ingest -> clean -> group split -> test -> format chain as a dependency graph
+    with one result node and one cells node per variable:
+
+        ("data",) ─> ("clean", col) ─┬─> ("split",) ─┐
+        ("missing_mode",) ──┘        └───────────────┴─> ("result", col) ─> ("cells", col)
+        ("config", col), ("settings",) ────────────────────┘       ("format",) ──┘
+
+    A column only depends on the "Remove Unknown Values" toggle if it contains one of
+    the missing-value codes, so toggling it recomputes just those variables (or all of
+    them when the grouping column is affected). Changing the type or reference value of
+    one variable dirties only that variable; renaming or moving it dirties nothing, as
+    the Word table is rendered from the cached cells. Dirty variables are recomputed
+    together in one call to the batched analysis.
+
+    In matched mode the split also depends on a ("matching",) input (covariates, their
+    settings and the caliper): the table is replaced by its propensity-score matched rows
+    before the split, so every result describes the matched cohort. Switching matching
+    off and on again restores both tables from the result memo.
+    """
+
+    def __init__(self, analyze, memo=None, match=None):
+        """
+        Parameters:
+        - analyze: analyze_variables(df, group_var, var_config, columns, settings, memo=...)
+        - memo: Optional ResultMemo passed through to analyze
+        - match: Optional perform_propensity_matching(df, group_var, var_config, covariates, caliper)
+        """
+        self.analyze = analyze
+        self.memo = memo
+        self.match = match
+        self.graph = DependencyGraph()
+        self.raw = None
+        self.clean = None
+        self.unknown_cols = set()
+        self.matching = None
+        self.matched = None
+        self.matched_source = None
+
+    def set_data(self, raw_df, clean_df):
+        """
+        Registers a new upload; every node is rebuilt.
+        """
+        self.raw = raw_df
+        self.clean = clean_df
+        # columns whose values differ once the missing-value codes are replaced by NaN
+        self.unknown_cols = {col for col in raw_df.columns if not raw_df[col].equals(clean_df[col])}
+
+        self.graph = DependencyGraph()
+        self.matching = None
+        self.matched = None
+        self.graph.set_input(("data",), id(raw_df))
+        for col in raw_df.columns:
+            deps = [("data",), ("missing_mode",)] if col in self.unknown_cols else [("data",)]
+            self.graph.add_node(("clean", col), deps)
+
+    def on_config_change(self, col, field, value):
+        """
+        VarConfigStore listener: statistics fields dirty the variable's result.
+        """
+        if field in stat_fields:
+            self.graph.invalidate(("config", col), include_self=False)
+
+    def _ensure_variable(self, col):
+        if not self.graph.has_node(("result", col)):
+            self.graph.add_node(("result", col), [("clean", col), ("split",), ("config", col), ("settings",)])
+            self.graph.add_node(("cells", col), [("result", col), ("format",)])
+
+    def table(self, missing_mode):
+        # multiple imputation starts from the cleaned table (missing-value codes as NaN)
+        return self.raw if missing_mode == "No (Default)" else self.clean
+
+    def run(self, var_config, group_var, columns, settings):
+        """
+        Recomputes the dirty variables and returns the results of all selected ones.
+
+        Parameters:
+        - var_config: Variable settings (VarConfigStore or dictionary)
+        - group_var: Name of the grouping column
+        - columns: Selected columns
+        - settings: Dictionary with missing_mode, odds_ratio_ci, pvalue_method and (optionally) posthoc,
+          deadline, adjust_for, sensitivity, bootstrap, approximate, imputations, match_on and caliper
+
+        Returns:
+        - Dictionary {column: VariableResult}
+        """
+        graph = self.graph
+        df = self.table(settings["missing_mode"])
+        graph.set_input(("missing_mode",), settings["missing_mode"])
+        # adjusted odds ratios depend on the covariates' settings and, for covariates with
+        # missing-value codes, on the "Remove Unknown Values" toggle
+        adjust_for = tuple(settings.get("adjust_for") or ())
+        covariates = (adjust_for, tuple((var_config[col]["type"], var_config[col]["ref_val"]) for col in adjust_for),
+                      settings["missing_mode"] if self.unknown_cols.intersection(adjust_for) else None,
+                      settings.get("adjust_for") is None)
+        analysis_cols = [col for col in columns if col != group_var and var_config[col]["type"] != "Omit"]
+        # every imputation model uses all selected variables, so adding, removing or retyping
+        # one of them changes the imputed values of all the others
+        imputation = (settings.get("imputations") or 0,
+                      tuple((col, var_config[col]["type"]) for col in analysis_cols) if settings.get("imputations") else ())
+        if settings.get("imputations"):
+            settings = dict(settings, impute_from=analysis_cols)
+        graph.set_input(("settings",), (settings["odds_ratio_ci"], settings["pvalue_method"], settings.get("posthoc"),
+                                        settings.get("deadline"), covariates, bool(settings.get("sensitivity")),
+                                        settings.get("bootstrap") or 0, bool(settings.get("approximate")), imputation))
+        match_on = tuple(settings.get("match_on") or ()) if self.match is not None else ()
+        graph.set_input(("matching",), (match_on, tuple((var_config[col]["type"], var_config[col]["ref_val"]) for col in match_on),
+                                        settings.get("caliper") or default_caliper,
+                                        settings["missing_mode"] if self.unknown_cols.intersection(match_on) else None)
+                        if match_on else None)
+        if graph.set_input(("group_var",), group_var) or not graph.has_node(("split",)):
+            graph.add_node(("split",), [("group_var",), ("clean", group_var), ("matching",)])
+
+        for col in [group_var] + analysis_cols:
+            if graph.is_dirty(("clean", col)):
+                graph.store(("clean", col), df[col])
+        if graph.is_dirty(("split",)):
+            self.matching = self.match(df, group_var, var_config, match_on, settings.get("caliper") or default_caliper) if match_on else None
+            self.matched = None
+        if self.matching is not None:
+            # the matched rows are taken from whichever table (raw or cleaned) is in use
+            if self.matched is None or self.matched_source is not df:
+                self.matched, self.matched_source = df.iloc[self.matching["rows"]], df
+            df = self.matched
+        if graph.is_dirty(("split",)):
+            graph.store(("split",), factorize_groups(df, group_var))
+        for col in analysis_cols:
+            self._ensure_variable(col)
+
+        dirty_cols = [col for col in analysis_cols if graph.is_dirty(("result", col))]
+        if dirty_cols:
+            computed = self.analyze(df, group_var, var_config, dirty_cols, settings, memo=self.memo)
+            for col in dirty_cols:
+                graph.store(("result", col), computed.get(col))
+
+        return {col: graph.value(("result", col)) for col in analysis_cols
+                if graph.value(("result", col)) is not None}
+
+    def split(self):
+        return self.graph.value(("split",))
+
+    def cells(self, results, decimals_tab, decimals_pval, output_format):
+        """
+        Table cells of the given results, reformatting only variables whose result or
+        the number format changed.
+        """
+        graph = self.graph
+        graph.set_input(("format",), (decimals_tab, decimals_pval, output_format))
+        dirty = {col: result for col, result in results.items()
+                 if not graph.has_node(("cells", col)) or graph.is_dirty(("cells", col))}
+        if dirty:
+            formatted = format_results(dirty, decimals_tab, decimals_pval, output_format)
+            for col, cells in formatted.items():
+                if graph.has_node(("cells", col)):
+                    graph.store(("cells", col), cells)
+        else:
+            formatted = {}
+        return {col: formatted[col] if col in formatted else graph.value(("cells", col)) for col in results}
@@ -0,0 +1,226 @@
+
+# imports
+import logging
+import time
+import numpy as np
+from scipy import stats
+from exact_tests import (ffh_cost_estimate, ffh_exact, ffh_monte_carlo, exact_feasible, BudgetExceeded,
+                         default_node_budget, default_mc_samples)
+
+logger = logging.getLogger(__name__)
+
+# default wall-clock budget of one Calculate, in seconds
+default_deadline = 10.0
+min_permutations = 1_000  # fewer permutations than this are not worth reporting
+min_bootstraps = 1_000  # fewer resamples than this give unstable percentile intervals
+
+# cost model (seconds), calibrated on a laptop; only the relative sizes drive the plan
+cost_per_edge = 3e-6  # per network edge, at most node_budget of them
+cost_per_mc_cell = 8e-8  # per simulated table cell
+cost_per_numeric_value = 5e-8  # per value of the batched numeric pass
+cost_per_fisher_table = 1e-5  # per table of the batched 2x2 Fisher kernel
+cost_per_permuted_value = 3e-9  # per (permutation x row x statistic)
+cost_per_resampled_value = 2e-9  # per (bootstrap resample x row x statistic)
+cost_per_rank_sum_cell = 5e-9  # per cell update of the exact rank-sum null distribution
+cost_overhead = 5e-4  # per test call
+
+# strategies from most to least accurate
+strategy_order = ("exact", "monte-carlo", "asymptotic")
+
+
+class TestPlan:
+    """
+    Strategy chosen for one variable's test, with its estimated and actual run time.
+
+    strategy is "exact", "monte-carlo", "asymptotic" (chi-square / t / Wilcoxon ...) or
+    "permutation"; samples is the number of Monte Carlo tables or permutations used.
+    """
+
+    __slots__ = ("strategy", "estimate", "actual", "samples")
+
+    def __init__(self, strategy, estimate, actual=None, samples=None):
+        self.strategy = strategy
+        self.estimate = estimate
+        self.actual = actual
+        self.samples = samples
+
+    def __repr__(self):
+        actual = "-" if self.actual is None else f"{self.actual:.3f}s"
+        return f"TestPlan({self.strategy}, est {self.estimate:.3f}s, actual {actual})"
+
+
+################################################################################
+################################## Cost Model ##################################
+################################################################################
+def contingency_cost(table, strategy, n_samples=default_mc_samples, node_budget=default_node_budget):
+    """
+    Estimated seconds to test an RxC table with the given strategy (inf if not allowed).
+    """
+    if strategy == "exact":
+        if not exact_feasible(table, node_budget):
+            return np.inf
+        return cost_overhead + min(ffh_cost_estimate(table), node_budget) * cost_per_edge
+    elif strategy == "monte-carlo":
+        return cost_overhead + n_samples * np.asarray(table).size * cost_per_mc_cell
+    return cost_overhead
+
+def numeric_cost(n_rows, n_columns):
+    return cost_overhead + n_rows * n_columns * cost_per_numeric_value
+
+def fisher_batch_cost(n_tables):
+    return cost_overhead + n_tables * cost_per_fisher_table
+
+def permutation_cost(n_rows, n_stats, n_permutations):
+    return cost_overhead + n_permutations * n_rows * n_stats * cost_per_permuted_value
+
+def bootstrap_cost(n_rows, n_stats, n_resamples):
+    return cost_overhead + n_resamples * n_rows * n_stats * cost_per_resampled_value
+
+def rank_sum_null_cost(n1, n2, ties):
+    # one (n1 + 1) x (doubled rank sums) table is updated min(t, n1) + 1 times per tie group, plus its allocation
+    n = n1 + n2
+    updates = sum(min(int(t), n1) + 2 for t in ties)
+    return cost_overhead + updates * (n1 + 1) * (n * (n + 1) + 1) * cost_per_rank_sum_cell
+
+
+################################################################################
+################################# Test Planner #################################
+################################################################################
+class TestPlanner:
+    """
+    Chooses a strategy per variable so one Calculate finishes within a deadline.
+
+    Batched tests (numeric pass, 2x2 Fisher kernel) are cheap and registered with a
+    fixed strategy. RxC tables start on the exact network algorithm and the most
+    expensive one is downgraded (exact -> Monte Carlo -> chi-square) until the
+    estimated total fits. At run time the exact test only gets the time left over
+    for it, and falls back to the next strategy if the estimate was too optimistic,
+    so one pathological table cannot stall the whole Calculate.
+    """
+
+    def __init__(self, deadline=default_deadline, n_samples=default_mc_samples, node_budget=default_node_budget):
+        self.deadline = deadline
+        self.n_samples = n_samples
+        self.node_budget = node_budget
+        self.started = time.perf_counter()
+        self.reserved = 0.0
+        self.plans = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def remaining(self):
+        return self.deadline - self.elapsed()
+
+    def reserve(self, seconds):
+        """
+        Sets aside time for work that runs after the tests being planned.
+        """
+        self.reserved += seconds
+
+    def allows(self, estimate):
+        """
+        True if a test estimated at estimate seconds fits in the time left, after the reserved
+        time and the planned tests that have not run yet.
+        """
+        waiting = sum(plan.estimate for plan in self.plans.values() if plan.actual is None)
+        return estimate <= self.remaining() - self.reserved - waiting
+
+    def add_batch(self, columns, strategy, estimate, seconds, samples=None):
+        """
+        Records a batched test: the estimate and actual time are shared by its columns.
+        """
+        for col in columns:
+            self.plans[col] = TestPlan(strategy, estimate / len(columns), seconds / len(columns), samples)
+
+    def plan_tables(self, tables):
+        """
+        Chooses a strategy for every RxC table.
+
+        Parameters:
+        - tables: Dictionary {column: contingency table}
+
+        Returns:
+        - Dictionary {column: TestPlan}
+        """
+        costs = {col: {strategy: contingency_cost(table, strategy, self.n_samples, self.node_budget)
+                       for strategy in strategy_order} for col, table in tables.items()}
+        plans = {}
+        for col, cost in costs.items():
+            strategy = next(s for s in strategy_order if np.isfinite(cost[s]))
+            plans[col] = TestPlan(strategy, cost[strategy])
+
+        # downgrade the most expensive variable until the estimated total fits
+        budget = self.remaining() - self.reserved
+        total = sum(plan.estimate for plan in plans.values())
+        while total > budget:
+            candidates = [col for col, plan in plans.items() if plan.strategy != "asymptotic"]
+            if not candidates:
+                break
+            col = max(candidates, key=lambda c: plans[c].estimate)
+            strategy = strategy_order[strategy_order.index(plans[col].strategy) + 1]
+            total += costs[col][strategy] - plans[col].estimate
+            plans[col] = TestPlan(strategy, costs[col][strategy])
+
+        self.plans.update(plans)
+        return plans
+
+    def run_table(self, col, table):
+        """
+        Tests one planned table, falling back to a cheaper strategy if the exact
+        enumeration runs out of the time left for it.
+
+        Returns:
+        - Tuple (p_value, method) with method "exact", "monte-carlo" or "chi2"
+        """
+        plan = self.plans[col]
+        start = time.perf_counter()
+        strategy = plan.strategy
+        p_value = None
+
+        if strategy == "exact":
+            # everything not needed by the variables still waiting is available to this one
+            waiting = sum(other.estimate for other in self.plans.values() if other.actual is None and other is not plan)
+            time_limit = max(plan.estimate, self.remaining() - self.reserved - waiting)
+            try:
+                p_value = ffh_exact(table, node_budget=self.node_budget, time_limit=time_limit)
+            except BudgetExceeded:
+                left = self.remaining() - self.reserved - waiting
+                strategy = "monte-carlo" if contingency_cost(table, "monte-carlo", self.n_samples) <= left else "asymptotic"
+        if strategy == "monte-carlo":
+            p_value = ffh_monte_carlo(table, n_samples=self.n_samples)
+            plan.samples = self.n_samples
+        elif strategy == "asymptotic":
+            _, p_value, _, _ = stats.chi2_contingency(table)
+
+        plan.strategy = strategy
+        plan.actual = time.perf_counter() - start
+        return float(p_value), "chi2" if strategy == "asymptotic" else strategy
+
+    def _affordable(self, per_sample, n_samples, minimum):
+        affordable = int((self.remaining() - self.reserved - cost_overhead) / max(per_sample, 1e-12))
+        n_samples = min(n_samples, affordable)
+        return n_samples if n_samples >= minimum else 0
+
+    def permutations(self, n_rows, n_stats, n_permutations):
+        """
+        Number of permutations that fit in the remaining time (0 if fewer than min_permutations).
+        """
+        per_permutation = permutation_cost(n_rows, n_stats, 1) - cost_overhead
+        return self._affordable(per_permutation, n_permutations, min_permutations)
+
+    def bootstraps(self, n_rows, n_stats, n_resamples):
+        """
+        Number of bootstrap resamples that fit in the remaining time (0 if fewer than min_bootstraps).
+        """
+        per_resample = bootstrap_cost(n_rows, n_stats, 1) - cost_overhead
+        return self._affordable(per_resample, n_resamples, min_bootstraps)
+
+    def report(self, columns=None):
+        """
+        Logs the chosen strategy and estimated vs actual time of every variable.
+        """
+        logger.info("Test plan (%.2fs of %.1fs budget)", self.elapsed(), self.deadline)
+        for col in (columns if columns is not None else self.plans):
+            if col in self.plans:
+                logger.info("   %s: %s", col, self.plans[col])
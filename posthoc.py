@@ -0,0 +1,209 @@
+
+# imports
+from functools import lru_cache
+from itertools import combinations
+import numpy as np
+from scipy import stats
+from scipy.special import gammaln
+from exact_tests import fisher_freeman_halton
+from stats_engine import group_rank_sums, fisher_exact_2x2
+
+# p-value adjustments offered for the post-hoc family
+adjustment_methods = {"Holm": "holm", "Benjamini-Hochberg": "bh"}
+
+
+################################################################################
+############################ Pairs & Multiplicity ##############################
+################################################################################
+def pair_indices(k):
+    """
+    Index arrays (i, j) of every pair of groups, in itertools.combinations order.
+    """
+    pairs = list(combinations(range(k), 2))
+    return np.array([i for i, _ in pairs], dtype=np.int64), np.array([j for _, j in pairs], dtype=np.int64)
+
+def adjust_pvalues(p_values, method="holm"):
+    """
+    Holm or Benjamini-Hochberg adjustment along axis 0 (one family per column).
+
+    Parameters:
+    - p_values: (comparisons x columns) array; NaN entries are left out of the family
+    - method: "holm" or "bh"
+
+    Returns:
+    - np.ndarray of adjusted p-values with the same shape
+    """
+    p = np.asarray(p_values, dtype=float)
+    squeeze = p.ndim == 1
+    if squeeze:
+        p = p[:, None]
+    m = (~np.isnan(p)).sum(axis=0)
+    order = np.argsort(p, axis=0)  # NaNs sorted last
+    sorted_p = np.take_along_axis(p, order, axis=0)
+    rank = np.arange(p.shape[0])[:, None]
+
+    if method == "holm":
+        adjusted = np.maximum.accumulate(np.minimum(sorted_p * (m - rank), 1.0), axis=0)
+    elif method == "bh":
+        scaled = np.where(np.isnan(sorted_p), np.inf, sorted_p * m / (rank + 1))
+        adjusted = np.minimum.accumulate(scaled[::-1], axis=0)[::-1]
+        adjusted = np.where(np.isnan(sorted_p), np.nan, np.fmin(adjusted, 1.0))
+    else:
+        raise ValueError(f"Unknown adjustment method: {method}")
+
+    result = np.empty_like(p)
+    np.put_along_axis(result, order, adjusted, axis=0)
+    return result[:, 0] if squeeze else result
+
+
+################################################################################
+########################### Studentized Range (Tukey) ##########################
+################################################################################
+@lru_cache(maxsize=None)
+def _range_log_sf_grid(k, w_max=40.0, n_w=4001, n_z=2001):
+    """
+    log P(range of k standard normals > w) on a grid of w, computed once per k.
+    """
+    w = np.linspace(0.0, w_max, n_w)
+    z = np.linspace(-10.0, 10.0, n_z)
+    phi = stats.norm.pdf(z)
+    cdf = stats.norm.cdf(z)
+    sf = np.empty(n_w)
+    for start in range(0, n_w, 500):
+        inner = np.clip(cdf - stats.norm.cdf(z - w[start:start + 500, None]), 0.0, 1.0) ** (k - 1)
+        sf[start:start + 500] = 1.0 - k * np.trapezoid(phi * inner, z, axis=1)
+    return w, np.log(np.clip(sf, 1e-300, None))
+
+def studentized_range_sf(q, k, dof, n_nodes=301):
+    """
+    Survival function of the studentized range distribution for arrays of q and dof.
+
+    stats.studentized_range.sf integrates each value separately (~10 ms per call);
+    here the infinite-dof tail is tabulated once per k and the integral over the
+    chi scale factor is a fixed trapezoid rule in log s, so thousands of comparisons
+    are evaluated together (absolute error ~1e-5).
+    """
+    q, dof = np.broadcast_arrays(np.asarray(q, dtype=float), np.asarray(dof, dtype=float))
+    result = np.full(q.shape, np.nan)
+    valid = np.isfinite(q) & np.isfinite(dof) & (dof > 0)
+    if not valid.any():
+        return result
+
+    q, nu = q[valid][:, None], dof[valid][:, None]
+    w, log_sf = _range_log_sf_grid(k)
+
+    # integrate over log s, s = sqrt(chi2_nu / nu), between its 1e-12 quantiles
+    lo = 0.5 * np.log(stats.chi2.ppf(1e-12, nu) / nu)
+    hi = 0.5 * np.log(stats.chi2.isf(1e-12, nu) / nu)
+    x = lo + (hi - lo) * np.linspace(0.0, 1.0, n_nodes)[None, :]
+    s = np.exp(x)
+    log_density = (nu / 2) * np.log(nu) - gammaln(nu / 2) - (nu / 2 - 1) * np.log(2) + nu * x - nu * s ** 2 / 2
+    tail = np.exp(np.interp(q * s, w, log_sf))
+    result[valid] = np.clip(np.trapezoid(np.exp(log_density) * tail, x, axis=1), 0.0, 1.0)
+    return result
+
+
+################################################################################
+########################## Batched Post-hoc Tests ##############################
+################################################################################
+def games_howell(summary):
+    """
+    Games-Howell comparisons of every pair of groups for every column of a k-group summary.
+
+    Returns:
+    - (pairs x columns) array of p-values
+    """
+    n, mean, var = summary["n"], summary["mean"], summary["var"]
+    i, j = pair_indices(n.shape[0])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vi, vj = var[i] / n[i], var[j] / n[j]
+        t = (mean[i] - mean[j]) / np.sqrt(vi + vj)
+        dof = (vi + vj) ** 2 / (vi ** 2 / (n[i] - 1) + vj ** 2 / (n[j] - 1))
+    return studentized_range_sf(np.abs(t) * np.sqrt(2), n.shape[0], dof)
+
+def dunn_test(summary):
+    """
+    Dunn's test (tie corrected) of every pair of groups for every column, from the
+    rank sums shared with the Kruskal-Wallis test.
+
+    Returns:
+    - (pairs x columns) array of p-values
+    """
+    n = summary["n"]
+    rank_sums, tie_sums = group_rank_sums(summary)
+    i, j = pair_indices(n.shape[0])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = n.sum(axis=0)
+        mean_ranks = rank_sums / n
+        sigma2 = (total * (total + 1) / 12.0 - tie_sums / (12.0 * (total - 1))) * (1 / n[i] + 1 / n[j])
+        z = (mean_ranks[i] - mean_ranks[j]) / np.sqrt(sigma2)
+    return 2 * stats.norm.sf(np.abs(z))
+
+def pairwise_contingency(tables, test_type, planner=None):
+    """
+    Pairwise tests of every pair of groups for a list of (levels x groups) tables.
+
+    All 2-column sub-tables are stacked into one padded array: chi-square statistics
+    are computed for all of them at once, 2x2 Fisher tests go through one batched
+    hypergeometric kernel, and only larger Fisher tables fall back to the
+    Fisher-Freeman-Halton test one by one. With a planner those tables are planned
+    and run like any other RxC table, so they share its time budget and fall back
+    to Monte Carlo or chi-square when it runs out.
+
+    Parameters:
+    - tables: List of count tables with the same number of group columns
+    - test_type: "fisher", "fisher-freeman-halton" or "chi2"
+    - planner: Optional TestPlanner for the Fisher-Freeman-Halton sub-tables
+
+    Returns:
+    - (pairs x tables) array of p-values (NaN where a sub-table is degenerate)
+    """
+    if not tables:
+        return np.empty((0, 0))
+    k = tables[0].shape[1]
+    i, j = pair_indices(k)
+    n_levels = max(table.shape[0] for table in tables)
+    padded = np.zeros((len(tables), n_levels, k))
+    for v, table in enumerate(tables):
+        padded[v, :table.shape[0]] = table
+
+    # (tables, pairs, levels, 2) sub-tables
+    sub = np.stack([padded[:, :, i], padded[:, :, j]], axis=-1).transpose(0, 2, 1, 3)
+    row_totals = sub.sum(axis=3)
+    col_totals = sub.sum(axis=2)
+    total = col_totals.sum(axis=2)
+    n_rows = (row_totals > 0).sum(axis=2)
+    valid = (n_rows >= 2) & (col_totals > 0).all(axis=2)
+    p_values = np.full(total.shape, np.nan)
+
+    if test_type == "chi2":
+        with np.errstate(invalid="ignore", divide="ignore"):
+            expected = row_totals[..., None] * col_totals[:, :, None, :] / total[..., None, None]
+            diff = sub - expected
+            # Yates continuity correction for 2x2 tables, as stats.chi2_contingency
+            yates = (n_rows == 2)[..., None, None]
+            diff = np.where(yates, np.sign(diff) * np.maximum(np.abs(diff) - 0.5, 0.0), diff)
+            chi2 = np.where(expected > 0, diff ** 2 / expected, 0.0).sum(axis=(2, 3))
+            p_values[valid] = stats.chi2.sf(chi2[valid], n_rows[valid] - 1)
+        return p_values.T
+
+    # Fisher: every 2x2 sub-table in one batch, the rest through Fisher-Freeman-Halton
+    two_by_two = valid & (n_rows == 2)
+    if two_by_two.any():
+        v_idx, p_idx = np.nonzero(two_by_two)
+        blocks = sub[v_idx, p_idx]
+        # move the two non-empty level rows of each sub-table to the front
+        first_two = np.argsort(blocks.sum(axis=2) == 0, axis=1, kind="stable")[:, :2]
+        p_values[v_idx, p_idx] = fisher_exact_2x2(np.take_along_axis(blocks, first_two[:, :, None], axis=1))
+    larger = {("pairwise", v, p): sub[v, p].astype(np.int64) for v, p in zip(*np.nonzero(valid & (n_rows > 2)))}
+    if planner is not None and larger:
+        planner.plan_tables(larger)
+    for key, table in larger.items():
+        _, v, p = key
+        if planner is not None:
+            p_values[v, p], _ = planner.run_table(key, table)
+            # only the variables themselves are reported in the test plan
+            del planner.plans[key]
+        else:
+            p_values[v, p], _ = fisher_freeman_halton(table)
+    return p_values.T
@@ -0,0 +1,459 @@
+
+# imports
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from stats_engine import count_quantiles
+
+# default settings for permutation p-values
+default_permutations = 10_000
+default_seed = 20240101
+default_block_cells = 5_000_000  # max (permutations x rows) entries per block
+
+# default settings for bootstrap confidence intervals
+default_bootstraps = 10_000
+default_ci_alpha = 0.05
+
+# relative tolerance when comparing permuted statistics to the observed one
+_tol = 1e-9
+
+
+################################################################################
+######################### Permutation Test Encodings ###########################
+################################################################################
+def encode_permutation_data(df, group_var, var_types):
+    """
+    Encodes all selected variables once so every permutation block reuses them.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_types: Dictionary {column: variable type}
+
+    Returns:
+    - Dictionary with the group codes of the rows with a non-missing group and:
+        - numeric: columns, values (NaN -> 0) and non-missing mask for "Ratio Continuous"
+        - rank: columns, ranks (NaN -> 0) and mask for "Ordinal Discrete"
+        - categorical: columns, one-hot level matrix and the level offsets of each variable
+    """
+    codes, labels = pd.factorize(df[group_var], sort=False)
+    keep = codes >= 0
+    df = df[keep]
+    codes = np.asarray(codes[keep], dtype=np.int64)
+
+    numeric_cols = [col for col, t in var_types.items() if t == "Ratio Continuous"]
+    rank_cols = [col for col, t in var_types.items() if t == "Ordinal Discrete"]
+    categorical_cols = [col for col, t in var_types.items() if t.startswith("Categorical")]
+
+    X = df[numeric_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).reshape(len(df), -1)
+    X_mask = ~np.isnan(X)
+
+    R = df[rank_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).reshape(len(df), -1)
+    R_mask = ~np.isnan(R)
+    if R.shape[1] > 0:
+        R = stats.rankdata(R, axis=0, nan_policy="omit")
+
+    # one-hot encode every level of every categorical variable side by side
+    blocks = []
+    offsets = [0]
+    for col in categorical_cols:
+        var_codes, levels = pd.factorize(df[col], sort=False)
+        onehot = np.zeros((len(df), len(levels)))
+        valid = var_codes >= 0
+        onehot[np.flatnonzero(valid), var_codes[valid]] = 1.0
+        blocks.append(onehot)
+        offsets.append(offsets[-1] + len(levels))
+    L = np.hstack(blocks) if blocks else np.zeros((len(df), 0))
+
+    return {
+        "codes": codes,
+        "k": len(labels),
+        "numeric": {"columns": numeric_cols, "values": np.where(X_mask, X, 0.0), "mask": X_mask.astype(float)},
+        "rank": {"columns": rank_cols, "values": np.where(R_mask, R, 0.0), "mask": R_mask.astype(float)},
+        "categorical": {"columns": categorical_cols, "onehot": L, "offsets": np.array(offsets)},
+    }
+
+
+################################################################################
+######################### Batched Permutation Statistics #######################
+################################################################################
+def _group_indicators(labels, k):
+    # (groups, permutations, rows) 0/1 matrices of group membership
+    return np.stack([(labels == g).astype(float) for g in range(k)])
+
+def permutation_statistics(encoded, labels):
+    """
+    Test statistics for every variable under every row of a label matrix.
+
+    Parameters:
+    - encoded: Output of encode_permutation_data
+    - labels: (permutations x rows) matrix of group codes
+
+    Returns:
+    - Dictionary {"numeric", "rank", "categorical"} of (permutations x columns) arrays:
+        - numeric: |mean difference| for two groups, between-group sum of squares otherwise
+        - rank: Kruskal-Wallis numerator sum_g (R_g - n_g (N + 1) / 2)^2 / n_g
+        - categorical: Pearson chi-square statistic
+    """
+    k = encoded["k"]
+    G = _group_indicators(labels, k)
+    result = {}
+
+    num = encoded["numeric"]
+    if num["values"].shape[1] > 0:
+        counts = G @ num["mask"]
+        sums = G @ num["values"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+            if k == 2:
+                result["numeric"] = np.abs(means[0] - means[1])
+            else:
+                grand = sums.sum(axis=0) / counts.sum(axis=0)
+                result["numeric"] = np.nansum(counts * (means - grand) ** 2, axis=0)
+
+    rank = encoded["rank"]
+    if rank["values"].shape[1] > 0:
+        counts = G @ rank["mask"]
+        rank_sums = G @ rank["values"]
+        total = counts.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["rank"] = np.nansum((rank_sums - counts * (total + 1) / 2.0) ** 2 / counts, axis=0)
+        result["rank"] = np.where(total > 0, result["rank"], np.nan)  # undefined without any values
+
+    cat = encoded["categorical"]
+    if cat["onehot"].shape[1] > 0:
+        observed = G @ cat["onehot"]  # (groups, permutations, levels)
+        offsets = cat["offsets"]
+        level_totals = cat["onehot"].sum(axis=0)
+        var_of_level = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        # per-variable totals of each group (rows with a missing level are excluded)
+        group_totals = _segment_totals(observed, offsets, axis=2)[:, :, var_of_level]
+        var_totals = _segment_totals(level_totals, offsets, axis=0)[var_of_level]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            expected = level_totals * group_totals / var_totals
+            contributions = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0).sum(axis=0)
+        result["categorical"] = _segment_totals(contributions, offsets, axis=1)
+        result["categorical"][:, np.diff(offsets) == 0] = np.nan  # all-missing variables have no levels
+
+    return result
+
+
+################################################################################
+########################## Permutation Block Workers ###########################
+################################################################################
+_worker_data = {}
+
+def _init_worker(encoded, observed):
+    # each worker process receives the encoded data once instead of once per block
+    _worker_data["encoded"] = encoded
+    _worker_data["observed"] = observed
+
+def _permutation_block(args):
+    """
+    Counts permuted statistics >= observed for one block of permutations.
+    """
+    n_block, seed_seq = args
+    encoded = _worker_data["encoded"]
+    observed = _worker_data["observed"]
+
+    rng = np.random.default_rng(seed_seq)
+    labels = rng.permuted(np.tile(encoded["codes"], (n_block, 1)), axis=1)
+    permuted = permutation_statistics(encoded, labels)
+
+    return {key: (permuted[key] >= observed[key] * (1 - _tol)).sum(axis=0) for key in permuted}
+
+def permutation_pvalues(df, group_var, var_types, n_permutations=default_permutations, seed=default_seed,
+                        n_workers=None, block_cells=default_block_cells):
+    """
+    Permutation p-values for all selected variables from shared shuffled label matrices.
+
+    One matrix of shuffled group labels is generated per block of permutations and
+    applied to every variable at once through matrix products. Blocks are seeded
+    from np.random.SeedSequence(seed).spawn(...), so results do not depend on the
+    number of worker processes.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_types: Dictionary {column: variable type}
+    - n_permutations: Number of label permutations
+    - seed: Base seed for the SeedSequence
+    - n_workers: Number of worker processes (None = os.cpu_count(), 1 = run in process)
+    - block_cells: Max (permutations x rows) entries per block
+
+    Returns:
+    - Dictionary {column: p-value}, with p = (1 + hits) / (1 + n_permutations)
+      (None when the statistic is undefined)
+    """
+    var_types = {col: t for col, t in var_types.items() if t != "Omit" and col != group_var}
+    encoded = encode_permutation_data(df, group_var, var_types)
+    if encoded["k"] < 2 or not var_types:
+        return {}
+
+    codes = encoded["codes"]
+    observed = permutation_statistics(encoded, codes[None, :])
+    observed = {key: value[0] for key, value in observed.items()}
+
+    # fixed block sizes + spawned seeds keep the result independent of n_workers
+    block_size = max(1, min(n_permutations, block_cells // max(1, len(codes))))
+    sizes = [block_size] * (n_permutations // block_size)
+    if n_permutations % block_size:
+        sizes.append(n_permutations % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(sizes, seeds))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(tasks))
+
+    if n_workers <= 1:
+        _init_worker(encoded, observed)
+        block_hits = [_permutation_block(task) for task in tasks]
+        _worker_data.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(encoded, observed)) as executor:
+            block_hits = list(executor.map(_permutation_block, tasks))
+
+    p_values = {}
+    for key in observed:
+        hits = sum(block[key] for block in block_hits)
+        for j, col in enumerate(encoded[key]["columns"]):
+            if np.isnan(observed[key][j]):
+                p_values[col] = None  # statistic undefined (e.g. a group without data)
+            else:
+                p_values[col] = float((1 + hits[j]) / (1 + n_permutations))
+    return p_values
+
+
+################################################################################
+############################# Bootstrap Encodings ##############################
+################################################################################
+def encode_bootstrap_data(df, group_var, var_types):
+    """
+    Encodes all selected variables once, rows sorted by group, for the bootstrap.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_types: Dictionary {column: variable type}
+
+    Returns:
+    - Dictionary with the group labels, sizes and start rows and:
+        - numeric: columns, values (NaN -> 0) and non-missing mask for "Ratio Continuous"
+        - ordinal: columns, sparse one-hot matrix over the sorted levels of every "Ordinal Discrete"
+          column, the level values and the level offsets of each variable
+        - categorical: columns, sparse one-hot level matrix, the levels and the level offsets of each variable
+    """
+    codes, labels = pd.factorize(df[group_var], sort=False)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    sizes = np.bincount(codes[order], minlength=len(labels))
+    df = df.iloc[order]
+
+    numeric_cols = [col for col, t in var_types.items() if t == "Ratio Continuous"]
+    ordinal_cols = [col for col, t in var_types.items() if t == "Ordinal Discrete"]
+    categorical_cols = [col for col, t in var_types.items() if t.startswith("Categorical")]
+
+    X = df[numeric_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).reshape(len(df), -1)
+    X_mask = ~np.isnan(X)
+
+    def onehot_levels(columns, numeric):
+        # sparse (rows x levels) indicators: one entry per non-missing value, however many levels
+        rows, cols, levels, offsets = [], [], [], [0]
+        for col in columns:
+            values = pd.to_numeric(df[col], errors="coerce") if numeric else df[col]
+            var_codes, var_levels = pd.factorize(values, sort=numeric)  # ordinal levels in increasing order
+            valid = np.flatnonzero(var_codes >= 0)
+            rows.append(valid)
+            cols.append(offsets[-1] + var_codes[valid])
+            levels.append(list(var_levels))
+            offsets.append(offsets[-1] + len(var_levels))
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        onehot = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(df), offsets[-1]))
+        return onehot, levels, np.array(offsets)
+
+    O, ordinal_levels, ordinal_offsets = onehot_levels(ordinal_cols, numeric=True)
+    L, categorical_levels, categorical_offsets = onehot_levels(categorical_cols, numeric=False)
+
+    return {
+        "labels": list(labels),
+        "sizes": sizes,
+        "starts": np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64),
+        "numeric": {"columns": numeric_cols, "values": np.where(X_mask, X, 0.0), "mask": X_mask.astype(float)},
+        "ordinal": {"columns": ordinal_cols, "onehot": O, "offsets": ordinal_offsets,
+                    "levels": np.array([v for levels in ordinal_levels for v in levels], dtype=float)},
+        "categorical": {"columns": categorical_cols, "onehot": L, "offsets": categorical_offsets,
+                        "levels": categorical_levels},
+    }
+
+
+################################################################################
+########################## Batched Bootstrap Statistics ########################
+################################################################################
+def _segment_totals(counts, offsets, axis=1):
+    # per-level counts -> per-variable totals along axis; a variable without levels
+    # (all values missing) totals 0, as reduceat would read the next variable's first level
+    shape = list(np.shape(counts))
+    shape[axis] = len(offsets) - 1
+    totals = np.zeros(shape)
+    nonempty = offsets[1:] > offsets[:-1]
+    if nonempty.any():
+        index = [slice(None)] * len(shape)
+        index[axis] = nonempty
+        totals[tuple(index)] = np.add.reduceat(counts, offsets[:-1][nonempty], axis=axis)
+    return totals
+
+def bootstrap_statistics(encoded, weights):
+    """
+    Group summaries of every variable under a stack of resampling weights.
+
+    A resample of group g is a row of weights[g]: how often each of the group's rows
+    was drawn. Every summary is then a weighted sum, so all variables of a block of
+    resamples are evaluated with one (sparse for the level indicators) matrix product per group:
+    - numeric: means from the weighted sums and counts
+    - ordinal: medians from the weighted level histograms (count_quantiles, no sorting)
+    - categorical: proportions of every level among the non-missing values
+
+    Parameters:
+    - encoded: Output of encode_bootstrap_data
+    - weights: List with one (resamples x group rows) weight matrix per group
+
+    Returns:
+    - Dictionary {"numeric", "ordinal", "categorical"} of (groups x resamples x columns/levels) arrays
+    """
+    result = {}
+    num, ordinal, cat = encoded["numeric"], encoded["ordinal"], encoded["categorical"]
+    blocks = [slice(start, start + size) for start, size in zip(encoded["starts"], encoded["sizes"])]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if num["values"].shape[1] > 0:
+            result["numeric"] = np.stack([(W @ num["values"][rows]) / (W @ num["mask"][rows])
+                                          for W, rows in zip(weights, blocks)])
+
+        if ordinal["onehot"].shape[1] > 0:
+            medians = []
+            for W, rows in zip(weights, blocks):
+                counts = np.asarray(ordinal["onehot"][rows].T @ W.T).T
+                n = _segment_totals(counts, ordinal["offsets"])
+                medians.append(count_quantiles(counts, ordinal["levels"], ordinal["offsets"], n, 0.5))
+            result["ordinal"] = np.stack(medians)
+
+        if cat["onehot"].shape[1] > 0:
+            var_of_level = np.repeat(np.arange(len(cat["offsets"]) - 1), np.diff(cat["offsets"]))
+            proportions = []
+            for W, rows in zip(weights, blocks):
+                counts = np.asarray(cat["onehot"][rows].T @ W.T).T
+                proportions.append(counts / _segment_totals(counts, cat["offsets"])[:, var_of_level])
+            result["categorical"] = np.stack(proportions)
+
+    return result
+
+
+################################################################################
+########################### Bootstrap Block Workers ############################
+################################################################################
+def _resample_weights(rng, n_block, n_rows):
+    # (n_block x n_rows) draw counts of n_block resamples with replacement, from one index matrix
+    index = rng.integers(0, n_rows, size=(n_block, n_rows)) + n_rows * np.arange(n_block)[:, None]
+    return np.bincount(index.ravel(), minlength=n_block * n_rows).reshape(n_block, n_rows).astype(float)
+
+def _bootstrap_block(args):
+    """
+    Summaries of one block of resamples (drawn within each group).
+    """
+    n_block, seed_seq = args
+    encoded = _worker_data["encoded"]
+    rng = np.random.default_rng(seed_seq)
+    weights = [_resample_weights(rng, n_block, size) for size in encoded["sizes"]]
+    return bootstrap_statistics(encoded, weights)
+
+def _init_bootstrap_worker(encoded):
+    _worker_data["encoded"] = encoded
+
+def bootstrap_intervals(df, group_var, var_types, n_resamples=default_bootstraps, alpha=default_ci_alpha,
+                        seed=default_seed, n_workers=None, block_cells=default_block_cells):
+    """
+    Percentile bootstrap CIs of the group means (continuous), medians (ordinal) and level
+    proportions (categorical) of all selected variables, and of the difference between the
+    two groups when there are two.
+
+    Rows are resampled with replacement within each group (group sizes are kept). Each
+    block of resamples is drawn as one index matrix per group and applied to every
+    variable at once (bootstrap_statistics). Blocks are sized so the weight matrices stay
+    within block_cells entries, and are seeded from np.random.SeedSequence(seed).spawn(...),
+    so results do not depend on the number of worker processes.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - var_types: Dictionary {column: variable type}
+    - n_resamples: Number of bootstrap resamples
+    - alpha: 1 - confidence level
+    - seed: Base seed for the SeedSequence
+    - n_workers: Number of worker processes (None = os.cpu_count(), 1 = run in process)
+    - block_cells: Max (resamples x group rows) entries of the per-block weight matrices
+
+    Returns:
+    - Dictionary {column: {"levels": categorical levels (None otherwise),
+      "estimate", "low", "high": (rows x groups) arrays with one row per level (1 for numeric),
+      "difference": (estimate, low, high) arrays of first minus second group (None unless 2 groups)}}
+    """
+    var_types = {col: t for col, t in var_types.items() if t != "Omit" and col != group_var}
+    encoded = encode_bootstrap_data(df, group_var, var_types)
+    k = len(encoded["labels"])
+    if k == 0 or not var_types or n_resamples < 1:
+        return {}
+
+    observed = bootstrap_statistics(encoded, [np.ones((1, size)) for size in encoded["sizes"]])
+
+    # fixed block sizes + spawned seeds keep the result independent of n_workers; the block
+    # size only depends on the group sizes, so the resamples (and a variable's interval)
+    # do not depend on which other variables are computed alongside it
+    block_size = max(1, min(n_resamples, block_cells // max(1, int(encoded["sizes"].max()))))
+    sizes = [block_size] * (n_resamples // block_size)
+    if n_resamples % block_size:
+        sizes.append(n_resamples % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(sizes, seeds))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(tasks))
+
+    if n_workers <= 1:
+        _init_bootstrap_worker(encoded)
+        blocks = [_bootstrap_block(task) for task in tasks]
+        _worker_data.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_bootstrap_worker, initargs=(encoded,)) as executor:
+            blocks = list(executor.map(_bootstrap_block, tasks))
+
+    quantiles = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    intervals = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN resamples (e.g. an empty group)
+        for key, value in observed.items():
+            resampled = np.concatenate([block[key] for block in blocks], axis=1)  # (groups, resamples, stats)
+            low, high = np.nanpercentile(resampled, quantiles, axis=1)
+            estimate = value[:, 0]
+            if k == 2:
+                diff_low, diff_high = np.nanpercentile(resampled[0] - resampled[1], quantiles, axis=0)
+                difference = (estimate[0] - estimate[1], diff_low, diff_high)
+
+            columns = encoded[key]["columns"]
+            # one mean / median per numeric / ordinal column, one proportion per categorical level
+            offsets = encoded[key]["offsets"] if key == "categorical" else np.arange(len(columns) + 1)
+            for j, col in enumerate(columns):
+                rows = slice(offsets[j], offsets[j + 1])
+                intervals[col] = {
+                    "levels": encoded[key]["levels"][j] if key == "categorical" else None,
+                    "estimate": estimate[:, rows].T,
+                    "low": low[:, rows].T,
+                    "high": high[:, rows].T,
+                    "difference": tuple(part[rows] for part in difference) if k == 2 else None,
+                }
+    return intervals
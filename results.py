@@ -0,0 +1,278 @@
+
+# imports
+import copy
+import numpy as np
+
+
+################################################################################
+############################ Numeric Results Model #############################
+################################################################################
+class VariableResult:
+    """
+    Unformatted statistics of one variable, one entry per group.
+
+    kind is one of:
+    - "binary": Categorical (Y/N); counts has one row (the "Yes" level)
+    - "levels": Categorical (Dichotomous/Multinomial); counts has one row per level
+    - "continuous": Ratio Continuous; mean and sd are filled
+    - "ordinal": Ordinal Discrete; median, q1 and q3 are filled
+
+    total holds the same statistics for all groups combined, as a one-group VariableResult.
+    posthoc holds the pairwise comparisons of 3+ groups (see posthoc_results in app.py).
+    effect_sizes maps measure names ("smd", "hedges_g", "cliffs_delta", "risk_difference", ...)
+    to (estimate, CI low, CI high) for two-group comparisons.
+    plan is the TestPlan (strategy, estimated and actual seconds) the p-value was computed with.
+    adjusted_or holds the covariate-adjusted odds ratios (see perform_batched_adjusted_odds_ratios in app.py).
+    alt_p_value / alt_test_method hold the alternative test of sensitivity mode.
+    bootstrap holds the bootstrap confidence intervals (see resampling.bootstrap_intervals).
+    normality holds the normality screen of continuous variables: per-group p-values and
+    methods ("shapiro" / "dagostino" / None), see stats_engine.normality_tests.
+    quantile_error is the rank error bound of sketched medians and quartiles (None when exact).
+    imputation holds n_imputations, n_iterations and n_missing of results pooled over multiply
+    imputed datasets (see imputation.pool_results).
+    """
+
+    __slots__ = ("kind", "levels", "counts", "totals", "mean", "sd", "median", "q1", "q3",
+                 "p_value", "test_method", "odds_ratio", "or_low", "or_high", "odds_ratio_method", "total",
+                 "posthoc", "effect_sizes", "plan", "adjusted_or",
+                 "alt_p_value", "alt_test_method", "bootstrap", "normality", "quantile_error",
+                 "imputation")
+
+    def __init__(self, kind, **fields):
+        self.kind = kind
+        for name in self.__slots__[1:]:
+            setattr(self, name, fields.get(name))
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    @property
+    def proportions(self):
+        # share of each level within each group
+        if self.counts is None:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.totals > 0, self.counts / self.totals, 0.0)
+
+
+################################################################################
+############################### Formatting Layer ###############################
+################################################################################
+def _str_round(values, decimal_places):
+    # str(round(x, d)) for every entry, matching the table's historical number format
+    rounded = np.round(np.asarray(values, dtype=float), decimal_places)
+    return np.array([str(float(v)) for v in rounded.ravel()], dtype=object).reshape(rounded.shape)
+
+def _str_plain(values):
+    return np.array([str(float(v)) for v in np.ravel(values)], dtype=object).reshape(np.shape(values))
+
+def format_counts(counts, totals, decimal_places, output_format):
+    """
+    Formats a (rows x groups) count matrix as "n (%)" or "% (n)" strings in one pass.
+    """
+    counts = np.asarray(counts)
+    totals = np.broadcast_to(np.asarray(totals), counts.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = np.where(totals > 0, counts / totals * 100, 0.0)
+    n_str = counts.astype(np.int64).astype(str).astype(object)
+    pct_str = _str_round(percent, decimal_places)
+    if output_format == "n (%)":
+        return n_str + " (" + pct_str + "%)"
+    return pct_str + "% (" + n_str + ")"
+
+def format_interval_cells(estimates, lows, highs, decimal_places, unit=""):
+    """
+    "estimate [low–high]" strings rounded like the table values, "-" where undefined.
+    """
+    cells = []
+    for values in zip(_str_round(estimates, decimal_places), _str_round(lows, decimal_places),
+                      _str_round(highs, decimal_places), estimates, lows, highs):
+        est, lo, hi = values[:3]
+        if np.isnan(values[3]) or np.isnan(values[4]) or np.isnan(values[5]):
+            cells.append("-")
+        else:
+            cells.append(f"{est}{unit} [{lo}–{hi}{unit}]")
+    return cells
+
+def format_p_values(p_values, decimal_places):
+    """
+    Rounds p-values for display; missing p-values are shown as "None".
+    """
+    return ["None" if p is None or np.isnan(p) else str(round(float(p), decimal_places)) for p in p_values]
+
+def format_odds_ratio_cells(odds, ci_low, ci_high):
+    """
+    "OR [low–high]" strings, "undefined" where the odds ratio is not defined.
+    """
+    cells = []
+    for o, lo, hi in zip(odds, ci_low, ci_high):
+        if o is None or np.isnan(o) or np.isnan(lo) or np.isnan(hi):
+            cells.append("undefined")
+        else:
+            cells.append(f"{o:.2f} [{lo:.2f}–{hi:.2f}]")
+    return cells
+
+# effect size shown per kind of variable in "Type-specific" mode
+native_effect_sizes = {
+    "continuous": "hedges_g",
+    "ordinal": "cliffs_delta",
+    "binary": "risk_difference",
+    "levels": "risk_difference",  # dichotomous variables; multinomial ones fall back to the SMD
+}
+
+def native_effect_size(result):
+    """
+    Name of the type-specific effect size of a result (None if none was computed).
+    """
+    if not result.effect_sizes:
+        return None
+    measure = native_effect_sizes[result.kind]
+    return measure if measure in result.effect_sizes else "smd"
+
+def format_results(results, decimals_tab, decimals_pval, output_format):
+    """
+    Turns the numeric results of every variable into table cells.
+
+    Variables of the same kind are stacked so each number format is applied to
+    one array at a time; changing decimals or the output format only re-runs
+    this function, never the statistics.
+
+    Parameters:
+    - results: Dictionary {column: VariableResult}
+    - decimals_tab: Number of decimals for table values
+    - decimals_pval: Number of decimals for p-values
+    - output_format: "n (%)" or "% (n)"
+
+    Returns:
+    - Dictionary {column: {"group1": ..., "group1_subgroup0": ..., "total": ..., "total_subgroup0": ...,
+      "p_value": ..., "alt_p_value": ..., "odds_ratio": ..., "smd": ..., "effect_size": ..., "adjusted_or": ...,
+      "adjusted_or_subgroup0": ..., "adjusted_p": ..., "bootstrap_difference": ..., "bootstrap_difference_subgroup0": ...}}
+      With bootstrap intervals, the group cells get the interval of the group mean / median /
+      proportion on a second line
+    """
+    cells = {col: {} for col in results}
+    cols = list(results)
+
+    # p-values and odds ratios for every variable at once
+    for col, p in zip(cols, format_p_values([results[c].p_value for c in cols], decimals_pval)):
+        cells[col]["p_value"] = p
+    for col, p in zip(cols, format_p_values([results[c].alt_p_value for c in cols], decimals_pval)):
+        cells[col]["alt_p_value"] = p if results[col].alt_test_method is not None else "-"
+    or_cols = [col for col in cols if results[col].odds_ratio is not None]
+    if or_cols:
+        formatted = format_odds_ratio_cells([results[c].odds_ratio for c in or_cols],
+                                            [results[c].or_low for c in or_cols],
+                                            [results[c].or_high for c in or_cols])
+        for col, text in zip(or_cols, formatted):
+            cells[col]["odds_ratio"] = text
+    for col in cols:
+        cells[col].setdefault("odds_ratio", "-")
+
+    # effect sizes: the SMD and the type-specific measure, formatted like odds ratios
+    es_cols = [col for col in cols if results[col].effect_sizes]
+    if es_cols:
+        for key, measures in (("smd", ["smd"] * len(es_cols)), ("effect_size", [native_effect_size(results[c]) for c in es_cols])):
+            values = [results[c].effect_sizes[m] for c, m in zip(es_cols, measures)]
+            formatted = format_odds_ratio_cells([v[0] for v in values], [v[1] for v in values], [v[2] for v in values])
+            for col, text in zip(es_cols, formatted):
+                cells[col][key] = text
+    for col in cols:
+        cells[col].setdefault("smd", "-")
+        cells[col].setdefault("effect_size", "-")
+
+    # adjusted odds ratios: one cell per design column (per non-reference level for multinomial variables)
+    for col in cols:
+        adjusted = results[col].adjusted_or
+        if adjusted is None:
+            continue
+        formatted = format_odds_ratio_cells(adjusted["odds_ratio"], adjusted["low"], adjusted["high"])
+        if adjusted["levels"] is None:
+            cells[col]["adjusted_or"] = formatted[0]
+        else:
+            level_index = {str(level): i for i, level in enumerate(results[col].levels)}
+            for i in range(len(results[col].levels)):
+                cells[col][f"adjusted_or_subgroup{i}"] = "Ref"
+            for level, text in zip(adjusted["levels"], formatted):
+                cells[col][f"adjusted_or_subgroup{level_index[str(level)]}"] = text
+        cells[col]["adjusted_p"] = format_p_values([adjusted["lr_p"]], decimals_pval)[0]
+    for col in cols:
+        cells[col].setdefault("adjusted_or", "-")
+        cells[col].setdefault("adjusted_p", "-")
+
+    # counts: all categorical rows stacked into one matrix
+    count_cols = [col for col in cols if results[col].kind in ("binary", "levels")]
+    if count_cols:
+        counts = np.vstack([results[c].counts for c in count_cols])
+        totals = np.vstack([np.broadcast_to(results[c].totals, results[c].counts.shape) for c in count_cols])
+        formatted = format_counts(counts, totals, decimals_tab, output_format)
+        row = 0
+        for col in count_cols:
+            result = results[col]
+            for i in range(result.counts.shape[0]):
+                for g in range(result.counts.shape[1]):
+                    key = f"group{g + 1}" if result.kind == "binary" else f"group{g + 1}_subgroup{i}"
+                    cells[col][key] = formatted[row, g]
+                row += 1
+
+    # mean ± SD
+    cont_cols = [col for col in cols if results[col].kind == "continuous"]
+    if cont_cols:
+        means = _str_round(np.vstack([results[c].mean for c in cont_cols]), decimals_tab)
+        sds = _str_round(np.vstack([results[c].sd for c in cont_cols]), decimals_tab)
+        formatted = means + " ± " + sds
+        for j, col in enumerate(cont_cols):
+            for g in range(formatted.shape[1]):
+                cells[col][f"group{g + 1}"] = formatted[j, g]
+
+    # median [IQR]
+    ord_cols = [col for col in cols if results[col].kind == "ordinal"]
+    if ord_cols:
+        medians = _str_plain(np.vstack([results[c].median for c in ord_cols]))
+        q1 = _str_plain(np.vstack([results[c].q1 for c in ord_cols]))
+        q3 = _str_plain(np.vstack([results[c].q3 for c in ord_cols]))
+        formatted = medians + " [" + q1 + "-" + q3 + "]"
+        for j, col in enumerate(ord_cols):
+            for g in range(formatted.shape[1]):
+                cells[col][f"group{g + 1}"] = formatted[j, g]
+
+    # bootstrap intervals: a second line in the group cells plus the first-minus-second group difference
+    for col in cols:
+        boot = results[col].bootstrap
+        if boot is None:
+            continue
+        result = results[col]
+        if boot["levels"] is None:
+            rows, keys = [0], ["group{g}"]
+            diff_keys = ["bootstrap_difference"]
+            scale, unit = 1, ""
+        else:
+            level_index = {str(level): i for i, level in enumerate(boot["levels"])}
+            present = [i for i, level in enumerate(result.levels) if str(level) in level_index]
+            rows = [level_index[str(result.levels[i])] for i in present]
+            keys = ["group{g}" if result.kind == "binary" else f"group{{g}}_subgroup{i}" for i in present]
+            diff_keys = ["bootstrap_difference" if result.kind == "binary" else f"bootstrap_difference_subgroup{i}"
+                         for i in present]
+            scale, unit = 100, "%"  # proportions are shown as percentages
+        lows = _str_round(boot["low"][rows] * scale, decimals_tab)
+        highs = _str_round(boot["high"][rows] * scale, decimals_tab)
+        for r, key in enumerate(keys):
+            for g in range(lows.shape[1]):
+                cell_key = key.format(g=g + 1)
+                if cell_key in cells[col] and not np.isnan(boot["low"][rows[r], g]):
+                    cells[col][cell_key] += f"\n({lows[r, g]}–{highs[r, g]}{unit})"
+        if boot["difference"] is not None:
+            estimate, low, high = (np.asarray(part)[rows] * scale for part in boot["difference"])
+            for key, text in zip(diff_keys, format_interval_cells(estimate, low, high, decimals_tab, unit)):
+                cells[col][key] = text
+    for col in cols:
+        cells[col].setdefault("bootstrap_difference", "-")
+
+    # Total column: the combined results are formatted as a single group
+    totals = {col: results[col].total for col in cols if results[col].total is not None}
+    if totals:
+        for col, total_cells in format_results(totals, decimals_tab, decimals_pval, output_format).items():
+            for key, text in total_cells.items():
+                if key == "group1" or key.startswith("group1_"):
+                    cells[col]["total" + key[len("group1"):]] = text
+
+    return cells
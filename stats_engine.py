@@ -0,0 +1,1498 @@
+
+# imports
+import time
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.special import gammaln
+from exact_tests import fisher_freeman_halton, exact_rank_sum_pvalue, default_exact_rank_sum_n
+from memo import TableMemo, NullDistributionCache, cache_directory
+from sketch import KLLSketch, kll_rank_error, default_sketch_k, default_sketch_seed
+from planner import TestPlan, rank_sum_null_cost, cost_overhead
+
+# variable types handled by the batched numeric engine
+numeric_types = ["Ratio Continuous", "Ordinal Discrete"]
+default_ordinal_domain = 4096  # widest integer range an ordinal column is counted over directly
+default_chunk_cells = 4_000_000  # values held in memory at once by the chunked sketch pass (32 MB of floats)
+default_rank_bins = 1000  # sketch quantile bins of the chunked rank tests
+
+# normality screening of "Ratio Continuous" variables
+default_normality_alpha = 0.05
+shapiro_max_n = 5000  # Shapiro-Wilk up to this group size, D'Agostino-Pearson above (as R's shapiro.test limit)
+normality_memo = TableMemo()  # (column fingerprint, group fingerprint) -> screening result, shared by all Calculates
+
+# batched Fisher 2x2 settings
+default_fisher_grid_cells = 5_000_000  # max (tables x support) entries per kernel call
+fisher_memo = TableMemo()  # canonical 2x2 table -> two-sided p-value, shared by all Calculates
+rank_sum_nulls = NullDistributionCache(cache_directory("rank_sum"))  # (n1, n2, ties) -> null distribution
+
+
+################################################################################
+############################ Group Factorization ###############################
+################################################################################
+def factorize_groups(df, group_var):
+    """
+    Factorizes the grouping column once so every variable can reuse the same split.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+
+    Returns:
+    - Dictionary with:
+        - labels: group labels in order of appearance (same order as df[group_var].dropna().unique())
+        - codes: np.ndarray of integer group codes per row (-1 for missing group)
+        - sizes: np.ndarray with the number of rows in each group
+        - order: row indices sorted by group (rows with a missing group are dropped)
+        - starts: start offset of each group inside `order`
+    """
+    codes, labels = pd.factorize(df[group_var], sort=False)
+    codes = np.asarray(codes, dtype=np.int64)
+    k = len(labels)
+
+    sizes = np.bincount(codes[codes >= 0], minlength=k)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+
+    return {
+        "labels": list(labels),
+        "codes": codes,
+        "sizes": sizes,
+        "order": order,
+        "starts": starts,
+    }
+
+def numeric_matrix(df, columns, split):
+    """
+    Builds a (rows x columns) float matrix with the rows already sorted by group.
+
+    Non-numeric entries (e.g. leftover "unknown" strings) are coerced to NaN.
+    """
+    if len(columns) == 0:
+        return np.empty((len(split["order"]), 0))
+    values = df[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return values[split["order"]]
+
+
+################################################################################
+######################### Batched Descriptive Pass #############################
+################################################################################
+def _sorted_quantiles(sorted_block, counts, q):
+    """
+    Linear-interpolation quantile (pandas default) of each column of a block
+    that was sorted along axis 0 with NaNs last.
+    """
+    pos = (counts - 1) * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    valid = counts > 0
+    lo = np.where(valid, lo, 0)
+    hi = np.where(valid, hi, 0)
+
+    if sorted_block.shape[0] == 0:
+        return np.full(counts.shape, np.nan)
+
+    lo_vals = np.take_along_axis(sorted_block, lo[None, :], axis=0)[0]
+    hi_vals = np.take_along_axis(sorted_block, hi[None, :], axis=0)[0]
+    result = lo_vals + (hi_vals - lo_vals) * (pos - lo)
+    return np.where(valid, result, np.nan)
+
+def summarize_numeric_columns(df, group_var, columns, split=None):
+    """
+    Computes n, mean, SD, median and quartiles for every column and every group in one pass.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - columns: List of numeric columns ("Ratio Continuous" / "Ordinal Discrete")
+    - split: Optional output of factorize_groups to reuse
+
+    Returns:
+    - Dictionary of (groups x columns) arrays: n, mean, sd, median, q1, q3,
+      the matching per-column total_* arrays of all groups combined,
+      plus the group-sorted matrix and split used to build them
+    """
+    if split is None:
+        split = factorize_groups(df, group_var)
+
+    columns = list(columns)
+    X = numeric_matrix(df, columns, split)
+    mask = ~np.isnan(X)
+    Xz = np.where(mask, X, 0.0)
+
+    starts = split["starts"]
+    sizes = split["sizes"]
+    k = len(split["labels"])
+    p = len(columns)
+
+    if k == 0 or p == 0:
+        empty = np.empty((k, p))
+        empty_total = np.full(p, np.nan)
+        return {"columns": columns, "labels": split["labels"], "split": split, "X": X,
+                "n": empty, "sum": empty, "mean": empty, "var": empty, "sd": empty,
+                "median": empty, "q1": empty, "q3": empty,
+                "total_n": np.zeros(p), "total_mean": empty_total, "total_var": empty_total, "total_sd": empty_total,
+                "total_median": empty_total, "total_q1": empty_total, "total_q3": empty_total}
+
+    # group sums for all columns in one reduceat (empty groups are zeroed below)
+    nonempty = sizes > 0
+    n = np.zeros((k, p))
+    sums = np.zeros((k, p))
+    n[nonempty] = np.add.reduceat(mask, starts[nonempty], axis=0)
+    sums[nonempty] = np.add.reduceat(Xz, starts[nonempty], axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / n
+
+        # second pass on centered values for a numerically stable variance
+        centered = np.where(mask, X - np.repeat(np.nan_to_num(mean), sizes, axis=0), 0.0)
+        ss = np.zeros((k, p))
+        ss[nonempty] = np.add.reduceat(centered ** 2, starts[nonempty], axis=0)
+        var = ss / (n - 1)
+
+    mean[n == 0] = np.nan
+    var[n < 2] = np.nan
+
+    median = np.full((k, p), np.nan)
+    q1 = np.full((k, p), np.nan)
+    q3 = np.full((k, p), np.nan)
+    blocks = []
+    for g in range(k):
+        block = np.sort(X[starts[g]:starts[g] + sizes[g]], axis=0)
+        median[g] = _sorted_quantiles(block, n[g], 0.5)
+        q1[g] = _sorted_quantiles(block, n[g], 0.25)
+        q3[g] = _sorted_quantiles(block, n[g], 0.75)
+        blocks.append(block)
+
+    # Total column from the group sufficient statistics (pooled mean and SS, no extra pass);
+    # the sorted group blocks are merged by a stable (run-aware) sort for the overall quartiles
+    total_n = n.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total_mean = sums.sum(axis=0) / total_n
+        total_ss = ss.sum(axis=0) + np.nansum(n * (mean - total_mean) ** 2, axis=0)
+        total_var = total_ss / (total_n - 1)
+    total_mean[total_n == 0] = np.nan
+    total_var[total_n < 2] = np.nan
+    merged = np.sort(np.concatenate(blocks, axis=0), axis=0, kind="stable")
+
+    return {
+        "columns": columns,
+        "labels": split["labels"],
+        "split": split,
+        "X": X,
+        "n": n,
+        "sum": sums,
+        "mean": mean,
+        "var": var,
+        "sd": np.sqrt(var),
+        "median": median,
+        "q1": q1,
+        "q3": q3,
+        "total_n": total_n,
+        "total_mean": total_mean,
+        "total_var": total_var,
+        "total_sd": np.sqrt(total_var),
+        "total_median": _sorted_quantiles(merged, total_n, 0.5),
+        "total_q1": _sorted_quantiles(merged, total_n, 0.25),
+        "total_q3": _sorted_quantiles(merged, total_n, 0.75),
+    }
+
+
+################################################################################
+########################### Chunked Sketch Summaries ###########################
+################################################################################
+def numeric_chunks(df, columns, max_cells=default_chunk_cells):
+    """
+    Reads columns as float matrices of at most max_cells values, one block of rows at a time.
+
+    The rows of a chunk are sliced first (df.iloc[rows, positions]), so only that chunk is
+    ever copied, and only text columns of the chunk are converted with pd.to_numeric.
+
+    Yields:
+    - Tuples (first row, (chunk rows x columns) float matrix with NaN for missing values)
+    """
+    positions = [df.columns.get_loc(col) for col in columns]
+    chunk_rows = max(1, max_cells // max(len(positions), 1))
+    for start in range(0, len(df) if positions else 0, chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows, positions]
+        block = np.empty(chunk.shape)
+        for j in range(len(positions)):
+            values = chunk.iloc[:, j]
+            if not pd.api.types.is_numeric_dtype(values.dtype):
+                values = pd.to_numeric(values, errors="coerce")
+            block[:, j] = values.to_numpy(dtype=float, na_value=np.nan)
+        yield start, block
+
+def sketch_numeric_columns(df, group_var, columns, split=None, max_cells=default_chunk_cells, sketch_k=default_sketch_k):
+    """
+    Fixed-memory counterpart of summarize_numeric_columns for very large tables. Rows are
+    read in chunks of at most max_cells values; each chunk updates the running central
+    moments up to the fourth (merged with the pairwise formulas of Chan et al. / Pebay, so
+    n, mean, SD, skewness and kurtosis are exact) and one KLL quantile sketch per (column,
+    group). The Total column merges the group sketches of each column. No row matrix is
+    built: the moments serve the Welch tests and the normality screen, the sketches the
+    median, quartiles and the rank bins of sketch_rank_sums.
+    Memory is O(max_cells + groups x columns x sketch_k), whatever the number of rows.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - columns: List of numeric columns ("Ratio Continuous" / "Ordinal Discrete")
+    - split: Optional output of factorize_groups to reuse
+    - max_cells: Values per chunk
+    - sketch_k: Capacity of the KLL sketches
+
+    Returns:
+    - Dictionary with the keys of summarize_numeric_columns (no "X"), the central moment
+      sums m2, m3 and m4, the sketches and rank_error, the normalized rank error bound of
+      the median and quartiles (see sketch.kll_rank_error)
+    """
+    if split is None:
+        split = factorize_groups(df, group_var)
+
+    columns = list(columns)
+    codes = split["codes"]
+    k = len(split["labels"])
+    p = len(columns)
+
+    n = np.zeros((k, p))
+    mean = np.zeros((k, p))
+    m2 = np.zeros((k, p))
+    m3 = np.zeros((k, p))
+    m4 = np.zeros((k, p))
+    sketches = [[KLLSketch(sketch_k, seed=(default_sketch_seed, g, j)) for j in range(p)] for g in range(k)]
+
+    for start, chunk in numeric_chunks(df, columns, max_cells):
+        chunk_codes = codes[start:start + len(chunk)]
+        order = np.argsort(chunk_codes, kind="stable")
+        order = order[chunk_codes[order] >= 0]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(chunk_codes[order], minlength=k))))
+        chunk = chunk[order]
+        for g in np.flatnonzero(np.diff(bounds)):
+            rows = chunk[bounds[g]:bounds[g + 1]]
+            n_chunk = (~np.isnan(rows)).sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_chunk = np.nansum(rows, axis=0) / n_chunk
+                centered = rows - mean_chunk
+                m2_chunk, m3_chunk, m4_chunk = (np.nansum(centered ** power, axis=0) for power in (2, 3, 4))
+                # Chan et al. / Pebay: combine the chunk's central moments with the running ones
+                n_old = n[g]
+                n_new = n_old + n_chunk
+                weight = np.where(n_new > 0, n_chunk / n_new, 0.0)  # n_chunk / n
+                delta = np.nan_to_num(mean_chunk - mean[g])
+                old_weight = np.where(n_new > 0, n_old / n_new, 0.0)  # n_old / n
+            m4[g] += (m4_chunk + delta ** 4 * n_old * weight * (old_weight ** 2 - old_weight * weight + weight ** 2)
+                      + 6 * delta ** 2 * (old_weight ** 2 * m2_chunk + weight ** 2 * m2[g])
+                      + 4 * delta * (old_weight * m3_chunk - weight * m3[g]))
+            m3[g] += (m3_chunk + delta ** 3 * n_old * weight * (old_weight - weight)
+                      + 3 * delta * (old_weight * m2_chunk - weight * m2[g]))
+            m2[g] += m2_chunk + delta ** 2 * n_old * weight
+            mean[g] += delta * weight
+            n[g] = n_new
+            for j in range(p):
+                sketches[g][j].update(rows[:, j])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = m2 / (n - 1)
+    sums = mean * n
+    mean[n == 0] = np.nan
+    var[n < 2] = np.nan
+
+    group_quantiles = np.array([[sketch.quantiles([0.25, 0.5, 0.75]) for sketch in row] for row in sketches]).reshape(k, p, 3)
+    totals = []
+    for j in range(p):
+        merged = KLLSketch(sketch_k, seed=(default_sketch_seed, k, j))
+        for g in range(k):
+            merged.merge(sketches[g][j])
+        totals.append(merged)
+    total_quantiles = np.array([sketch.quantiles([0.25, 0.5, 0.75]) for sketch in totals]).reshape(p, 3)
+
+    # Total column from the group moments, as in summarize_numeric_columns
+    total_n = n.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total_mean = sums.sum(axis=0) / total_n
+        total_var = (m2.sum(axis=0) + np.nansum(n * (mean - total_mean) ** 2, axis=0)) / (total_n - 1)
+    total_mean[total_n == 0] = np.nan
+    total_var[total_n < 2] = np.nan
+
+    return {
+        "columns": columns,
+        "labels": split["labels"],
+        "split": split,
+        "n": n,
+        "sum": sums,
+        "mean": mean,
+        "var": var,
+        "sd": np.sqrt(var),
+        "median": group_quantiles[:, :, 1],
+        "q1": group_quantiles[:, :, 0],
+        "q3": group_quantiles[:, :, 2],
+        "m2": m2,
+        "m3": m3,
+        "m4": m4,
+        "total_n": total_n,
+        "total_mean": total_mean,
+        "total_var": total_var,
+        "total_sd": np.sqrt(total_var),
+        "total_median": total_quantiles[:, 1],
+        "total_q1": total_quantiles[:, 0],
+        "total_q3": total_quantiles[:, 2],
+        "sketches": sketches,
+        "total_sketches": totals,
+        "rank_error": kll_rank_error(sketch_k),
+    }
+
+def sketch_rank_sums(df, summary, n_bins=default_rank_bins, max_cells=default_chunk_cells):
+    """
+    Rank sums of a chunked summary (sketch_numeric_columns), without a row matrix.
+
+    Every column is cut at n_bins quantiles of its Total sketch and a second chunked pass
+    counts the values of each group in every bin. The rank sums and tie sums are those of
+    the binned values, derived from the counts as in summarize_ordinal_columns, so the
+    Mann-Whitney, Kruskal-Wallis and Dunn tests are tie-corrected rank tests of the binned
+    data. The cut points depend on the pooled values only, so the tests keep their level;
+    each bin holds about 1 / n_bins of the values (within the sketch's rank error), so the
+    binned ranks stay close to the exact ones. Stored on the summary, as group_rank_sums does.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - summary: Output of sketch_numeric_columns
+    - n_bins: Number of quantile bins per column
+    - max_cells: Values per chunk
+
+    Returns:
+    - Tuple ((groups x columns) rank sums, per-column sum of (t^3 - t) over the bins)
+    """
+    if "rank_sums" in summary:
+        return summary["rank_sums"], summary["tie_sums"]
+
+    columns = summary["columns"]
+    codes = summary["split"]["codes"]
+    k = summary["n"].shape[0]
+    p = len(columns)
+
+    qs = np.linspace(0, 1, n_bins + 1)[1:-1]
+    cuts = [np.unique(sketch.quantiles(qs)) if sketch.n else np.empty(0) for sketch in summary["total_sketches"]]
+    offsets = np.concatenate(([0], np.cumsum([len(c) + 1 for c in cuts]))).astype(np.int64)
+    counts = np.zeros(offsets[-1] * k)
+    for start, chunk in numeric_chunks(df, columns, max_cells):
+        chunk_codes = codes[start:start + len(chunk)]
+        cells = []
+        for j in range(p):
+            valid = ~np.isnan(chunk[:, j]) & (chunk_codes >= 0)
+            bins = offsets[j] + np.searchsorted(cuts[j], chunk[valid, j], side="right")
+            cells.append(bins * k + chunk_codes[valid])
+        counts += np.bincount(np.concatenate(cells), minlength=len(counts))
+    histogram = counts.reshape(-1, k)
+
+    # midrank of a bin: values below it within its column + (ties + 1) / 2
+    column_of_bin = np.repeat(np.arange(p), np.diff(offsets))
+    combined = histogram.sum(axis=1)
+    below = np.concatenate(([0.0], np.cumsum(combined)))
+    below = below[:-1] - below[offsets[:-1]][column_of_bin]
+    midranks = below + (combined + 1) / 2
+
+    summary["rank_sums"] = _segment_sums(histogram * midranks[:, None], offsets).T
+    summary["tie_sums"] = _segment_sums(combined ** 3 - combined, offsets)
+    summary["rank_bins"] = n_bins
+    return summary["rank_sums"], summary["tie_sums"]
+
+
+################################################################################
+########################## Count-Domain Ordinal Engine #########################
+################################################################################
+def ordinal_histograms(df, columns, split, max_domain=default_ordinal_domain):
+    """
+    Reduces every ordinal column to a (levels x groups) count table with a single bincount.
+
+    Integer columns whose range spans at most max_domain values are coded as value - min
+    (no hashing, no sorting); other columns are factorized and only their distinct values
+    are sorted. The levels of all columns are stacked, column j owning the rows
+    offsets[j]:offsets[j + 1] of the histogram.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - columns: List of "Ordinal Discrete" columns
+    - split: Output of factorize_groups
+    - max_domain: Widest integer range counted directly
+
+    Returns:
+    - Tuple (histogram (levels x groups), sorted level values, offsets (columns + 1))
+    """
+    k = len(split["labels"])
+    p = len(columns)
+    if p == 0:
+        return np.zeros((0, k)), np.empty(0), np.zeros(1, dtype=np.int64)
+
+    X = df[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    valid = ~np.isnan(X) & (split["codes"] >= 0)[:, None]
+    low = np.where(valid, X, np.inf).min(axis=0)
+    high = np.where(valid, X, -np.inf).max(axis=0)
+    integral = np.all(~valid | (X == np.round(X)), axis=0)
+    empty = ~valid.any(axis=0)
+    dense = empty | (integral & (high - low < max_domain))
+
+    codes = np.zeros(X.shape, dtype=np.int64)
+    levels = []
+    for j in range(p):
+        if empty[j]:
+            levels.append(np.empty(0))
+        elif dense[j]:
+            codes[:, j] = np.where(valid[:, j], X[:, j] - low[j], 0)
+            levels.append(low[j] + np.arange(high[j] - low[j] + 1))
+        else:
+            # hash the values, then sort only the distinct ones
+            rows = valid[:, j]
+            value_codes, uniques = pd.factorize(X[rows, j], sort=False)
+            order = np.argsort(uniques)
+            rank = np.empty(len(uniques), dtype=np.int64)
+            rank[order] = np.arange(len(uniques))
+            codes[rows, j] = rank[value_codes]
+            levels.append(np.asarray(uniques)[order])
+
+    offsets = np.concatenate(([0], np.cumsum([len(v) for v in levels]))).astype(np.int64)
+    index = ((offsets[:-1][None, :] + codes) * k + split["codes"][:, None])[valid]
+    histogram = np.bincount(index, minlength=offsets[-1] * k).reshape(offsets[-1], k).astype(float)
+    return histogram, np.concatenate(levels), offsets
+
+def chunked_ordinal_histograms(df, columns, split, max_cells=default_chunk_cells):
+    """
+    Fixed-memory counterpart of ordinal_histograms: the same (levels x groups) count table,
+    built from row chunks of at most max_cells values (numeric_chunks).
+
+    Each chunk counts its distinct values per group with one bincount of
+    level code x groups + group code per column, and the counts are added into the running
+    table of the column (levels merged in sorted order). Memory is O(max_cells + levels x
+    groups), whatever the number of rows; only the levels that occur are kept.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - columns: List of "Ordinal Discrete" columns
+    - split: Output of factorize_groups
+    - max_cells: Values per chunk
+
+    Returns:
+    - Tuple (histogram (levels x groups), sorted level values, offsets (columns + 1))
+    """
+    k = len(split["labels"])
+    p = len(columns)
+    codes = split["codes"]
+    levels = [np.empty(0) for _ in range(p)]
+    counts = [np.zeros((0, k)) for _ in range(p)]
+
+    for start, chunk in numeric_chunks(df, columns, max_cells):
+        chunk_codes = codes[start:start + len(chunk)]
+        for j in range(p):
+            valid = ~np.isnan(chunk[:, j]) & (chunk_codes >= 0)
+            if not valid.any():
+                continue
+            values, level_codes = np.unique(chunk[valid, j], return_inverse=True)
+            chunk_counts = np.bincount(level_codes.ravel() * k + chunk_codes[valid], minlength=len(values) * k)
+            merged = np.union1d(levels[j], values)
+            table = np.zeros((len(merged), k))
+            table[np.searchsorted(merged, levels[j])] += counts[j]
+            table[np.searchsorted(merged, values)] += chunk_counts.reshape(len(values), k)
+            levels[j], counts[j] = merged, table
+
+    offsets = np.concatenate(([0], np.cumsum([len(v) for v in levels]))).astype(np.int64)
+    histogram = np.vstack(counts) if p else np.zeros((0, k))
+    return histogram, np.concatenate(levels) if p else np.empty(0), offsets
+
+def _segment_sums(values, offsets):
+    # sums of consecutive row blocks [offsets[j], offsets[j + 1]); empty blocks sum to 0
+    sums = np.zeros((len(offsets) - 1,) + values.shape[1:])
+    nonempty = offsets[1:] > offsets[:-1]
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(values, offsets[:-1][nonempty], axis=0)
+    return sums
+
+def count_quantiles(counts, levels, offsets, n, q):
+    """
+    Linear-interpolation quantile (as _sorted_quantiles) of every column from its counts.
+
+    The value of 0-based rank r of column j is the first level whose cumulative count
+    within the column's block exceeds r, found by one searchsorted over all columns.
+    counts may also be a (rows x levels) stack of histograms with n of shape (rows x columns),
+    e.g. one row per bootstrap resample; the rows are shifted apart so one searchsorted
+    still serves all of them.
+
+    Parameters:
+    - counts: Histogram(s) over the stacked levels of all columns
+    - levels: Sorted level values, column j owning levels[offsets[j]:offsets[j + 1]]
+    - offsets: Start of each column's levels (columns + 1)
+    - n: Number of values of each column (per row of counts)
+    - q: Quantile in [0, 1]
+    """
+    stacked = np.ndim(counts) == 2
+    counts = np.atleast_2d(counts)
+    n = np.atleast_2d(n)
+    rows, n_levels = counts.shape
+    if rows == 0 or n_levels == 0:
+        result = np.full(n.shape, np.nan)
+        return result if stacked else result[0]
+
+    cumulative = np.concatenate((np.zeros((rows, 1)), np.cumsum(counts, axis=1)), axis=1)
+    base = cumulative[:, offsets[:-1]]
+    pos = (n - 1) * q
+    valid = n > 0
+    lo = np.where(valid, np.floor(pos), 0)
+    hi = np.where(valid, np.ceil(pos), 0)
+
+    shift = (cumulative[:, -1].max() + 1) * np.arange(rows)[:, None]
+    flat = (cumulative[:, 1:] + shift).ravel()
+    first = n_levels * np.arange(rows)[:, None]
+    lo_index = np.clip(np.searchsorted(flat, base + lo + shift, side="right") - first, 0, n_levels - 1)
+    hi_index = np.clip(np.searchsorted(flat, base + hi + shift, side="right") - first, 0, n_levels - 1)
+    lo_vals, hi_vals = levels[lo_index], levels[hi_index]
+    result = np.where(valid, lo_vals + (hi_vals - lo_vals) * (pos - lo), np.nan)
+    return result if stacked else result[0]
+
+def summarize_ordinal_columns(df, group_var, columns, split=None, max_domain=default_ordinal_domain, max_cells=None):
+    """
+    Count-domain replacement of summarize_numeric_columns for "Ordinal Discrete" columns.
+
+    Every column is reduced to a per-group histogram of its values (ordinal_histograms),
+    and every statistic is derived from the counts in O(rows + levels), without sorting:
+    - n, mean and variance from the count-weighted level values
+    - median and quartiles from the cumulative counts
+    - midranks from the cumulative counts of all groups, so the per-group rank sums and
+      the tie sums (sum of t^3 - t over the level counts) are stored on the summary and
+      reused by the rank-sum, Kruskal-Wallis, Mann-Whitney, Dunn and Cliff's delta code
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - group_var: Name of the grouping column
+    - columns: List of "Ordinal Discrete" columns
+    - split: Optional output of factorize_groups to reuse
+    - max_domain: Widest integer range counted directly (see ordinal_histograms)
+    - max_cells: Build the histograms chunk by chunk, at most max_cells values at a time
+      (chunked_ordinal_histograms); None counts the full column matrix in one pass
+
+    Returns:
+    - Dictionary with the same entries as summarize_numeric_columns (without the row
+      matrix), plus rank_sums, tie_sums and the histogram, levels and offsets
+    """
+    if split is None:
+        split = factorize_groups(df, group_var)
+
+    columns = list(columns)
+    k = len(split["labels"])
+    p = len(columns)
+    if max_cells is None:
+        histogram, levels, offsets = ordinal_histograms(df, columns, split, max_domain)
+    else:
+        histogram, levels, offsets = chunked_ordinal_histograms(df, columns, split, max_cells)
+    column_of_level = np.repeat(np.arange(p), np.diff(offsets))
+
+    n = _segment_sums(histogram, offsets).T
+    sums = _segment_sums(histogram * levels[:, None], offsets).T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / n
+        centered = levels[:, None] - np.nan_to_num(mean).T[column_of_level]
+        ss = _segment_sums(histogram * centered ** 2, offsets).T
+        var = ss / (n - 1)
+    mean[n == 0] = np.nan
+    var[n < 2] = np.nan
+
+    # one stacked histogram per group
+    median = count_quantiles(histogram.T, levels, offsets, n, 0.5)
+    q1 = count_quantiles(histogram.T, levels, offsets, n, 0.25)
+    q3 = count_quantiles(histogram.T, levels, offsets, n, 0.75)
+
+    # Total column and ranks from the counts of all groups combined
+    combined = histogram.sum(axis=1)
+    total_n = n.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total_mean = sums.sum(axis=0) / total_n
+        total_centered = levels - np.nan_to_num(total_mean)[column_of_level]
+        total_var = _segment_sums(combined * total_centered ** 2, offsets) / (total_n - 1)
+    total_mean[total_n == 0] = np.nan
+    total_var[total_n < 2] = np.nan
+
+    # midrank of a level: values below it within its column + (ties + 1) / 2
+    below = np.concatenate(([0.0], np.cumsum(combined)))
+    below = below[:-1] - below[offsets[:-1]][column_of_level]
+    midranks = below + (combined + 1) / 2
+
+    return {
+        "columns": columns,
+        "labels": split["labels"],
+        "split": split,
+        "n": n,
+        "sum": sums,
+        "mean": mean,
+        "var": var,
+        "sd": np.sqrt(var),
+        "median": median,
+        "q1": q1,
+        "q3": q3,
+        "total_n": total_n,
+        "total_mean": total_mean,
+        "total_var": total_var,
+        "total_sd": np.sqrt(total_var),
+        "total_median": count_quantiles(combined, levels, offsets, total_n, 0.5),
+        "total_q1": count_quantiles(combined, levels, offsets, total_n, 0.25),
+        "total_q3": count_quantiles(combined, levels, offsets, total_n, 0.75),
+        "rank_sums": _segment_sums(histogram * midranks[:, None], offsets).T,
+        "tie_sums": _segment_sums(combined ** 3 - combined, offsets),
+        "histogram": histogram,
+        "levels": levels,
+        "offsets": offsets,
+    }
+
+
+################################################################################
+############################ Batched Two-Group Tests ###########################
+################################################################################
+def welch_ttest(summary):
+    """
+    Welch's t-test (ttest_ind(equal_var=False)) for every column of a two-group summary.
+
+    Returns:
+    - Tuple of np.ndarrays (t statistics, p-values)
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    v1, v2 = summary["var"][0] / n1, summary["var"][1] / n2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se2 = v1 + v2
+        t = (summary["mean"][0] - summary["mean"][1]) / np.sqrt(se2)
+        dof = se2 ** 2 / (v1 ** 2 / (n1 - 1) + v2 ** 2 / (n2 - 1))
+        p_values = 2 * stats.t.sf(np.abs(t), dof)
+    return t, p_values
+
+def rank_sum_test(summary):
+    """
+    Wilcoxon rank-sum test (stats.ranksums) for every column of a two-group summary.
+
+    Ranks are computed once per column over both groups (shared through
+    group_rank_sums); the statistic is the rank sum of the first group using the
+    normal approximation.
+
+    Returns:
+    - Tuple of np.ndarrays (z statistics, p-values)
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    if n1.shape[0] == 0:
+        return np.empty(0), np.empty(0)
+
+    r1 = group_rank_sums(summary)[0][0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = n1 + n2
+        expected = n1 * (n + 1) / 2.0
+        z = (r1 - expected) / np.sqrt(n1 * n2 * (n + 1) / 12.0)
+        p_values = 2 * stats.norm.sf(np.abs(z))
+    return z, p_values
+
+def mann_whitney_test(summary):
+    """
+    Mann-Whitney U test (stats.mannwhitneyu with method="asymptotic": tie and continuity
+    corrected) for every column of a two-group summary, from the shared rank sums.
+
+    Returns:
+    - Tuple of np.ndarrays (U statistics of the first group, p-values)
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    if n1.shape[0] == 0:
+        return np.empty(0), np.empty(0)
+
+    rank_sums, tie_sums = group_rank_sums(summary)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = n1 + n2
+        u1 = rank_sums[0] - n1 * (n1 + 1) / 2.0
+        mu = n1 * n2 / 2.0
+        sigma = np.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_sums / (n * (n - 1))))
+        z = (np.abs(u1 - mu) - 0.5) / sigma
+        p_values = np.minimum(2 * stats.norm.sf(z), 1.0)
+    return u1, p_values
+
+def exact_rank_sum_test(summary, max_n=default_exact_rank_sum_n, cache=rank_sum_nulls, planner=None):
+    """
+    Exact Wilcoxon rank-sum p-values for the columns of a two-group count-domain summary
+    (summarize_ordinal_columns) whose groups both have fewer than max_n values.
+
+    The tie pattern of a column is read off its histogram, and the null distribution
+    of each (n1, n2, tie pattern) is looked up in the cache before being generated.
+    With a planner, a distribution that is not cached is only generated if its estimated
+    cost fits in the time left; otherwise the column keeps the asymptotic test. Every
+    exact column is recorded in planner.plans with its estimated and actual time.
+
+    Returns:
+    - Tuple of np.ndarrays (p-values, NaN where not exact; boolean mask of exact columns)
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    exact = (n1 > 0) & (n2 > 0) & (n1 < max_n) & (n2 < max_n)
+    p_values = np.full(n1.shape, np.nan)
+    histogram, offsets = summary["histogram"], summary["offsets"]
+    for j in np.flatnonzero(exact):
+        combined = histogram[offsets[j]:offsets[j + 1]].sum(axis=1)
+        ties = combined[combined > 0].astype(np.int64)
+        key = (int(n1[j]), int(n2[j]), tuple(int(t) for t in ties))
+        estimate = cost_overhead if cache is not None and cache.get(key) is not None else rank_sum_null_cost(*key)
+        if planner is not None and not planner.allows(estimate):
+            exact[j] = False
+            continue
+        start = time.perf_counter()
+        p_values[j] = exact_rank_sum_pvalue(summary["rank_sums"][0, j], int(n1[j]), int(n2[j]), ties, cache)
+        if planner is not None:
+            planner.plans[summary["columns"][j]] = TestPlan("exact", estimate, time.perf_counter() - start)
+    return p_values, exact
+
+
+################################################################################
+########################### Batched Multi-Group Tests ##########################
+################################################################################
+def welch_anova(summary):
+    """
+    Welch's one-way ANOVA (unequal variances) for every column of a k-group summary.
+
+    Returns:
+    - Tuple of np.ndarrays (F statistics, p-values)
+    """
+    n, mean, var = summary["n"], summary["mean"], summary["var"]
+    k = n.shape[0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = n / var
+        w_total = w.sum(axis=0)
+        weighted_mean = (w * mean).sum(axis=0) / w_total
+        a = (w * (mean - weighted_mean) ** 2).sum(axis=0) / (k - 1)
+        lam = ((1 - w / w_total) ** 2 / (n - 1)).sum(axis=0)
+        b = 1 + 2 * (k - 2) / (k ** 2 - 1) * lam
+        f = a / b
+        df2 = (k ** 2 - 1) / (3 * lam)
+        p_values = stats.f.sf(f, k - 1, df2)
+    return f, p_values
+
+def _tie_sums(X):
+    """
+    Sum of (t^3 - t) over every group of tied values, per column, ignoring NaNs.
+    """
+    S = np.sort(X, axis=0).T  # one row per column, NaNs last
+    p, m = S.shape
+    if p == 0 or m == 0:
+        return np.zeros(p)
+
+    flat = S.ravel()
+    col_id = np.repeat(np.arange(p), m)
+    valid = ~np.isnan(flat)
+    flat, col_id = flat[valid], col_id[valid]
+    if flat.size == 0:
+        return np.zeros(p)
+
+    # a new run starts wherever the value or the column changes
+    new_run = np.ones(flat.size, dtype=bool)
+    new_run[1:] = (flat[1:] != flat[:-1]) | (col_id[1:] != col_id[:-1])
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, flat.size)).astype(float)
+    return np.bincount(col_id[run_starts], weights=run_lengths ** 3 - run_lengths, minlength=p)
+
+def group_rank_sums(summary):
+    """
+    Per-group rank sums and per-column tie sums of a k-group summary.
+
+    Ranks are computed once per column over all groups and summed per group with
+    a single reduceat over the group-sorted rank matrix. The result is stored on
+    the summary, so the Kruskal-Wallis test and Dunn's post-hoc test share it.
+
+    Returns:
+    - Tuple ((groups x columns) rank sums, per-column sum of (t^3 - t) over ties)
+    """
+    if "rank_sums" not in summary:
+        X = summary["X"]
+        split = summary["split"]
+        ranks = stats.rankdata(X, axis=0, nan_policy="omit")
+        nonempty = split["sizes"] > 0
+        rank_sums = np.zeros(summary["n"].shape)
+        rank_sums[nonempty] = np.add.reduceat(np.nan_to_num(ranks), split["starts"][nonempty], axis=0)
+        summary["rank_sums"] = rank_sums
+        summary["tie_sums"] = _tie_sums(X)
+    return summary["rank_sums"], summary["tie_sums"]
+
+def kruskal_test(summary):
+    """
+    Kruskal-Wallis H test (tie corrected, as stats.kruskal) for every column of a k-group summary.
+
+    Returns:
+    - Tuple of np.ndarrays (H statistics, p-values)
+    """
+    n = summary["n"]
+    if n.shape[1] == 0:
+        return np.empty(0), np.empty(0)
+
+    rank_sums, tie_sums = group_rank_sums(summary)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = n.sum(axis=0)
+        h = 12.0 / (total * (total + 1)) * np.where(n > 0, rank_sums ** 2 / n, 0).sum(axis=0) - 3 * (total + 1)
+        h = h / (1 - tie_sums / (total ** 3 - total))
+        p_values = stats.chi2.sf(h, (n > 0).sum(axis=0) - 1)
+    return h, p_values
+
+
+
+################################################################################
+########################## Batched Normality Screening #########################
+################################################################################
+def _dagostino_pearson(n, skew, kurt):
+    """
+    D'Agostino-Pearson K^2 p-values (stats.normaltest) from sample sizes and moment ratios.
+
+    Parameters:
+    - n: Array of sample sizes
+    - skew: Array of sqrt(b1) = m3 / m2^1.5
+    - kurt: Array of b2 = m4 / m2^2
+
+    Returns:
+    - np.ndarray of p-values (NaN where n < 8)
+    """
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        # skewness test
+        y = skew * np.sqrt((n + 1) * (n + 3) / (6.0 * (n - 2)))
+        beta2 = 3.0 * (n ** 2 + 27 * n - 70) * (n + 1) * (n + 3) / ((n - 2.0) * (n + 5) * (n + 7) * (n + 9))
+        w2 = -1 + np.sqrt(2 * (beta2 - 1))
+        delta = 1 / np.sqrt(0.5 * np.log(w2))
+        alpha = np.sqrt(2.0 / (w2 - 1))
+        y = np.where(y == 0, 1, y)
+        z_skew = delta * np.log(y / alpha + np.sqrt((y / alpha) ** 2 + 1))
+
+        # kurtosis test
+        expected = 3.0 * (n - 1) / (n + 1)
+        var_b2 = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+        x = (kurt - expected) / np.sqrt(var_b2)
+        sqrt_beta1 = 6.0 * (n * n - 5 * n + 2) / ((n + 7) * (n + 9)) * np.sqrt(6.0 * (n + 3) * (n + 5) / (n * (n - 2) * (n - 3)))
+        a = 6.0 + 8.0 / sqrt_beta1 * (2.0 / sqrt_beta1 + np.sqrt(1 + 4.0 / sqrt_beta1 ** 2))
+        term1 = 1 - 2 / (9.0 * a)
+        denom = 1 + x * np.sqrt(2 / (a - 4.0))
+        term2 = np.sign(denom) * np.where(denom == 0.0, np.nan, ((1 - 2.0 / a) / np.abs(denom)) ** (1 / 3.0))
+        z_kurt = (term1 - term2) / np.sqrt(2 / (9.0 * a))
+
+        p_values = stats.chi2.sf(z_skew ** 2 + z_kurt ** 2, 2)
+    return np.where(n >= 8, p_values, np.nan)
+
+def normality_tests(summary, columns=None, max_shapiro=shapiro_max_n):
+    """
+    Normality screen of every group of every column of a summarize_numeric_columns summary.
+
+    Groups with 3 to max_shapiro values use Shapiro-Wilk; larger groups use the
+    D'Agostino-Pearson omnibus test, computed for all of them at once from the third
+    and fourth central moments of the group-sorted matrix (no per-column call).
+    A chunked summary (sketch_numeric_columns) has no row matrix, only the moments,
+    so every group with at least 8 values gets the D'Agostino-Pearson test.
+
+    Parameters:
+    - summary: Output of summarize_numeric_columns or sketch_numeric_columns
+    - columns: Optional indices of the columns to screen (default: all)
+    - max_shapiro: Largest group tested with Shapiro-Wilk
+
+    Returns:
+    - Tuple of (groups x columns) arrays (p-values, NaN where a group is too small;
+      method "shapiro" / "dagostino" / None)
+    """
+    n = summary["n"]
+    split = summary["split"]
+    columns = np.arange(n.shape[1]) if columns is None else np.asarray(columns, dtype=np.int64)
+    k = n.shape[0]
+    p_values = np.full((k, len(columns)), np.nan)
+    methods = np.full((k, len(columns)), None, dtype=object)
+
+    if "X" not in summary:
+        counts = n[:, columns]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m2, m3, m4 = (summary[name][:, columns] / counts for name in ("m2", "m3", "m4"))
+            p_values = _dagostino_pearson(counts, m3 / m2 ** 1.5, m4 / m2 ** 2)
+        methods[~np.isnan(p_values)] = "dagostino"
+        return p_values, methods
+    X = summary["X"]
+
+    for g in range(k):
+        block = X[split["starts"][g]:split["starts"][g] + split["sizes"][g]][:, columns]
+        counts = n[g, columns]
+
+        large = counts > max_shapiro
+        if large.any():
+            values = block[:, large]
+            centered = values - np.nanmean(values, axis=0)
+            m2, m3, m4 = (np.nanmean(centered ** power, axis=0) for power in (2, 3, 4))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                p_values[g, large] = _dagostino_pearson(counts[large], m3 / m2 ** 1.5, m4 / m2 ** 2)
+            methods[g, large] = "dagostino"
+
+        for j in np.flatnonzero((counts >= 3) & ~large):
+            values = block[:, j]
+            values = values[~np.isnan(values)]
+            if np.ptp(values) > 0:  # Shapiro-Wilk is undefined for constant data
+                p_values[g, j] = stats.shapiro(values).pvalue
+                methods[g, j] = "shapiro"
+
+    return p_values, methods
+
+def normality_screen(p_values, alpha=default_normality_alpha):
+    """
+    True for every column whose groups all pass the normality screen (untestable groups pass).
+    """
+    return ~np.any(p_values < alpha, axis=0)
+
+
+################################################################################
+######################### Factorized Contingency Tables ########################
+################################################################################
+def contingency_table(df, var_name, split):
+    """
+    Builds the (levels x groups) count table for a categorical variable with one bincount.
+
+    Parameters:
+    - df: pd.DataFrame with the uploaded data
+    - var_name: Name of the categorical column
+    - split: Output of factorize_groups for the grouping column
+
+    Returns:
+    - Tuple (levels, table) where levels follow df[var_name].dropna().unique()
+      and table is an np.ndarray of shape (len(levels), number of groups)
+    """
+    var_codes, levels = pd.factorize(df[var_name], sort=False)
+    group_codes = split["codes"]
+    k = len(split["labels"])
+    r = len(levels)
+
+    valid = (var_codes >= 0) & (group_codes >= 0)
+    combined = var_codes[valid] * k + group_codes[valid]
+    table = np.bincount(combined, minlength=r * k).reshape(r, k)
+    return list(levels), table
+
+class ContingencyCache:
+    """
+    Holds one contingency table per (variable, grouping) pair for a single Calculate.
+
+    The p-value test, the per-level counts and the odds ratio all read the same
+    table, so each categorical variable is tabulated once with a single bincount.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.splits = {}
+        self.tables = {}
+
+    def split(self, group_var):
+        # factorized grouping column, shared by every variable
+        if group_var not in self.splits:
+            self.splits[group_var] = factorize_groups(self.df, group_var)
+        return self.splits[group_var]
+
+    def get(self, var_name, group_var):
+        """
+        Returns (levels, table) for var_name against group_var, building it on first use.
+        """
+        key = (var_name, group_var)
+        if key not in self.tables:
+            self.tables[key] = contingency_table(self.df, var_name, self.split(group_var))
+        return self.tables[key]
+
+    def binary_counts(self, var_name, group_var, reference_value):
+        """
+        Collapses the table to the 2x2 used for odds ratios:
+
+                 | not reference | reference
+        group1   |       a       |     b
+        group2   |       c       |     d
+        """
+        levels, table = self.get(var_name, group_var)
+        is_reference = np.array([str(level) == str(reference_value) for level in levels], dtype=bool)
+        not_ref = table[~is_reference].sum(axis=0)
+        ref = table[is_reference].sum(axis=0)
+        return [[int(not_ref[0]), int(ref[0])], [int(not_ref[1]), int(ref[1])]]
+
+def contingency_test(table, test_type):
+    """
+    P-value for an RxK contingency table.
+
+    Parameters:
+    - table: np.ndarray of counts (levels x groups)
+    - test_type: "fisher", "fisher-freeman-halton" or "chi2"
+
+    Returns:
+    - Tuple (p_value, method); p_value is None if the table is degenerate.
+      method names the test actually run ("fisher", "exact", "monte-carlo" or "chi2")
+    """
+    # drop empty rows/columns so the expected frequencies are defined
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return None, None
+
+    if test_type == "fisher" and table.shape == (2, 2):
+        p_value = fisher_exact_2x2(table)[0]
+        method = "fisher"
+    elif test_type in ("fisher", "fisher-freeman-halton"):
+        p_value, method = fisher_freeman_halton(table)
+    elif test_type == "chi2":
+        _, p_value, _, _ = stats.chi2_contingency(table)
+        method = "chi2"
+    else:
+        return None, None
+    return float(p_value), method
+
+def chi2_tests(tables):
+    """
+    Pearson chi-square tests (as stats.chi2_contingency, Yates-corrected when dof = 1)
+    for a list of RxK count tables, computed on one zero-padded stack.
+
+    Returns:
+    - np.ndarray of p-values (NaN for tables with fewer than two non-empty rows or columns)
+    """
+    if not tables:
+        return np.empty(0)
+    n_rows = max(table.shape[0] for table in tables)
+    n_cols = max(table.shape[1] for table in tables)
+    padded = np.zeros((len(tables), n_rows, n_cols))
+    for i, table in enumerate(tables):
+        padded[i, :table.shape[0], :table.shape[1]] = table
+
+    row_totals = padded.sum(axis=2)
+    col_totals = padded.sum(axis=1)
+    total = row_totals.sum(axis=1)
+    dof = ((row_totals > 0).sum(axis=1) - 1) * ((col_totals > 0).sum(axis=1) - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = row_totals[:, :, None] * col_totals[:, None, :] / total[:, None, None]
+        diff = padded - expected
+        yates = (dof == 1)[:, None, None]
+        diff = np.where(yates, np.sign(diff) * np.maximum(np.abs(diff) - 0.5, 0.0), diff)
+        chi2 = np.where(expected > 0, diff ** 2 / expected, 0.0).sum(axis=(1, 2))
+        return np.where(dof > 0, stats.chi2.sf(chi2, np.maximum(dof, 1)), np.nan)
+
+# index permutations of (a, b, c, d) for the 8 row swap / column swap / transpose symmetries
+_symmetries_2x2 = np.array([[0, 1, 2, 3], [1, 0, 3, 2], [2, 3, 0, 1], [3, 2, 1, 0],
+                            [0, 2, 1, 3], [2, 0, 3, 1], [1, 3, 0, 2], [3, 1, 2, 0]])
+
+def canonical_2x2(tables):
+    """
+    Canonical form of each 2x2 table: the lexicographically smallest of its 8 row swap /
+    column swap / transpose variants, which all share the same two-sided Fisher p-value.
+
+    Returns:
+    - (m x 4) integer array of canonical (a, b, c, d) rows
+    """
+    variants = np.asarray(tables, dtype=np.int64).reshape(-1, 4)[:, _symmetries_2x2]
+    keep = np.ones(variants.shape[:2], dtype=bool)
+    for pos in range(4):
+        values = np.where(keep, variants[:, :, pos], np.iinfo(np.int64).max)
+        keep &= values == values.min(axis=1, keepdims=True)
+    return variants[np.arange(len(variants)), keep.argmax(axis=1)]
+
+def _fisher_2x2_kernel(tables):
+    """
+    Two-sided Fisher p-values of (m, 2, 2) tables without empty rows or columns.
+
+    The hypergeometric log-pmf of every table is evaluated on one padded support
+    grid, so all tables are tested with a few array operations.
+    """
+    a = tables[:, 0, 0]
+    row1 = tables[:, 0].sum(axis=1)
+    col1 = tables[:, :, 0].sum(axis=1)
+    total = tables.sum(axis=(1, 2))
+    low = np.maximum(0, row1 + col1 - total)
+    high = np.minimum(row1, col1)
+    x = low[:, None] + np.arange(int((high - low).max()) + 1)[None, :]
+    in_support = x <= high[:, None]
+
+    def log_comb(n, k):
+        return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
+
+    def log_pmf(x):
+        # P(a = x) = C(row1, x) C(total - row1, col1 - x) / C(total, col1)
+        r, c, t = row1[:, None], col1[:, None], total[:, None]
+        return log_comb(r, x) + log_comb(t - r, c - x) - log_comb(t, c)
+
+    with np.errstate(invalid="ignore"):
+        grid = np.where(in_support, log_pmf(np.where(in_support, x, low[:, None])), -np.inf)
+    observed = log_pmf(a[:, None])
+    # same relative tolerance as scipy/R when comparing table probabilities
+    as_extreme = grid <= observed + np.log1p(1e-7)
+    return np.minimum(1.0, np.where(as_extreme, np.exp(grid), 0.0).sum(axis=1))
+
+def fisher_exact_2x2(tables, memo=None, grid_cells=default_fisher_grid_cells):
+    """
+    Two-sided Fisher's exact test (as stats.fisher_exact) for a stack of 2x2 tables.
+
+    Tables are reduced to their canonical form, so identical (or mirrored) tables are
+    computed once per call and looked up in a table-level memo across calls. The
+    remaining tables go through the hypergeometric kernel in chunks of at most
+    grid_cells (tables x support) entries.
+
+    Parameters:
+    - tables: array-like of shape (m, 2, 2) with integer counts
+    - memo: TableMemo to use (defaults to the shared fisher_memo)
+    - grid_cells: Max (tables x support) entries per kernel call
+
+    Returns:
+    - np.ndarray of m p-values (NaN for tables with an empty row or column)
+    """
+    if memo is None:
+        memo = fisher_memo
+    tables = np.asarray(tables, dtype=np.int64).reshape(-1, 2, 2)
+    p_values = np.full(len(tables), np.nan)
+    valid = (tables.sum(axis=2) > 0).all(axis=1) & (tables.sum(axis=1) > 0).all(axis=1)
+    if not valid.any():
+        return p_values
+
+    unique, inverse = np.unique(canonical_2x2(tables[valid]), axis=0, return_inverse=True)
+    keys = [tuple(row) for row in unique.tolist()]
+    unique_p = np.array([memo.get(key) for key in keys], dtype=float)
+
+    missing = np.flatnonzero(np.isnan(unique_p))
+    if missing.size:
+        todo = unique[missing].reshape(-1, 2, 2)
+        support = np.minimum(todo[:, 0].sum(axis=1), todo[:, :, 0].sum(axis=1)) + 1
+        # chunk boundaries so every kernel grid stays under grid_cells entries
+        order = np.argsort(support, kind="stable")
+        start = 0
+        while start < len(order):
+            stop = start + max(1, int(grid_cells // support[order[start:]].max()))
+            stop = min(stop, len(order))
+            chunk = order[start:stop]
+            unique_p[missing[chunk]] = _fisher_2x2_kernel(todo[chunk])
+            start = stop
+        for i in missing:
+            memo.put(keys[i], float(unique_p[i]))
+
+    p_values[valid] = unique_p[inverse.reshape(-1)]
+    return p_values
+
+
+################################################################################
+############################ Batched Odds Ratios ###############################
+################################################################################
+def _nchypergeom_logpmf_grid(tables, log_odds):
+    """
+    Log pmf of Fisher's noncentral hypergeometric distribution for every table on a
+    padded support grid.
+
+    The (0, 0) cell a of each table is distributed given its margins with
+    n = a + c (column 1 total), N = a + b (row 1 total), M = a + b + c + d.
+
+    Returns:
+    - Tuple (support, logpmf, valid) of (tables x max support) arrays
+    """
+    a = tables[:, 0, 0]
+    row1 = tables[:, 0].sum(axis=1)
+    col1 = tables[:, :, 0].sum(axis=1)
+    total = tables.sum(axis=(1, 2))
+
+    low = np.maximum(0, row1 + col1 - total)
+    high = np.minimum(row1, col1)
+    width = int((high - low).max()) + 1 if len(a) else 1
+    support = low[:, None] + np.arange(width)[None, :]
+    valid = support <= high[:, None]
+    x = np.where(valid, support, low[:, None])
+
+    log_base = (gammaln(col1 + 1)[:, None] - gammaln(x + 1) - gammaln(col1[:, None] - x + 1)
+                + gammaln(total - col1 + 1)[:, None] - gammaln(row1[:, None] - x + 1)
+                - gammaln(total[:, None] - col1[:, None] - row1[:, None] + x + 1))
+    logpmf = np.where(valid, log_base + x * log_odds[:, None], -np.inf)
+    logpmf -= np.logaddexp.reduce(logpmf, axis=1)[:, None]
+    return support, logpmf, valid
+
+def _bisect_log_odds(tables, target, n_iter=100, bound=50.0):
+    """
+    Vectorized bisection for log odds where target(support, pmf) changes sign.
+    target must be increasing in the log odds.
+    """
+    lo = np.full(len(tables), -bound)
+    hi = np.full(len(tables), bound)
+    for _ in range(n_iter):
+        mid = (lo + hi) / 2
+        support, logpmf, valid = _nchypergeom_logpmf_grid(tables, mid)
+        above = target(support, np.exp(logpmf), valid) > 0
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+    return (lo + hi) / 2
+
+def odds_ratios(tables, method="woolf", alpha=0.05):
+    """
+    Odds ratios and confidence intervals for a stack of 2x2 tables in one vectorized call.
+
+    Parameters:
+    - tables: array-like of shape (N, 2, 2); rows are groups, columns are (not reference, reference)
+    - method:
+        - "woolf": log-OR Wald interval; tables with a zero cell get the Haldane correction
+        - "haldane": 0.5 added to every cell of every table before the Woolf interval
+        - "exact": conditional MLE with exact (Cornfield) conditional interval, as R's fisher.test
+    - alpha: 1 - confidence level
+
+    Returns:
+    - Tuple of np.ndarrays (odds ratio, CI low, CI high, corrected) where corrected marks
+      tables that received the Haldane correction; tables with an empty row or column give NaN
+    """
+    tables = np.asarray(tables, dtype=float).reshape(-1, 2, 2)
+    has_zero = (tables == 0).any(axis=(1, 2))
+    # an empty row or column carries no information about the odds ratio
+    empty_margin = (tables.sum(axis=2) == 0).any(axis=1) | (tables.sum(axis=1) == 0).any(axis=1)
+
+    if method in ("woolf", "haldane"):
+        corrected = (has_zero if method == "woolf" else np.ones(len(tables), dtype=bool)) & ~empty_margin
+        adjusted = tables + 0.5 * corrected[:, None, None]
+        a, b = adjusted[:, 0, 0], adjusted[:, 0, 1]
+        c, d = adjusted[:, 1, 0], adjusted[:, 1, 1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_or = np.where(empty_margin, np.nan, np.log(a * d / (b * c)))
+            se = np.sqrt(1 / a + 1 / b + 1 / c + 1 / d)
+        z = stats.norm.ppf(1 - alpha / 2)
+        return np.exp(log_or), np.exp(log_or - z * se), np.exp(log_or + z * se), corrected
+
+    if method != "exact":
+        raise ValueError(f"Unknown odds ratio method: {method}")
+
+    tables = tables.astype(np.int64)
+    a = tables[:, 0, 0]
+    row1 = tables[:, 0].sum(axis=1)
+    col1 = tables[:, :, 0].sum(axis=1)
+    total = tables.sum(axis=(1, 2))
+    at_low = a == np.maximum(0, row1 + col1 - total)
+    at_high = a == np.minimum(row1, col1)
+
+    # conditional MLE: E[X; odds] = a
+    mle = _bisect_log_odds(tables, lambda x, pmf, v: (x * pmf).sum(axis=1) - a)
+    # lower limit: P(X >= a; odds) = alpha / 2, upper limit: P(X <= a; odds) = alpha / 2
+    lower = _bisect_log_odds(tables, lambda x, pmf, v: np.where(v & (x >= a[:, None]), pmf, 0).sum(axis=1) - alpha / 2)
+    upper = _bisect_log_odds(tables, lambda x, pmf, v: alpha / 2 - np.where(v & (x <= a[:, None]), pmf, 0).sum(axis=1))
+
+    odds = np.where(at_low, 0.0, np.where(at_high, np.inf, np.exp(mle)))
+    ci_low = np.where(at_low, 0.0, np.exp(lower))
+    ci_high = np.where(at_high, np.inf, np.exp(upper))
+    degenerate = (at_low & at_high) | empty_margin
+    odds = np.where(degenerate, np.nan, odds)
+    ci_low = np.where(degenerate, np.nan, ci_low)
+    ci_high = np.where(degenerate, np.nan, ci_high)
+    return odds, ci_low, ci_high, np.zeros(len(tables), dtype=bool)
+
+
+################################################################################
+######################### Batched Logistic Regression ##########################
+################################################################################
+def logistic_newton(X, y, mask, max_iter=50, tol=1e-8):
+    """
+    Newton-Raphson (IRLS) fits of a stack of small logistic models at once.
+
+    Every iteration is a handful of batched matrix products and one stacked solve,
+    so hundreds of models cost about as much as a few large matrix operations.
+
+    Parameters:
+    - X: (m, n, p) design matrices (rows left out of a model may hold any finite value)
+    - y: (n,) 0/1 outcome shared by all models
+    - mask: (m, n) bool rows used by each model
+    - max_iter: Max Newton steps
+    - tol: Convergence threshold on the largest coefficient change
+
+    Returns:
+    - Dictionary with beta (m x p), cov (m x p x p), loglik (m,) and converged (m,);
+      models that did not converge (e.g. complete separation) or are rank deficient are NaN
+    """
+    m, n, p = X.shape
+    weights = mask.astype(float)
+    y = np.broadcast_to(np.asarray(y, dtype=float), (m, n))
+    Xt = X.transpose(0, 2, 1)
+    beta = np.zeros((m, p))
+    converged = np.zeros(m, dtype=bool)
+
+    def information(beta):
+        mu = np.clip(1 / (1 + np.exp(-np.einsum("mnp,mp->mn", X, beta))), 1e-12, 1 - 1e-12)
+        return mu, Xt @ (X * (weights * mu * (1 - mu))[:, :, None])
+
+    for _ in range(max_iter):
+        mu, H = information(beta)
+        g = np.einsum("mpn,mn->mp", Xt, weights * (y - mu))
+        try:
+            step = np.linalg.solve(H, g[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            step = (np.linalg.pinv(H) @ g[:, :, None])[:, :, 0]
+        step = np.where(converged[:, None], 0.0, step)
+        beta = beta + step
+        converged |= np.abs(step).max(axis=1) < tol
+        if converged.all():
+            break
+
+    mu, H = information(beta)
+    loglik = (weights * (y * np.log(mu) + (1 - y) * np.log(1 - mu))).sum(axis=1)
+    ok = converged & (np.linalg.matrix_rank(H) == p) & (np.abs(beta) < 30).all(axis=1)
+    cov = np.linalg.pinv(H)
+    beta[~ok] = np.nan
+    cov[~ok] = np.nan
+    loglik[~ok] = np.nan
+    return {"beta": beta, "cov": cov, "loglik": loglik, "converged": ok}
+
+def adjusted_odds_ratios(x, covariates, y, mask, alpha=0.05, max_cells=5_000_000):
+    """
+    Odds ratios of the variable columns x, adjusted for the covariates, for a stack
+    of logistic models logit P(y = 1) = b0 + x b + covariates c.
+
+    The model without x is fitted on the same rows for the likelihood ratio test.
+    Models are fitted in chunks of at most max_cells (models x rows x parameters) entries.
+
+    Parameters:
+    - x: (m, n, d) variable columns (d = 1 for a binary indicator or a numeric value)
+    - covariates: (n, c) adjustment columns shared by all models (c may be 0)
+    - y: (n,) 0/1 outcome
+    - mask: (m, n) bool complete cases of each model
+    - alpha: 1 - confidence level
+
+    Returns:
+    - Dictionary with odds_ratio, low, high and wald_p (m x d), lr_p (m,) and n (m,)
+    """
+    m, n, d = x.shape
+    p = 1 + d + covariates.shape[1]
+    full = {"beta": np.empty((m, p)), "cov": np.empty((m, p, p)), "loglik": np.empty(m)}
+    null_loglik = np.empty(m)
+
+    chunk = max(1, int(max_cells // max(n * p, 1)))
+    for start in range(0, m, chunk):
+        rows = slice(start, start + chunk)
+        size = len(range(m)[rows])
+        shared = np.broadcast_to(np.column_stack([np.ones(n), covariates]), (size, n, p - d))
+        # rows outside a model's mask may hold NaN; zero them so they do not poison the products
+        x_rows = np.where(mask[rows][:, :, None], x[rows], 0.0)
+        shared = np.where(mask[rows][:, :, None], shared, 0.0)
+        fit = logistic_newton(np.concatenate([shared[:, :, :1], x_rows, shared[:, :, 1:]], axis=2), y, mask[rows])
+        for key in full:
+            full[key][rows] = fit[key]
+        null_loglik[rows] = logistic_newton(shared, y, mask[rows])["loglik"]
+
+    b = full["beta"][:, 1:1 + d]
+    se = np.sqrt(np.diagonal(full["cov"], axis1=1, axis2=2)[:, 1:1 + d])
+    z = stats.norm.ppf(1 - alpha / 2)
+    with np.errstate(invalid="ignore"):
+        lr = np.maximum(2 * (full["loglik"] - null_loglik), 0.0)
+        return {
+            "odds_ratio": np.exp(b),
+            "low": np.exp(b - z * se),
+            "high": np.exp(b + z * se),
+            "wald_p": 2 * stats.norm.sf(np.abs(b / se)),
+            "lr_p": stats.chi2.sf(lr, d),
+            "n": mask.sum(axis=1),
+        }
+
+
+################################################################################
+############################ Batched Effect Sizes ##############################
+################################################################################
+# All effect sizes compare the first group with the second (group1 - group2) and are
+# derived from the per-group statistics the descriptive pass already produced.
+def _standardized_interval(smd, n1, n2, alpha=0.05):
+    """
+    Large-sample CI of a standardized difference, SE = sqrt(1/n1 + 1/n2 + smd^2 / (2 (n1 + n2))).
+    """
+    z = stats.norm.ppf(1 - alpha / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se = np.sqrt((n1 + n2) / (n1 * n2) + smd ** 2 / (2 * (n1 + n2)))
+    return smd - z * se, smd + z * se
+
+def mean_difference_effects(summary, alpha=0.05):
+    """
+    SMD, Cohen's d and Hedges' g for every column of a two-group summary.
+
+    Returns:
+    - Dictionary {"smd", "cohens_d", "hedges_g"} of (estimates, CI lows, CI highs) arrays;
+      the SMD uses the average of the two variances, d and g the pooled variance
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    v1, v2 = summary["var"][0], summary["var"][1]
+    diff = summary["mean"][0] - summary["mean"][1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smd = diff / np.sqrt((v1 + v2) / 2)
+        d = diff / np.sqrt(((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2))
+        j = 1 - 3 / (4 * (n1 + n2) - 9)  # small-sample correction
+    d_low, d_high = _standardized_interval(d, n1, n2, alpha)
+    return {
+        "smd": (smd,) + _standardized_interval(smd, n1, n2, alpha),
+        "cohens_d": (d, d_low, d_high),
+        "hedges_g": (j * d, j * d_low, j * d_high),
+    }
+
+def cliffs_delta(summary, alpha=0.05):
+    """
+    Cliff's delta for every column of a two-group summary, from the shared rank sums.
+
+    delta = 2 U / (n1 n2) - 1 with U the Mann-Whitney statistic of the first group;
+    the CI uses the Hanley-McNeil variance of U / (n1 n2), clipped to [-1, 1].
+
+    Returns:
+    - Tuple of np.ndarrays (estimates, CI lows, CI highs)
+    """
+    n1, n2 = summary["n"][0], summary["n"][1]
+    if n1.shape[0] == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    r1 = group_rank_sums(summary)[0][0]
+    z = stats.norm.ppf(1 - alpha / 2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        auc = (r1 - n1 * (n1 + 1) / 2) / (n1 * n2)
+        q1 = auc / (2 - auc)
+        q2 = 2 * auc ** 2 / (1 + auc)
+        var_auc = (auc * (1 - auc) + (n1 - 1) * (q1 - auc ** 2) + (n2 - 1) * (q2 - auc ** 2)) / (n1 * n2)
+        se = 2 * np.sqrt(np.maximum(var_auc, 0))
+    delta = 2 * auc - 1
+    return delta, np.clip(delta - z * se, -1, 1), np.clip(delta + z * se, -1, 1)
+
+def proportion_effects(events, totals, alpha=0.05):
+    """
+    SMD and risk difference of a binary outcome for stacked variables.
+
+    Parameters:
+    - events: (variables x 2) counts of the outcome level per group
+    - totals: (variables x 2) non-missing counts per group
+
+    Returns:
+    - Dictionary {"smd", "risk_difference"} of (estimates, CI lows, CI highs) arrays;
+      the risk difference uses a Wald interval
+    """
+    events = np.asarray(events, dtype=float).reshape(-1, 2)
+    totals = np.asarray(totals, dtype=float).reshape(-1, 2)
+    z = stats.norm.ppf(1 - alpha / 2)
+    n1, n2 = totals[:, 0], totals[:, 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = events / totals
+        p1, p2 = p[:, 0], p[:, 1]
+        rd = p1 - p2
+        se_rd = np.sqrt(p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2)
+        smd = rd / np.sqrt((p1 * (1 - p1) + p2 * (1 - p2)) / 2)
+    return {
+        "smd": (smd,) + _standardized_interval(smd, n1, n2, alpha),
+        "risk_difference": (rd, rd - z * se_rd, rd + z * se_rd),
+    }
+
+def multinomial_smd(tables, alpha=0.05):
+    """
+    Multivariate SMD of Yang & Dalton (2012) for stacked (levels x 2) tables.
+
+    SMD = sqrt((p1 - p2)' S^-1 (p1 - p2)) over all levels but the first, with S the
+    average of the two multinomial covariance matrices. Tables are zero-padded to
+    the same number of levels and solved in one batched pseudo-inverse.
+
+    Returns:
+    - Tuple of np.ndarrays (estimates, CI lows, CI highs); the SMD is non-negative
+    """
+    if not tables:
+        return np.empty(0), np.empty(0), np.empty(0)
+    n_levels = max(table.shape[0] for table in tables)
+    padded = np.zeros((len(tables), n_levels, 2))
+    for v, table in enumerate(tables):
+        padded[v, :table.shape[0]] = table
+    # levels empty in both groups do not enter the comparison
+    padded = np.take_along_axis(padded, np.argsort(padded.sum(axis=2) == 0, axis=1, kind="stable")[:, :, None], axis=1)
+
+    totals = padded.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = padded / totals[:, None, :]
+    p = p[:, 1:]  # drop the first (reference) level
+    diff = p[:, :, 0] - p[:, :, 1]
+    cov = np.zeros((len(tables), n_levels - 1, n_levels - 1))
+    for g in range(2):
+        cov += (np.einsum("vi,ij->vij", p[:, :, g], np.eye(n_levels - 1)) - p[:, :, g, None] * p[:, None, :, g]) / 2
+    with np.errstate(invalid="ignore"):
+        smd = np.sqrt(np.maximum(np.einsum("vi,vij,vj->v", diff, np.linalg.pinv(np.nan_to_num(cov)), diff), 0))
+    smd = np.where(np.isnan(diff).any(axis=1) | (totals == 0).any(axis=1), np.nan, smd)
+    low, high = _standardized_interval(smd, totals[:, 0], totals[:, 1], alpha)
+    return smd, np.maximum(low, 0.0), high
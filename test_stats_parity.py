@@ -0,0 +1,138 @@
+
+# imports
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from stats_engine import (summarize_numeric_columns, summarize_ordinal_columns, welch_ttest, welch_anova, kruskal_test,
+                          rank_sum_test, mann_whitney_test)
+from exact_tests import ffh_exact, exact_rank_sum_pvalue
+from posthoc import adjust_pvalues
+
+
+################################################################################
+################################### Fixtures ###################################
+################################################################################
+# Function to build a data set with continuous and ordinal columns and k groups (with missing values)
+def make_data(k, n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    groups = rng.choice([f"g{i}" for i in range(k)], n)
+    shift = np.array([int(g[1:]) for g in groups]) * 0.4
+    df = pd.DataFrame({
+        "grp": groups,
+        "x": rng.normal(size=n) * (1 + shift) + shift,
+        "y": rng.exponential(size=n) + shift,
+        "o": rng.integers(1, 6, n).astype(float),
+    })
+    df.loc[rng.choice(n, 10, replace=False), "x"] = np.nan
+    df.loc[rng.choice(n, 10, replace=False), "o"] = np.nan
+    return df
+
+# Function to split one column into its per-group arrays, in the group order of the summaries
+def group_values(df, col):
+    return [df.loc[df["grp"] == g, col].dropna().to_numpy() for g in df["grp"].dropna().unique()]
+
+
+################################################################################
+################################# stats_engine #################################
+################################################################################
+def test_welch_ttest_matches_scipy():
+    df = make_data(2)
+    summary = summarize_numeric_columns(df, "grp", ["x", "y"])
+    _, p_values = welch_ttest(summary)
+    for j, col in enumerate(["x", "y"]):
+        expected = stats.ttest_ind(*group_values(df, col), equal_var=False).pvalue
+        assert p_values[j] == pytest.approx(expected, rel=1e-9)
+
+def test_welch_anova_matches_reference():
+    df = make_data(4)
+    summary = summarize_numeric_columns(df, "grp", ["x", "y"])
+    _, p_values = welch_anova(summary)
+    for j, col in enumerate(["x", "y"]):
+        try:
+            expected = stats.f_oneway(*group_values(df, col), equal_var=False).pvalue
+        except TypeError:
+            oneway = pytest.importorskip("statsmodels.stats.oneway")
+            expected = oneway.anova_oneway(group_values(df, col), use_var="unequal").pvalue
+        assert p_values[j] == pytest.approx(expected, rel=1e-9)
+
+def test_kruskal_matches_scipy():
+    df = make_data(3)
+    numeric = summarize_numeric_columns(df, "grp", ["x", "y"])
+    ordinal = summarize_ordinal_columns(df, "grp", ["o"])
+    for summary, columns in ((numeric, ["x", "y"]), (ordinal, ["o"])):
+        _, p_values = kruskal_test(summary)
+        for j, col in enumerate(columns):
+            assert p_values[j] == pytest.approx(stats.kruskal(*group_values(df, col)).pvalue, rel=1e-9)
+
+def test_rank_sum_and_mann_whitney_match_scipy():
+    df = make_data(2)
+    numeric = summarize_numeric_columns(df, "grp", ["x", "y"])
+    ordinal = summarize_ordinal_columns(df, "grp", ["o"])
+    for summary, columns in ((numeric, ["x", "y"]), (ordinal, ["o"])):
+        _, rank_sum_p = rank_sum_test(summary)
+        _, mann_whitney_p = mann_whitney_test(summary)
+        for j, col in enumerate(columns):
+            values = group_values(df, col)
+            # stats.ranksums ignores ties, so compare it on the tie-free continuous columns only
+            if summary is numeric:
+                assert rank_sum_p[j] == pytest.approx(stats.ranksums(*values).pvalue, rel=1e-9)
+            expected = stats.mannwhitneyu(*values, method="asymptotic").pvalue
+            assert mann_whitney_p[j] == pytest.approx(expected, rel=1e-9)
+
+
+################################################################################
+################################## exact_tests #################################
+################################################################################
+@pytest.mark.parametrize("table", [[[3, 1], [1, 3]], [[10, 2], [3, 15]], [[0, 5], [6, 1]], [[7, 7], [7, 7]]])
+def test_ffh_exact_matches_fisher_exact_on_2x2(table):
+    assert ffh_exact(table) == pytest.approx(stats.fisher_exact(table).pvalue, rel=1e-9)
+
+@pytest.mark.parametrize("n1, n2, seed", [(5, 7, 0), (8, 8, 1), (12, 9, 2)])
+def test_rank_sum_null_matches_mannwhitneyu_exact(n1, n2, seed):
+    rng = np.random.default_rng(seed)
+    first, second = rng.normal(size=n1), rng.normal(size=n2) + 0.5
+    ranks = stats.rankdata(np.concatenate([first, second]))
+    p_value = exact_rank_sum_pvalue(ranks[:n1].sum(), n1, n2, [1] * (n1 + n2))
+    assert p_value == pytest.approx(stats.mannwhitneyu(first, second, method="exact").pvalue, rel=1e-9)
+
+
+################################################################################
+#################################### posthoc ###################################
+################################################################################
+# Function to adjust one family of p-values the textbook way
+def manual_adjustment(p, method):
+    m = len(p)
+    order = np.argsort(p)
+    adjusted = np.empty(m)
+    if method == "holm":
+        running = 0.0
+        for rank, i in enumerate(order):
+            running = max(running, min((m - rank) * p[i], 1.0))
+            adjusted[i] = running
+    else:
+        running = 1.0
+        for rank in range(m - 1, -1, -1):
+            i = order[rank]
+            running = min(running, p[i] * m / (rank + 1))
+            adjusted[i] = running
+    return adjusted
+
+@pytest.mark.parametrize("method, statsmodels_method", [("holm", "holm"), ("bh", "fdr_bh")])
+def test_adjust_pvalues_matches_reference(method, statsmodels_method):
+    rng = np.random.default_rng(3)
+    p_values = np.column_stack([rng.uniform(0, 0.2, 6), rng.uniform(0, 1, 6)])
+    adjusted = adjust_pvalues(p_values, method)
+    for j in range(p_values.shape[1]):
+        np.testing.assert_allclose(adjusted[:, j], manual_adjustment(p_values[:, j], method), rtol=1e-12)
+
+    multitest = pytest.importorskip("statsmodels.stats.multitest")
+    for j in range(p_values.shape[1]):
+        expected = multitest.multipletests(p_values[:, j], method=statsmodels_method)[1]
+        np.testing.assert_allclose(adjusted[:, j], expected, rtol=1e-12)
+
+def test_adjust_pvalues_leaves_missing_comparisons_out():
+    p_values = np.array([0.01, np.nan, 0.04, 0.03])
+    adjusted = adjust_pvalues(p_values, "holm")
+    assert np.isnan(adjusted[1])
+    np.testing.assert_allclose(adjusted[[0, 2, 3]], manual_adjustment(p_values[[0, 2, 3]], "holm"))